@@ -0,0 +1,385 @@
+"""
+Offline benchmark harness for the monitor pipeline.
+
+Generates synthetic Quiver payloads, serves them (and a fake Telegram Bot
+API) from local stub servers, and times each stage against a throwaway
+data.db. Every size runs in its own subprocess so peak RSS is per size.
+
+    python benchmarks/run.py --sizes 1000,10000,100000 --out bench_output.json
+    python benchmarks/run.py --sizes 1000000 --scenarios ingest,score
+    python benchmarks/run.py --snapshot snapshots/runs/<timestamp>.json
+    python benchmarks/run.py --scenarios startup
+
+Results (throughput, p50/p99 per-row latency, peak traced / RSS memory)
+are written as JSON, tagged with the current git commit, for comparison
+across commits. Per-row latency is measured per chunk of rows and divided
+by the chunk size, except where rows are handled one at a time. With
+--snapshot, recorded Quiver responses (see src/snapshots.py) replace the
+synthetic payloads. The startup scenario times, in a fresh interpreter per
+`src/main.py` command, the imports that command pays before doing any work,
+against cli.import_budget_ms. Bytecode is cached first (in a temporary
+pycache, whatever PYTHONDONTWRITEBYTECODE says) so the numbers are what an
+installed CLI pays, not compile time; each is the median of STARTUP_RUNS.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SRC = os.path.join(ROOT, "src")
+
+SCENARIOS = ("fetch", "ingest", "score", "digest", "run", "startup")
+CHUNK = 1000
+STARTUP_RUNS = 5
+
+
+# -----------------------
+# Measurement helpers
+# -----------------------
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _timed_chunks(items: Iterable, chunk: int = CHUNK) -> Tuple[int, List[Tuple[float, int]]]:
+    """Consume an iterable, recording (seconds, rows) per chunk of items."""
+    laps: List[Tuple[float, int]] = []
+    n = 0
+    pending = 0
+    t0 = time.perf_counter()
+    for _ in items:
+        n += 1
+        pending += 1
+        if pending == chunk:
+            t1 = time.perf_counter()
+            laps.append((t1 - t0, pending))
+            t0, pending = t1, 0
+    if pending:
+        laps.append((time.perf_counter() - t0, pending))
+    return n, laps
+
+
+def _measure(name: str, size: int, fn: Callable[[], Tuple[int, List[Tuple[float, int]]]]) -> Dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    rows, laps = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Weight each lap by its row count so percentiles are per row, not per lap.
+    per_row_us: List[float] = []
+    for seconds, n in laps:
+        if n:
+            per_row_us.extend([seconds / n * 1e6] * n)
+    return {
+        "scenario": name,
+        "size": size,
+        "rows": rows,
+        "seconds": round(elapsed, 4),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "p50_us_per_row": round(_percentile(per_row_us, 0.50), 2),
+        "p99_us_per_row": round(_percentile(per_row_us, 0.99), 2),
+        "peak_traced_mb": round(peak / (1024 * 1024), 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _startup() -> List[Dict]:
+    from config import CONFIG
+    from main import STAGE_MODULES
+
+    budgets = (CONFIG.get("cli", {}) or {}).get("import_budget_ms", {}) or {}
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-pycache-") as pycache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        for command in STAGE_MODULES:
+            code = (
+                "import time; t0 = time.perf_counter(); import main; t1 = time.perf_counter(); "
+                f"print(t1 - t0, main.load_stage({command!r}))"
+            )
+            samples = []
+            # The first run only fills the bytecode cache.
+            for _ in range(STARTUP_RUNS + 1):
+                # cwd=src puts the flat modules on sys.path, as `python src/main.py` does.
+                proc = subprocess.run(
+                    [sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True, check=True
+                )
+                samples.append(tuple(float(x) for x in proc.stdout.split()[-2:]))
+            samples = sorted(samples[1:], key=sum)
+            main_s, stage_s = samples[len(samples) // 2]
+            budget = budgets.get(command)
+            results.append({
+                "scenario": "startup",
+                "command": command,
+                "main_import_ms": round(main_s * 1000, 1),
+                "stage_import_ms": round(stage_s * 1000, 1),
+                "budget_ms": budget,
+                # The CLI counts main's own imports toward the budget too.
+                "over_budget": budget is not None and (main_s + stage_s) * 1000 > float(budget),
+            })
+    return results
+
+
+# -----------------------
+# Scenarios (run inside the per-size child process)
+# -----------------------
+
+def _child(size: int, scenarios: List[str], snapshot: Optional[str] = None) -> List[Dict]:
+    import synth
+    from stubs import QuiverStub, TelegramStub
+
+    workdir = tempfile.mkdtemp(prefix="qq-bench-")
+    os.chdir(workdir)  # storage.DB_PATH is relative
+
+    results: List[Dict] = []
+    with QuiverStub({}) as quiver, TelegramStub() as tg:
+        # config reads these at import, so they are set before any src import.
+        os.environ["QUIVER_BASE_URL"] = quiver.url
+        os.environ["TELEGRAM_API_BASE"] = tg.url
+        os.environ.setdefault("TELEGRAM_TOKEN", "bench")
+        os.environ.setdefault("TELEGRAM_CHAT_ID", "1")
+        sys.path.insert(0, SRC)
+
+        import snapshots
+        if snapshot:
+            recorded = snapshots.load_payloads(snapshots.load_manifest(snapshot))
+            gov = recorded.get("government_trades") or []
+            ins = recorded.get("insider_trades") or []
+            con = recorded.get("contracts") or []
+        else:
+            gov = synth.congress(size)
+            ins = synth.insider(size)
+            con = synth.contracts(max(1, size // 10))
+        quiver.set_payloads({
+            "/live/congresstrading": gov,
+            "/historical/insidertrading": ins,
+            "/historical/governmentcontracts": con,
+        })
+        # Every stage fetches from the stub; nothing is cached between runs.
+        snapshots.ENABLED = False
+
+        import storage
+        storage.init_db()
+
+        if "fetch" in scenarios:
+            import quiver_client
+
+            def fetch():
+                data = quiver_client.fetch_all()
+                return _timed_chunks(row for rows in data.values() for row in rows)
+
+            results.append(_measure("fetch", size, fetch))
+
+        if "ingest" in scenarios or "score" in scenarios:
+            from ingest import ingest_contracts, ingest_government, ingest_insider
+            from patterns import add_awards, add_events, observe_trades
+
+            conn = storage.get_conn()
+            new_gov: List = []
+            new_ins: List = []
+
+            def ingest():
+                laps = []
+                rows = 0
+                for source, stream, sink in (
+                    ("contract", ingest_contracts(conn, con), None),
+                    ("government", ingest_government(conn, gov, batch_size=CHUNK), new_gov),
+                    ("insider", ingest_insider(conn, ins, batch_size=CHUNK), new_ins),
+                ):
+                    t0 = time.perf_counter()
+                    for batch in stream:
+                        t1 = time.perf_counter()
+                        laps.append((t1 - t0, len(batch)))
+                        rows += len(batch)
+                        add_events(source, batch)
+                        if source == "government":
+                            observe_trades(conn, batch)
+                        if sink is None:
+                            add_awards(batch)
+                        else:
+                            sink.extend(batch)
+                        t0 = time.perf_counter()
+                conn.commit()
+                return rows, laps
+
+            results.append(_measure("ingest", size, ingest))
+
+        if "score" in scenarios:
+            from scoring import score_government_trades, score_insider_trade
+
+            def score():
+                laps = []
+                for i in range(0, len(new_gov), CHUNK):
+                    chunk = new_gov[i:i + CHUNK]
+                    t0 = time.perf_counter()
+                    score_government_trades(chunk, conn=conn)
+                    laps.append((time.perf_counter() - t0, len(chunk)))
+                for t in new_ins:
+                    t0 = time.perf_counter()
+                    score_insider_trade(t, conn=conn)
+                    laps.append((time.perf_counter() - t0, 1))
+                return len(new_gov) + len(new_ins), laps
+
+            results.append(_measure("score", size, score))
+
+        if "digest" in scenarios:
+            # Persist scores, then the indexed top-N query + format + deliver.
+            import requests  # noqa: F401  telegram imports it on first send; keep that out of the timing
+            from main import queue_digest
+            from records import Pick
+            from scores import save_picks
+            from telegram import flush
+
+            conn = storage.get_conn()
+            picks = [
+                Pick("government", r.get("Ticker"), (i * 37) % 100, r.get("Transaction"), r.get("Range"),
+                     r.get("Representative"), r.get("House"), r.get("ReportDate"), "", ["Government buy"],
+                     f"bench-{i}")
+                for i, r in enumerate(gov)
+            ]
+
+            def digest():
+                laps = []
+                for i in range(0, len(picks), CHUNK):
+                    chunk = picks[i:i + CHUNK]
+                    t0 = time.perf_counter()
+                    save_picks(conn, chunk)
+                    laps.append((time.perf_counter() - t0, len(chunk)))
+                t0 = time.perf_counter()
+                queue_digest(conn)
+                conn.commit()
+                flush(conn)
+                laps.append((time.perf_counter() - t0, 1))
+                return len(picks), laps
+
+            results.append(_measure("digest", size, digest))
+
+        if "run" in scenarios:
+            # End to end: fetch -> ingest -> score -> alert -> digest. The driver
+            # runs this in its own child so module caches start cold.
+            import main
+
+            def run():
+                t0 = time.perf_counter()
+                main.run()
+                rows = len(gov) + len(ins) + len(con)
+                return rows, [(time.perf_counter() - t0, rows)]
+
+            results.append(_measure("run", size, run))
+
+        if "startup" in scenarios:
+            results.extend(_startup())
+
+    return results
+
+
+# -----------------------
+# Driver
+# -----------------------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000,10000", help="comma-separated row counts per dataset")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"subset of {','.join(SCENARIOS)}")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench_output.json"))
+    ap.add_argument("--snapshot", help="replay a recorded snapshot run manifest instead of synthetic payloads")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.child is not None:
+        sys.path.insert(0, HERE)
+        print(json.dumps(_child(args.child, scenarios, args.snapshot)))
+        return
+
+    # Stage scenarios share one child (score reuses the ingested rows); the
+    # end-to-end run gets its own so it starts from an empty database.
+    # Startup does not depend on size and runs once.
+    stages = [s for s in scenarios if s not in ("run", "startup")]
+    groups = [g for g in (stages, ["run"] if "run" in scenarios else []) if g]
+
+    # A snapshot has a fixed size; it is run once and reported as size 0.
+    sizes = [0] if args.snapshot else [int(s) for s in args.sizes.split(",")]
+    extra = []
+    if args.snapshot:
+        # Children run in a temp dir; a bare timestamp is resolved by snapshots.py.
+        extra = ["--snapshot", os.path.abspath(args.snapshot) if os.path.exists(args.snapshot) else args.snapshot]
+
+    results = []
+    for size in sizes:
+        for group in groups:
+            proc = subprocess.run(
+                [sys.executable, __file__, "--child", str(size), "--scenarios", ",".join(group), *extra],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr)
+                raise SystemExit(f"[bench] size {size} failed")
+            # The child's own log lines precede the JSON on stdout.
+            group_results = json.loads(proc.stdout.strip().splitlines()[-1])
+            for r in group_results:
+                print(f"[bench] {r['scenario']:>6} n={size:<8} {r['rows_per_s'] or 0:>12.0f} rows/s "
+                      f"p50={r['p50_us_per_row']}us p99={r['p99_us_per_row']}us rss={r['peak_rss_mb']}MB")
+            results.extend(group_results)
+
+    if "startup" in scenarios:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", "0", "--scenarios", "startup"],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit("[bench] startup failed")
+        for r in json.loads(proc.stdout.strip().splitlines()[-1]):
+            flag = " OVER BUDGET" if r["over_budget"] else ""
+            print(f"[bench] startup {r['command']:>8} main={r['main_import_ms']}ms "
+                  f"stage={r['stage_import_ms']}ms budget={r['budget_ms']}ms{flag}")
+            results.append(r)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Local stand-ins for the Quiver API and the Telegram Bot API.
+
+Both run a ThreadingHTTPServer on 127.0.0.1 with an ephemeral port; point
+QUIVER_BASE_URL / TELEGRAM_API_BASE at .url before importing src modules.
+"""
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+class _Server:
+    handler_cls = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        owner = self
+
+        class Handler(self.handler_cls):
+            server_owner = owner
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuiverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        owner = self.server_owner
+        path = self.path.split("?", 1)[0]
+        owner.requests += 1
+        body = owner.bodies.get(path)
+        if body is None:
+            self._reply(404, b'{"detail":"Not found."}')
+            return
+        etag = owner.etags[path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._reply(200, body, etag)
+
+    def _reply(self, status: int, body: bytes, etag: str = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class QuiverStub(_Server):
+    """Serves fixed payloads per path, with ETag / If-None-Match support."""
+
+    handler_cls = _QuiverHandler
+
+    def __init__(self, payloads: Dict[str, List[Dict[str, Any]]]):
+        self.requests = 0
+        self.set_payloads(payloads)
+        super().__init__()
+
+    def set_payloads(self, payloads: Dict[str, List[Dict[str, Any]]]):
+        bodies = {p: json.dumps(rows).encode("utf-8") for p, rows in payloads.items()}
+        self.etags = {p: '"' + hashlib.sha1(b).hexdigest() + '"' for p, b in bodies.items()}
+        self.bodies = bodies
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        owner = self.server_owner
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        text = payload.get("text", "")
+        with owner.lock:
+            owner.calls += 1
+            throttled = owner.throttle_every and owner.calls % owner.throttle_every == 0
+            rejected = not throttled and any(word in text for word in owner.reject)
+            if not throttled and not rejected:
+                owner.messages.append(text)
+        if throttled:
+            body = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                    "parameters": {"retry_after": owner.retry_after}}
+            status = 429
+        elif rejected:
+            body = {"ok": False, "error_code": 400, "description": "Bad Request: message rejected"}
+            status = 400
+        else:
+            body = {"ok": True, "result": {"message_id": len(owner.messages)}}
+            status = 200
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class TelegramStub(_Server):
+    """
+    Fake Bot API sendMessage. Records accepted texts; with throttle_every=N
+    every Nth call is answered 429 with retry_after, and texts containing any
+    of `reject` are answered 400.
+    """
+
+    handler_cls = _TelegramHandler
+
+    def __init__(self, throttle_every: int = 0, retry_after: int = 1, reject: Tuple[str, ...] = ()):
+        self.messages: List[str] = []
+        self.reject = tuple(reject)
+        self.calls = 0
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        super().__init__()
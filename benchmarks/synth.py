@@ -0,0 +1,95 @@
+"""
+Synthetic Quiver payloads (congress, insider, contracts) in the API's shape.
+
+Deterministic for a given seed, so runs on different commits compare the
+same input.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+SIDES_GOV = ["Purchase", "Sale", "Sale (Partial)", "Sale (Full)", "Exchange"]
+RANGES = [
+    "$1,001 - $15,000", "$15,001 - $50,000", "$50,001 - $100,000",
+    "$100,001 - $250,000", "$250,001 - $500,000", "$1,000,000 +",
+]
+TITLES = ["CEO", "CFO", "Director", "10% Owner", "President", "COO", "General Counsel", "VP Sales"]
+AGENCIES = ["Department of Defense", "NASA", "Department of Energy", "GSA", "HHS"]
+
+
+def _tickers(rng: random.Random, n: int) -> List[str]:
+    # Callers pass a fixed seed, so a smaller universe is a subset of a larger one.
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    out = set()
+    while len(out) < n:
+        out.add("".join(rng.choice(letters) for _ in range(rng.randint(2, 4))))
+    return sorted(out)
+
+
+def _day(rng: random.Random, today: date, span_days: int) -> date:
+    return today - timedelta(days=rng.randint(0, span_days))
+
+
+def congress(n: int, seed: int = 1, span_days: int = 30, n_tickers: int = 800) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    today = date.today()
+    tickers = _tickers(random.Random(0), n_tickers)
+    members = [f"Member {i}" for i in range(max(50, n // 200))]
+    rows = []
+    for _ in range(n):
+        disclosed = _day(rng, today, span_days)
+        rows.append({
+            "Representative": rng.choice(members),
+            "BioGuideID": f"B{rng.randint(100000, 999999)}",
+            "ReportDate": disclosed.isoformat(),
+            "TransactionDate": (disclosed - timedelta(days=rng.randint(1, 45))).isoformat(),
+            "Ticker": rng.choice(tickers),
+            "Transaction": rng.choice(SIDES_GOV),
+            "Range": rng.choice(RANGES),
+            "House": rng.choice(["Representatives", "Senate"]),
+            "Amount": str(float(rng.choice([1001, 15001, 50001, 100001, 250001]))),
+            "Party": rng.choice(["D", "R", "I"]),
+            "last_modified": disclosed.isoformat(),
+        })
+    return rows
+
+
+def insider(n: int, seed: int = 2, span_days: int = 30, n_tickers: int = 3000) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    today = date.today()
+    tickers = _tickers(random.Random(0), n_tickers)
+    rows = []
+    for i in range(n):
+        filed = _day(rng, today, span_days)
+        shares = rng.randint(100, 200000)
+        price = round(rng.uniform(2, 400), 2)
+        rows.append({
+            "Ticker": rng.choice(tickers),
+            "Name": f"Insider {rng.randint(0, max(100, n // 20))}",
+            "Title": rng.choice(TITLES),
+            "TransactionType": rng.choice(["Buy", "Sell", "Sell", "Sell"]),
+            "Date": (filed - timedelta(days=rng.randint(0, 4))).isoformat(),
+            "FilingDate": filed.isoformat(),
+            "Shares": shares,
+            "PricePerShare": price,
+            "Value": round(shares * price, 2),
+            "SharesOwnedFollowing": shares * rng.randint(1, 20),
+            "AccessionNumber": f"0001-{i:010d}",
+        })
+    return rows
+
+
+def contracts(n: int, seed: int = 3, span_days: int = 365, n_tickers: int = 800) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    today = date.today()
+    tickers = _tickers(random.Random(0), n_tickers)
+    return [
+        {
+            "Ticker": rng.choice(tickers),
+            "Date": _day(rng, today, span_days).isoformat(),
+            "Agency": rng.choice(AGENCIES),
+            "Amount": round(rng.uniform(1e5, 5e8), 2),
+            "Description": f"Contract {i}",
+        }
+        for i in range(n)
+    ]
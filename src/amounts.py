@@ -0,0 +1,129 @@
+"""
+Amount / value parsing shared by ingest, scoring and the backtest.
+
+Congressional disclosures report ranges ("$50,001 - $100,000",
+"$1,000,001 +"), insider filings mostly plain numbers. Both are parsed once
+at ingest into (low, high) bounds stored next to the raw string, so SQL can
+filter and sort on size. The same few range strings repeat across
+thousands of rows, so parse_range is memoized. parse_ranges is the
+vectorized variant used for backfills and the backtest.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Tuple
+
+_DIGITS = re.compile(r"\d+")
+
+Bounds = Tuple[Optional[int], Optional[int]]
+
+
+def _first_int(s: str) -> Optional[int]:
+    m = _DIGITS.search(s)
+    return int(m.group()) if m else None
+
+
+@lru_cache(maxsize=4096)
+def _parse_str(s: str) -> Bounds:
+    s = s.replace(",", "")
+    if "-" in s:
+        left, _, right = s.partition("-")
+        low = _first_int(left)
+        # No number before the dash ("-5000", "--"): not a range we can bound.
+        return (low, _first_int(right)) if low is not None else (None, None)
+    low = _first_int(s)
+    # "1000000+" is open-ended
+    return low, (None if "+" in s else low)
+
+
+def parse_range(value: Any) -> Bounds:
+    """
+    (low, high) bounds of a Quiver amount/value. Examples:
+      "$50,001 - $100,000" -> (50001, 100000)
+      "1,000,000+"         -> (1000000, None)
+      "250,000"            -> (250000, 250000)
+      12345                -> (12345, 12345)
+      None / "" / "--"     -> (None, None)
+      "-5000"              -> (None, None)
+    """
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, (int, float)):
+        if value != value:  # NaN
+            return None, None
+        return int(value), int(value)
+    s = str(value).strip()
+    return _parse_str(s) if s else (None, None)
+
+
+def low_bound(value: Any) -> int:
+    """Lower bound as a plain int, 0 when unknown (the scoring rules' proxy)."""
+    return parse_range(value)[0] or 0
+
+
+def parse_ranges(values: Iterable[Any]):
+    """
+    Vectorized parse_range: float64 arrays (low, high), NaN where unknown.
+    Matches parse_range for every input parse_range accepts.
+    """
+    import numpy as np
+    import pandas as pd
+
+    s = pd.Series(list(values), dtype=object)
+    numeric = s.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    text = s.where(~numeric & s.notna(), "").astype(str).str.replace(",", "", regex=False)
+
+    parts = text.str.partition("-")
+    ranged = text.str.contains("-", regex=False).to_numpy()
+    first = text.str.extract(r"(\d+)", expand=False).astype(float).to_numpy()
+    left = parts[0].str.extract(r"(\d+)", expand=False).astype(float).to_numpy()
+    right = parts[2].str.extract(r"(\d+)", expand=False).astype(float).to_numpy()
+    open_ended = text.str.contains("+", regex=False).to_numpy()
+
+    low = np.where(ranged, left, first)
+    high = np.where(ranged, np.where(np.isnan(left), np.nan, right), np.where(open_ended, np.nan, first))
+
+    if numeric.any():
+        nums = pd.to_numeric(s[numeric], errors="coerce").to_numpy(dtype=float)
+        nums = np.trunc(nums)
+        low[numeric] = nums
+        high[numeric] = nums
+    return low, high
+
+
+# -----------------------
+# Backfill
+# -----------------------
+# (table, raw column, low column, high column)
+RANGE_COLUMNS = (
+    ("trades", "amount", "amount_low", "amount_high"),
+    ("insider_trades", "value", "value_low", "value_high"),
+)
+
+
+def backfill(conn, chunk: int = 50000) -> int:
+    """
+    Fill the numeric bound columns of rows stored before they existed.
+    Rows whose raw value has no number stay NULL. The caller commits.
+    """
+    import numpy as np
+
+    filled = 0
+    for table, raw, low_col, high_col in RANGE_COLUMNS:
+        rows = conn.execute(
+            f"SELECT id, {raw} FROM {table} WHERE {low_col} IS NULL AND {raw} IS NOT NULL"
+        ).fetchall()
+        for i in range(0, len(rows), chunk):
+            part = rows[i:i + chunk]
+            low, high = parse_ranges(r[1] for r in part)
+            known = ~np.isnan(low)
+            conn.executemany(
+                f"UPDATE {table} SET {low_col}=?, {high_col}=? WHERE id=?",
+                (
+                    (int(lo), None if np.isnan(hi) else int(hi), r[0])
+                    for r, lo, hi, ok in zip(part, low, high, known) if ok
+                )
+            )
+            filled += int(known.sum())
+    if filled:
+        print(f"[amounts] backfilled numeric bounds on {filled} row(s)")
+    return filled
@@ -0,0 +1,306 @@
+"""
+Parallel history import for `main.py backfill --load DATASET`.
+
+A stored snapshot of a historical payload (e.g. years of
+/historical/insidertrading) is read in chunks of `chunk_rows` raw rows.
+Each chunk is split by ticker into shards for a process pool. Workers
+normalize, hash, dedupe and score their shards. They have no SQLite
+connection. They score against a copy of the parent's award and event
+indexes and actor stats, taken once when the pool starts. Cluster counts
+come from a window the parent builds before the pool starts, holding the
+trades stored or archived plus every government disclosure in the
+snapshot. Each shard is sent only its own tickers' part of it. A trade's
+cluster count therefore sees the whole history within cluster_days up to
+its disclosure day, whatever chunk_rows is or wherever the import
+resumed. The parent is the only writer. It
+bulk-inserts each chunk's new rows and their scores, then commits them
+together with a checkpoint (raw rows done), so an interrupted import
+resumes after its last committed chunk. Rows retention already archived
+count as stored, so they are not imported (and counted) again.
+
+    python src/main.py fetch --datasets insider_trades
+    python src/main.py backfill --load insider_trades --workers 8
+"""
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import metrics
+import patterns
+from config import CONFIG
+from dates import iso_date
+from ingest import (
+    government_fields, insert_new, insider_fields, norm_side, norm_ticker, normalize_government, normalize_insider,
+    safe_get,
+)
+from patterns import add_events, observe_trades
+from retention import open_archive, table_or_archive
+from scores import government_pick, insider_pick, save_picks
+from scoring import score_government_trades, score_insider_trade
+
+
+def _cfg() -> Dict[str, Any]:
+    return CONFIG.get("backfill", {}) or {}
+
+
+class Dataset(NamedTuple):
+    table: str
+    source: str          # patterns event source
+    normalize: Callable[..., Iterable[Any]]
+    ticker_keys: Tuple[str, ...]
+    pick: Callable[..., Any]
+
+
+DATASETS: Dict[str, Dataset] = {
+    "government_trades": Dataset(
+        "trades", "government", normalize_government, government_fields().fields[0][1], government_pick,
+    ),
+    "insider_trades": Dataset(
+        "insider_trades", "insider", normalize_insider, insider_fields().fields[0][1], insider_pick,
+    ),
+}
+
+
+# -----------------------
+# Workers
+# -----------------------
+
+def _worker_state(conn) -> Tuple[Any, ...]:
+    """Everything scoring reads from the database but clusters, loaded once in the parent."""
+    from patterns import award_index, event_index
+    from track_record import actor_stats
+
+    return award_index(conn), event_index(conn), actor_stats(conn)
+
+
+def _init_worker(awards, events, stats):
+    import track_record
+
+    patterns.AWARDS, patterns.EVENTS = awards, events
+    track_record._stats = stats
+
+
+def _history_window(conn, dataset: str, sha: str, since: Optional[str]):
+    """
+    A never-expiring cluster window over every stored or archived trade and
+    every government disclosure in the snapshot (from `since`), so history
+    is scored as of its own dates. None for datasets scored without clusters.
+    """
+    from patterns import stored_window
+    from quiver_client import snapshot_records
+
+    if DATASETS[dataset].source != "government":
+        return None
+    window = stored_window(conn, table=table_or_archive(conn, "trades"))
+    fields = government_fields()
+    for row in snapshot_records(sha):
+        ticker, actor, _, side, _, _, disclosed, _ = fields.extract(row)
+        day = iso_date(disclosed)
+        if not since or (day and day >= since):
+            window.add(norm_ticker(ticker), norm_side(side), actor, day)
+    return window
+
+
+def _score_shard(dataset: str, rows: List[Dict[str, Any]], since: Optional[str], clusters=None):
+    """
+    Normalize, dedupe and score one shard (all rows of its tickers in the
+    chunk) against `clusters`, the history window of its tickers. Returns
+    (records, (score, reasons) per record, per-dataset counters, seconds
+    spent).
+    """
+    t0 = time.perf_counter()
+    run = metrics.start(command="backfill")
+    spec = DATASETS[dataset]
+
+    seen = set()
+    records = []
+    for r in spec.normalize(rows, since=since, quiet=True):
+        if r.tid not in seen:
+            seen.add(r.tid)
+            records.append(r)
+
+    # The window already holds this shard's trades, so they count toward
+    # their own clusters as in main.collect. Convergence only counts the
+    # other source, so the event index needs no update here.
+    if spec.source == "government":
+        patterns.CLUSTERS = clusters
+        scored = score_government_trades(records)
+    else:
+        scored = [score_insider_trade(t) for t in records]
+    return records, scored, run.datasets, time.perf_counter() - t0
+
+
+# -----------------------
+# Sharding
+# -----------------------
+
+def _shard(
+    rows: List[Dict[str, Any]], keys: Tuple[str, ...], n: int
+) -> List[Tuple[set, List[Dict[str, Any]]]]:
+    """Split raw rows into n (tickers, rows) shards by a stable hash of the normalized ticker."""
+    shards: List[Tuple[set, List[Dict[str, Any]]]] = [(set(), []) for _ in range(n)]
+    for row in rows:
+        ticker = norm_ticker(safe_get(row, *keys)) or ""
+        tickers, part = shards[zlib.crc32(ticker.encode("utf-8")) % n]
+        tickers.add(ticker)
+        part.append(row)
+    return [s for s in shards if s[1]]
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# -----------------------
+# Checkpoints
+# -----------------------
+
+def checkpoint(conn, dataset: str, sha: str) -> Tuple[int, int, Optional[str]]:
+    """(raw rows done, new rows written, finished_at) of a snapshot's import."""
+    row = conn.execute(
+        "SELECT rows_done, rows_new, finished_at FROM backfill_checkpoints WHERE dataset=? AND sha=?",
+        (dataset, sha)
+    ).fetchone()
+    return (row[0], row[1], row[2]) if row else (0, 0, None)
+
+
+def _save_checkpoint(conn, dataset: str, sha: str, rows_done: int, rows_new: int, finished: bool = False):
+    now = datetime.now(timezone.utc).isoformat()
+    conn.execute(
+        "INSERT INTO backfill_checkpoints (dataset, sha, rows_done, rows_new, updated_at, finished_at) "
+        "VALUES (?,?,?,?,?,?) ON CONFLICT(dataset, sha) DO UPDATE SET rows_done=excluded.rows_done, "
+        "rows_new=excluded.rows_new, updated_at=excluded.updated_at, finished_at=excluded.finished_at",
+        (dataset, sha, rows_done, rows_new, now, now if finished else None)
+    )
+
+
+# -----------------------
+# Writer
+# -----------------------
+
+def _write_chunk(conn, dataset: str, futures) -> Tuple[int, int, float]:
+    """Bulk-load one chunk's shard results. Returns (new rows, undated rows, worker seconds)."""
+    spec = DATASETS[dataset]
+    records: List[Any] = []
+    scored: List[Tuple[int, List[str]]] = []
+    undated = 0
+    busy = 0.0
+    for f in futures:
+        recs, scores, counters, seconds = f.result()
+        records.extend(recs)
+        scored.extend(scores)
+        busy += seconds
+        for ds, per in counters.items():
+            undated += per.get("rows_undated", 0)
+            for name, n in per.items():
+                metrics.incr(name, n, ds)
+
+    with metrics.stage("write"):
+        fresh = insert_new(conn, spec.table, records, known_in=table_or_archive(conn, spec.table))
+        ids = {r.tid for r in fresh}
+        save_picks(conn, (
+            spec.pick(t, score, reasons) for t, (score, reasons) in zip(records, scored) if t.tid in ids
+        ))
+        add_events(spec.source, fresh)
+        if spec.source == "government":
+            observe_trades(conn, fresh)
+    metrics.incr("rows_new", len(fresh), dataset)
+    metrics.incr("rows_scored", len(fresh), dataset)
+    return len(fresh), undated, busy
+
+
+def load_history(
+    conn,
+    dataset: str,
+    sha: str,
+    since: Optional[str] = None,
+    workers: Optional[int] = None,
+    restart: bool = False,
+) -> int:
+    """
+    Import the snapshot `sha` of `dataset` across a process pool, committing
+    each chunk with its checkpoint. Resumes an unfinished import of the same
+    snapshot unless `restart`. Returns the number of new rows written.
+    """
+    from quiver_client import snapshot_records
+
+    if dataset not in DATASETS:
+        raise ValueError(f"backfill: cannot load {dataset!r}; expected one of {tuple(DATASETS)}")
+    done, new, finished = (0, 0, None) if restart else checkpoint(conn, dataset, sha)
+    if finished:
+        print(f"[backfill] {dataset}: snapshot {sha[:12]} already loaded ({new} new rows, {finished[:19]}).")
+        return 0
+    if done:
+        print(f"[backfill] {dataset}: resuming snapshot {sha[:12]} after {done:,} rows.")
+
+    cfg = _cfg()
+    workers = workers or int(cfg.get("workers") or 0) or os.cpu_count() or 1   # 0 = one per CPU
+    chunk_rows = int(cfg.get("chunk_rows", 100000))
+    shards = workers * int(cfg.get("shards_per_worker", 4))
+    spec = DATASETS[dataset]
+    # Archived rows are history too: dedupe (and cluster) against them.
+    open_archive(conn, ("trades", spec.table))
+    state = _worker_state(conn)
+    window = _history_window(conn, dataset, sha, since)
+
+    rows = islice(snapshot_records(sha), done, None)
+    t0 = time.perf_counter()
+    total = loaded = undated = 0
+    busy = 0.0
+
+    def write(pending) -> None:
+        nonlocal done, new, total, loaded, undated, busy
+        n_rows, futures = pending
+        fresh, n_undated, seconds = _write_chunk(conn, dataset, futures)
+        done += n_rows
+        new += fresh
+        total += n_rows
+        loaded += fresh
+        undated += n_undated
+        busy += seconds
+        _save_checkpoint(conn, dataset, sha, done, new)
+        conn.commit()
+        elapsed = time.perf_counter() - t0
+        print(
+            f"[backfill] {dataset}: {done:,} rows, {new:,} new | "
+            f"{total / elapsed:,.0f} rows/s | workers {busy / (elapsed * workers):.0%} busy"
+        )
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=state)
+    try:
+        # One chunk is scored while the previous one is written.
+        in_flight: deque = deque()
+        for chunk in _chunks(rows, chunk_rows):
+            in_flight.append((len(chunk), [
+                pool.submit(_score_shard, dataset, part, since, window and window.subset(tickers))
+                for tickers, part in _shard(chunk, spec.ticker_keys, shards)
+            ]))
+            if len(in_flight) > 1:
+                write(in_flight.popleft())
+        while in_flight:
+            write(in_flight.popleft())
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    _save_checkpoint(conn, dataset, sha, done, new, finished=True)
+    conn.commit()
+    elapsed = time.perf_counter() - t0
+    if undated:
+        print(f"[backfill] {dataset}: {undated} row(s) without a parseable date")
+    print(
+        f"[backfill] {dataset}: loaded {loaded:,} new of {total:,} rows in {elapsed:.1f}s "
+        f"({total / elapsed if elapsed else 0:,.0f} rows/s on {workers} workers)"
+    )
+    return loaded
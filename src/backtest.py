@@ -0,0 +1,535 @@
+"""
+Backtest scoring weights over stored history.
+
+Every stored trade is replayed as of its disclosure date (filing date for
+insiders) using only what was known then: distinct cluster buyers and
+sellers over earlier disclosures, contracts awarded on or before that day, other-source buys
+already filed, and the actor's forward returns that had already matured.
+The config.yaml rules (rules.py) are evaluated over those feature columns
+with numpy masks. Which rules match does not depend on the weights, so the
+matches are computed once into a matrix with one column per weight key. A
+weight config's scores are then a single matrix product, and a grid of
+configs is evaluated in a process pool that reads the matrix from shared
+memory.
+
+    python src/backtest.py --grid buy_base=15,25,35 --grid cluster_bonus=0:30:5 \\
+        --grid high_conviction=75,85 --top 20 --out backtest.csv
+
+`--rules FILE` evaluates another rule set (a yaml file with `rules` and/or
+`scoring` sections that replace config.yaml's per kind / per weight).
+
+Trades moved out of data.db by retention.py are included unless
+--no-archive is given. pandas / numpy are imported inside the functions
+that need them.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import CONFIG
+from rules import FEATURES, MAX_SCORE, RuleSet, compile_rules
+from storage import get_conn
+
+# Day numbers are packed with a group code into one sortable int64 key.
+_KEY_SHIFT = 1 << 20
+
+# Configs scored per worker task (bounds the n_trades x chunk score matrix).
+CHUNK_CONFIGS = 16
+
+
+# -----------------------
+# Loading
+# -----------------------
+
+def load_trades(conn):
+    """
+    All dated trades, both kinds, with the raw fields the rules read
+    (archived ones too once retention.open_archive ran on `conn`).
+    """
+    import pandas as pd
+    from retention import table_or_archive
+
+    return pd.read_sql_query(
+        "SELECT id, 'government' AS kind, person AS actor, ticker, side, amount, amount_low, chamber AS role, "
+        "COALESCE(transaction_date, disclosed_date) AS tx_date, disclosed_date AS date "
+        f"FROM {table_or_archive(conn, 'trades')} "
+        "WHERE ticker IS NOT NULL AND disclosed_date IS NOT NULL "
+        "UNION ALL "
+        "SELECT id, 'insider' AS kind, insider AS actor, ticker, side, value AS amount, "
+        "value_low AS amount_low, role, "
+        "transaction_date AS tx_date, COALESCE(filed_date, transaction_date) AS date "
+        f"FROM {table_or_archive(conn, 'insider_trades')} "
+        "WHERE ticker IS NOT NULL AND COALESCE(filed_date, transaction_date) IS NOT NULL",
+        conn,
+    )
+
+
+# -----------------------
+# Features (weight independent, as of each trade's disclosure)
+# -----------------------
+
+def _raw(series):
+    """Column as Python objects with None for missing, as the scoring helpers expect."""
+    return series.astype(object).where(series.notna(), None)
+
+
+def _day_numbers(values):
+    """YYYY-MM-DD strings -> int days since epoch (-1 where missing)."""
+    import numpy as np
+    import pandas as pd
+
+    dt = pd.to_datetime(pd.Series(values), errors="coerce", format="mixed")
+    days = dt.to_numpy(dtype="datetime64[D]").astype("int64")
+    return np.where(dt.isna().to_numpy(), -1, days)
+
+
+def _window_counts(group_codes, days, ref_codes, ref_days, lo_offset: int, hi_offset: int):
+    """
+    For each (group, day) query, count reference rows of the same group
+    whose day falls in (day + lo_offset, day + hi_offset].
+    """
+    import numpy as np
+
+    keys = np.sort(ref_codes.astype("int64") * _KEY_SHIFT + ref_days)
+    q = group_codes.astype("int64") * _KEY_SHIFT + days
+    return np.searchsorted(keys, q + hi_offset, side="right") - np.searchsorted(keys, q + lo_offset, side="right")
+
+
+def window_distinct(group_codes, days, ref_codes, ref_days, ref_actors, span: int):
+    """
+    For each (group, day) query, the number of distinct reference actors of
+    the same group with a day in [day - span, day]. Undated rows never match.
+    """
+    import numpy as np
+
+    out = np.zeros(len(days), dtype="int64")
+    dated = ref_days >= 0
+    keys = ref_codes[dated].astype("int64") * _KEY_SHIFT + ref_days[dated]
+    order = np.argsort(keys, kind="stable")
+    keys, actors = keys[order], ref_actors[dated][order]
+    q = group_codes.astype("int64") * _KEY_SHIFT + days
+    lo = np.searchsorted(keys, q - span, side="left")
+    hi = np.searchsorted(keys, q, side="right")
+    seen: Dict[Tuple[int, int], int] = {}
+    for i in np.flatnonzero((hi > lo) & (days >= 0)):
+        span_key = (int(lo[i]), int(hi[i]))
+        if span_key not in seen:
+            seen[span_key] = len(set(actors[lo[i]:hi[i]].tolist()))
+        out[i] = seen[span_key]
+    return out
+
+
+def convergence_counts(ticker_codes, event_day, day, is_gov, buy, actor_codes, days: int):
+    """
+    Per trade: the number of distinct actors from the other source
+    (government vs insider) buying the same ticker within +/- `days` of its
+    event day and filed no later than its own disclosure day, as
+    patterns.convergence_buyers counts them live: for every government
+    trade, and for insider buys only.
+    """
+    import numpy as np
+
+    out = np.zeros(len(day), dtype="int64")
+    dated = (event_day >= 0) & (ticker_codes >= 0)
+    for mine, other in ((is_gov, ~is_gov & buy), (~is_gov & buy, is_gov & buy)):
+        q = np.flatnonzero(dated & mine)
+        ref = np.flatnonzero(dated & other)
+        if not len(q) or not len(ref):
+            continue
+        keys = ticker_codes[ref].astype("int64") * _KEY_SHIFT + event_day[ref]
+        order = np.argsort(keys, kind="stable")
+        keys, filed, actors = keys[order], day[ref][order], actor_codes[ref][order]
+        qk = ticker_codes[q].astype("int64") * _KEY_SHIFT + event_day[q]
+        lo = np.searchsorted(keys, qk - days, side="left")
+        hi = np.searchsorted(keys, qk + days, side="right")
+        # Windows are a handful of rows; only those with candidates are scanned.
+        for i in np.flatnonzero(hi > lo):
+            known = filed[lo[i]:hi[i]] <= day[q[i]]
+            out[q[i]] = len(set(actors[lo[i]:hi[i]][known].tolist()))
+    return out
+
+
+def actor_history(kinds, actors, day, ret, matured):
+    """
+    Per trade: how many of the same (kind, actor)'s returns (as
+    track_record.actor_returns gives them) had matured strictly before its
+    day, and their mean (NaN when none).
+    """
+    import numpy as np
+    import pandas as pd
+
+    named = actors.fillna("").astype(str).to_numpy() != ""
+    codes, _ = pd.factorize(kinds.astype(str) + "\x1f" + actors.fillna("").astype(str))
+    codes = codes.astype("int64")
+
+    known = (matured >= 0) & named
+    ref = codes[known] * _KEY_SHIFT + matured[known]
+    order = np.argsort(ref, kind="stable")
+    keys = ref[order]
+    csum = np.concatenate([[0.0], np.cumsum(ret[known][order])])
+
+    hi = np.searchsorted(keys, codes * _KEY_SHIFT + day, side="left")
+    lo = np.searchsorted(keys, codes * _KEY_SHIFT, side="left")
+    count = np.where(named, hi - lo, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.where(count > 0, (csum[hi] - csum[lo]) / np.maximum(count, 1), np.nan)
+    return count, avg
+
+
+def build_features(conn=None, horizon: Optional[int] = None):
+    """
+    Returns (trades frame, rule feature columns frame (rules.FEATURES),
+    forward return array at `horizon` trading days, NaN where unpriced).
+    """
+    import numpy as np
+    import pandas as pd
+
+    from amounts import parse_ranges
+    from ingest import norm_side
+    from pricing import forward_returns, load_closes
+    from retention import table_or_archive
+    from track_record import actor_returns, settings
+
+    conn = conn or get_conn()
+    history_cfg = settings()
+    horizon = int(horizon or history_cfg.horizon)
+    patterns_cfg = CONFIG.get("patterns", {})
+    cluster_days = int(patterns_cfg.get("cluster_days", 10))
+    contract_window = int(patterns_cfg.get("contract_window_days", 14))
+    convergence_days = int(patterns_cfg.get("convergence_days", 7))
+
+    trades = load_trades(conn)
+    n = len(trades)
+    is_gov = (trades["kind"] == "government").to_numpy()
+    day = _day_numbers(trades["date"])
+    tx_day = _day_numbers(trades["tx_date"])
+
+    side = _raw(trades["side"]).map(norm_side).to_numpy()
+    buy = side == "BUY"
+    # Parsed bounds, re-parsed only for rows stored (or archived) before ingest did it.
+    amount = trades["amount_low"].to_numpy(dtype=float)
+    unparsed = np.isnan(amount)
+    if unparsed.any():
+        amount[unparsed] = parse_ranges(_raw(trades["amount"])[unparsed])[0]
+    amount = np.nan_to_num(amount)
+
+    # Government age is that of the disclosure itself (0 at replay time);
+    # insider age that of the transaction as seen at filing.
+    age = np.where(is_gov, 0.0, np.where(tx_day >= 0, day - tx_day, np.nan))
+
+    ticker_codes, tickers = pd.factorize(trades["ticker"])
+
+    # Clusters: distinct members buying / selling the ticker in the trailing
+    # window, this disclosure included (it is already stored when the live
+    # run scores it).
+    gov_idx = np.flatnonzero(is_gov)
+    actor_codes, _ = pd.factorize(trades["actor"].fillna("").astype(str))
+    cluster = np.zeros(n, dtype="int64")
+    cluster_sellers = np.zeros(n, dtype="int64")
+    for out, which in ((cluster, "BUY"), (cluster_sellers, "SELL")):
+        ref = np.flatnonzero(is_gov & (side == which))
+        if len(gov_idx) and len(ref):
+            out[gov_idx] = window_distinct(
+                ticker_codes[gov_idx], day[gov_idx],
+                ticker_codes[ref], day[ref], actor_codes[ref], cluster_days,
+            )
+
+    # Contracts awarded in the window up to (not after) the disclosure day.
+    contract = np.zeros(n, dtype=bool)
+    awards = pd.read_sql_query(
+        f"SELECT ticker, award_date FROM {table_or_archive(conn, 'contracts')} "
+        "WHERE ticker IS NOT NULL AND award_date IS NOT NULL", conn
+    )
+    if len(gov_idx) and not awards.empty:
+        award_codes = tickers.get_indexer(awards["ticker"])
+        keep = award_codes >= 0
+        hits = _window_counts(
+            ticker_codes[gov_idx], day[gov_idx],
+            award_codes[keep], _day_numbers(awards["award_date"])[keep],
+            -contract_window - 1, 0,
+        )
+        contract[gov_idx] = hits > 0
+
+    # Insider rows without a transaction date are dated by filing, as live.
+    event_day = np.where(tx_day >= 0, tx_day, day)
+    convergence = convergence_counts(ticker_codes, event_day, day, is_gov, buy, actor_codes, convergence_days)
+
+    # Forward returns, and the day each one became known (its horizon close).
+    events = trades[["ticker", "date"]]
+    closes = load_closes(conn, tickers)
+    ret = forward_returns(events, closes, (horizon,))[f"ret_{horizon}"].to_numpy(dtype=float)
+    # The track record scores sells by the decline they anticipated, as live.
+    actor_ret = actor_returns(side, ret)
+    matured = np.full(n, -1, dtype="int64")
+    if not closes.empty:
+        trading_days = closes.index.to_numpy(dtype="datetime64[D]")
+        pos = np.searchsorted(trading_days, np.where(day >= 0, day, 0).astype("datetime64[D]"), side="left")
+        ok = (day >= 0) & (pos + horizon < len(trading_days)) & ~np.isnan(actor_ret)
+        matured[ok] = trading_days[pos[ok] + horizon].astype("int64")
+
+    # Actor track record from returns that matured before the disclosure day.
+    scored, avg = actor_history(trades["kind"], trades["actor"], day, actor_ret, matured)
+    proven = scored >= history_cfg.min_trades
+    history = np.full(n, None, dtype=object)
+    history[proven & (avg >= history_cfg.good_return)] = "good"
+    history[proven & (avg < history_cfg.poor_return)] = "poor"
+
+    features = pd.DataFrame({
+        "kind": trades["kind"].to_numpy(),
+        "side": side,
+        "amount": amount,
+        "role": _raw(trades["role"]).to_numpy(),
+        "age": age,
+        "cluster": cluster,
+        "cluster_sellers": cluster_sellers,
+        "contract": contract,
+        "convergence": convergence,
+        "history": history,
+        "history_avg": np.where(proven, avg, np.nan),
+    })
+    return trades, features, ret
+
+
+def rule_matrix(features, rule_sets: Dict[str, RuleSet]):
+    """
+    Returns (X int8 [n x weight keys], {weight key: default weight}).
+    X counts the rules of each weight key that matched each trade, so a
+    weight config scores as min(X @ weights, MAX_SCORE).
+    """
+    import numpy as np
+
+    weights: Dict[str, float] = {}
+    for rs in rule_sets.values():
+        for rule in rs.rules:
+            weights.setdefault(rule.key, rule.weight)
+    keys = list(weights)
+
+    X = np.zeros((len(features), len(keys)), dtype=np.int8)
+    kinds = features["kind"].to_numpy()
+    for kind, rs in rule_sets.items():
+        rows = np.flatnonzero(kinds == kind)
+        if not len(rows):
+            continue
+        columns = features.iloc[rows][list(FEATURES[kind])].reset_index(drop=True)
+        for rule, mask in zip(rs.rules, rs.masks(columns, len(rows))):
+            X[rows[mask], keys.index(rule.key)] += 1
+    return X, weights
+
+
+# -----------------------
+# Evaluation
+# -----------------------
+
+def evaluate(X, ret, weights, threshold: int) -> Dict[str, Any]:
+    """Forward-return stats of the trades a single weight config would flag."""
+    return _evaluate_many(X, ret, [(weights, threshold)])[0]
+
+
+def _evaluate_many(X, ret, configs: Sequence[Tuple[Sequence[float], int]]) -> List[Dict[str, Any]]:
+    import numpy as np
+
+    W = np.array([w for w, _ in configs], dtype=np.float32).T
+    thresholds = np.array([t for _, t in configs], dtype=np.float32)
+    scores = np.minimum(X.astype(np.float32) @ W, MAX_SCORE)
+    flagged = scores >= thresholds
+
+    out = []
+    for j in range(len(configs)):
+        r = ret[flagged[:, j]]
+        n = len(r)
+        out.append({
+            "signals": int(n),
+            "mean_ret": float(r.mean()) if n else float("nan"),
+            "median_ret": float(np.median(r)) if n else float("nan"),
+            "hit_rate": float((r > 0).mean()) if n else float("nan"),
+        })
+    return out
+
+
+# Worker state: attached once per process in _init_worker.
+_X = None
+_RET = None
+_SHM: List[Any] = []
+
+
+def _share(arr):
+    """Copy an array into a named shared-memory block; returns (shm, spec)."""
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(spec):
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    _SHM.append(shm)  # keep the mapping alive for the worker's lifetime
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _init_worker(x_spec, ret_spec):
+    global _X, _RET
+    _X = _attach(x_spec)
+    _RET = _attach(ret_spec)
+
+
+def _evaluate_chunk(configs):
+    return _evaluate_many(_X, _RET, configs)
+
+
+def parse_grid(specs: Sequence[str], keys: Sequence[str]) -> Dict[str, List[float]]:
+    """
+    ["buy_base=15,25,35", "cluster_bonus=0:30:5"] -> {name: values}, for
+    names among the rules' weight `keys`. Ranges are start:stop:step,
+    inclusive of stop.
+    """
+    grid: Dict[str, List[float]] = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip()
+        if name not in keys and name != "high_conviction":
+            raise ValueError(f"unknown grid key {name!r}; expected one of {list(keys) + ['high_conviction']}")
+        if ":" in values:
+            start, stop, step = (float(v) for v in values.split(":"))
+            count = int(round((stop - start) / step)) + 1
+            grid[name] = [start + i * step for i in range(count)]
+        else:
+            grid[name] = [float(v) for v in values.split(",") if v.strip()]
+    return grid
+
+
+def expand_grid(grid: Dict[str, List[float]], weights: Dict[str, float]) -> List[Dict[str, float]]:
+    """Cartesian product over the grid, other weights taken from the rules."""
+    base = {k: float(w) for k, w in weights.items()}
+    base["high_conviction"] = float(CONFIG.get("thresholds", {}).get("high_conviction", 85))
+    names = list(grid)
+    return [
+        {**base, **dict(zip(names, combo))}
+        for combo in itertools.product(*(grid[n] for n in names))
+    ] or [base]
+
+
+def sweep(X, ret, configs: Sequence[Dict[str, float]], keys: Sequence[str], workers: Optional[int] = None):
+    """
+    Evaluate every config; returns a DataFrame of configs plus their stats.
+    Only priced trades take part. The matrix and returns are placed in
+    shared memory once and every worker maps them instead of receiving a copy.
+    """
+    import numpy as np
+    import pandas as pd
+
+    priced = ~np.isnan(ret)
+    X = np.ascontiguousarray(X[priced])
+    ret = np.ascontiguousarray(ret[priced])
+
+    packed = [([c[k] for k in keys], c["high_conviction"]) for c in configs]
+    chunks = [packed[i:i + CHUNK_CONFIGS] for i in range(0, len(packed), CHUNK_CONFIGS)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        stats = [s for chunk in chunks for s in _evaluate_many(X, ret, chunk)]
+    else:
+        x_shm, x_spec = _share(X)
+        r_shm, r_spec = _share(ret)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(x_spec, r_spec)
+            ) as pool:
+                stats = [s for part in pool.map(_evaluate_chunk, chunks) for s in part]
+        finally:
+            for shm in (x_shm, r_shm):
+                shm.close()
+                shm.unlink()
+
+    out = pd.concat([pd.DataFrame(configs), pd.DataFrame(stats)], axis=1)
+    out["excess_ret"] = out["mean_ret"] - (float(ret.mean()) if len(ret) else float("nan"))
+    return out
+
+
+# -----------------------
+# CLI
+# -----------------------
+
+def load_rule_sets(path: Optional[str] = None) -> Dict[str, RuleSet]:
+    """config.yaml's rules, with `rules` kinds and `scoring` weights from `path` on top."""
+    if not path:
+        return compile_rules()
+    import yaml
+
+    with open(path) as f:
+        override = yaml.safe_load(f) or {}
+    merged = dict(CONFIG)
+    for section in ("rules", "scoring"):
+        merged[section] = {**(CONFIG.get(section) or {}), **(override.get(section) or {})}
+    return compile_rules(merged)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sweep scoring weights over stored trades.")
+    ap.add_argument("--grid", action="append", default=[],
+                    help="weight=v1,v2,... or weight=start:stop:step (repeatable); "
+                         "high_conviction is also accepted")
+    ap.add_argument("--horizon", type=int, help="forward-return horizon in trading days (default history.horizon_days)")
+    ap.add_argument("--min-signals", type=int, default=20, help="ignore configs flagging fewer trades")
+    ap.add_argument("--workers", type=int, help="process pool size (default: CPU count)")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--out", help="write every config's results to this CSV")
+    ap.add_argument("--sync-prices", action="store_true", help="fetch missing closes first")
+    ap.add_argument("--no-archive", action="store_true", help="only use trades still in data.db")
+    ap.add_argument("--rules", help="yaml file whose `rules` / `scoring` replace config.yaml's")
+    args = ap.parse_args(argv)
+    rule_sets = load_rule_sets(args.rules)
+
+    conn = get_conn()
+    if not args.no_archive:
+        from retention import open_archive
+
+        n = open_archive(conn)
+        if n:
+            print(f"[backtest] loaded {n} archived rows")
+    if args.sync_prices:
+        from pricing import sync_prices
+        sync_prices(conn)
+
+    t0 = time.perf_counter()
+    trades, features, ret = build_features(conn, args.horizon)
+    priced = int((ret == ret).sum())
+    print(f"[backtest] {len(trades)} trades, {priced} priced; features in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    X, weights = rule_matrix(features, rule_sets)
+    keys = list(weights)
+    print(f"[backtest] {sum(len(rs.rules) for rs in rule_sets.values())} rules in {time.perf_counter() - t0:.1f}s")
+
+    grid = parse_grid(args.grid, keys)
+    configs = expand_grid(grid, weights)
+    t0 = time.perf_counter()
+    results = sweep(X, ret, configs, keys, args.workers)
+    print(f"[backtest] {len(configs)} configs in {time.perf_counter() - t0:.1f}s")
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f"[backtest] wrote {args.out}")
+
+    ranked = results[results["signals"] >= args.min_signals].sort_values("mean_ret", ascending=False)
+    if ranked.empty:
+        print(f"[backtest] no config flagged at least {args.min_signals} priced trades")
+        return results
+    cols = (list(grid) or keys) + ["signals", "mean_ret", "median_ret", "hit_rate", "excess_ret"]
+    print(ranked[cols].head(args.top).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    return results
+
+
+if __name__ == "__main__":
+    from storage import init_db
+
+    init_db()
+    main()
@@ -1,11 +1,39 @@
 import os
-import yaml
+from collections.abc import Mapping
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
 
-with open(os.path.join(BASE_DIR, "config.yaml")) as f:
-    CONFIG = yaml.safe_load(f)
+
+class _LazyConfig(Mapping):
+    """config.yaml, parsed (and yaml imported) on first access."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._data = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            import yaml
+
+            with open(self._path) as f:
+                self._data = yaml.safe_load(f) or {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+CONFIG = _LazyConfig(CONFIG_PATH)
 
 QUIVER_API_KEY = os.getenv("QUIVER_API_KEY", "PUT_KEY_HERE")
+QUIVER_BASE_URL = os.getenv("QUIVER_BASE_URL", "https://api.quiverquant.com/beta")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "PUT_TOKEN_HERE")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "PUT_CHAT_ID_HERE")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
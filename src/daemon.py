@@ -0,0 +1,186 @@
+"""
+Long-running monitor with an in-process scheduler.
+
+Replaces the cron-style workflows (one cold process per run) with a single
+resident process that keeps its warm state between runs: the SQLite
+connection, the pooled Quiver / Telegram sessions, fetch validators, the
+contract award index and the parsed-date cache.
+
+Schedule (config.yaml `daemon`):
+  - full check of every dataset every `check_every_minutes`
+  - the live congress feed alone every `congress_every_minutes`
+  - digests at `digest_times_utc`, built from stored scores (no API calls)
+  - retention (prune / archive / vacuum) daily at `retention_time_utc`
+  - price sync and track-record refresh daily at `history_time_utc`
+
+SIGTERM / SIGINT stop the loop after the current job finishes.
+
+    python src/daemon.py
+"""
+import signal
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import track_record
+from config import CONFIG
+from main import run_cycle, run_stage
+from storage import get_conn, init_db
+
+
+def _cfg() -> Dict[str, Any]:
+    return CONFIG.get("daemon", {}) or {}
+
+
+# -----------------------
+# Scheduling
+# -----------------------
+
+class Job:
+    """A named callable due either every `every` or daily at `at` (HH:MM UTC) times."""
+
+    def __init__(self, name: str, fn: Callable[[], None],
+                 every: Optional[timedelta] = None, at: Sequence[str] = ()):
+        if not every and not at:
+            raise ValueError(f"job {name} needs an interval or times of day")
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.at = sorted(tuple(int(x) for x in t.split(":")) for t in at)
+        self.next_run: Optional[datetime] = None
+
+    def schedule_after(self, now: datetime):
+        if self.every:
+            nxt = self.next_run or now
+            while nxt <= now:  # skip slots missed while another job ran
+                nxt += self.every
+            self.next_run = nxt
+            return
+        for days in (0, 1):
+            day = (now + timedelta(days=days)).date()
+            for hh, mm in self.at:
+                t = datetime(day.year, day.month, day.day, hh, mm, tzinfo=timezone.utc)
+                if t > now:
+                    self.next_run = t
+                    return
+
+    def defer(self, now: datetime):
+        """Push an interval job a full interval out (its work was just covered)."""
+        if self.every:
+            self.next_run = max(self.next_run or now, now + self.every)
+
+
+class Scheduler:
+    """Single-threaded: runs the earliest due job, sleeps until the next one."""
+
+    def __init__(self, jobs: List[Job]):
+        self.jobs = jobs
+        self.stop = threading.Event()
+
+    def run(self, run_first: Sequence[str] = ()):
+        now = datetime.now(timezone.utc)
+        for job in self.jobs:
+            if job.name in run_first:
+                job.next_run = now
+            else:
+                job.schedule_after(now)
+
+        while not self.stop.is_set():
+            job = min(self.jobs, key=lambda j: j.next_run)
+            wait = (job.next_run - datetime.now(timezone.utc)).total_seconds()
+            if wait > 0:
+                print(f"[daemon] next: {job.name} at {job.next_run:%Y-%m-%d %H:%M:%S} UTC")
+                if self.stop.wait(wait):
+                    break
+            try:
+                job.fn()
+            except Exception:
+                # A failed run is already recorded in the runs table; keep serving.
+                print(f"[daemon] {job.name} failed:\n{traceback.format_exc()}")
+            job.schedule_after(datetime.now(timezone.utc))
+
+    def request_stop(self, signum=None, frame=None):
+        if not self.stop.is_set():
+            print(f"[daemon] received signal {signum}; stopping after the current job.")
+        self.stop.set()
+
+
+# -----------------------
+# Monitor jobs
+# -----------------------
+
+class Monitor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.jobs: List[Job] = []
+
+    def _covered(self, *names: str):
+        now = datetime.now(timezone.utc)
+        for job in self.jobs:
+            if job.name in names:
+                job.defer(now)
+
+    def check(self):
+        run_cycle(self.conn, digest=False)
+        self._covered("congress")
+
+    def congress(self):
+        run_cycle(self.conn, datasets=["government_trades"], digest=False)
+
+    def digest(self):
+        # Stats may also be refreshed out of process (`main.py history` or
+        # track_record.py); reload before each digest (it may score stored
+        # trades that have no score yet).
+        track_record.invalidate()
+        run_cycle(self.conn, fetch=False)
+
+    def retention(self):
+        run_stage("retention", conn=self.conn)
+
+    def history(self):
+        run_stage("history", conn=self.conn)
+
+    def build_jobs(self) -> List[Job]:
+        cfg = _cfg()
+        check_every = float(cfg.get("check_every_minutes", 60))
+        congress_every = float(cfg.get("congress_every_minutes", 15))
+        retention_at: Optional[str] = cfg.get("retention_time_utc", "03:30")
+        history_at: Optional[str] = cfg.get("history_time_utc", "07:30")
+
+        # On ties the earlier job runs first: check before a digest due at the
+        # same minute, so the digest sees that check's scores.
+        self.jobs = [Job("check", self.check, every=timedelta(minutes=check_every))]
+        if congress_every and congress_every < check_every:
+            self.jobs.append(Job("congress", self.congress, every=timedelta(minutes=congress_every)))
+        self.jobs.append(Job("digest", self.digest, at=cfg.get("digest_times_utc", ["08:00", "16:00"])))
+        if retention_at:
+            self.jobs.append(Job("retention", self.retention, at=[retention_at]))
+        if history_at:
+            self.jobs.append(Job("history", self.history, at=[history_at]))
+        return self.jobs
+
+
+def main():
+    init_db()
+    conn = get_conn()
+    monitor = Monitor(conn)
+    scheduler = Scheduler(monitor.build_jobs())
+
+    signal.signal(signal.SIGTERM, scheduler.request_stop)
+    signal.signal(signal.SIGINT, scheduler.request_stop)
+
+    print("[daemon] started: " + ", ".join(
+        f"{job.name} every {job.every.total_seconds() / 60:g}m" if job.every
+        else f"{job.name} at {', '.join(f'{hh:02d}:{mm:02d}' for hh, mm in job.at)} UTC"
+        for job in scheduler.jobs
+    ))
+    try:
+        scheduler.run(run_first=("check",))
+    finally:
+        conn.close()
+        print("[daemon] stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Date parsing shared by ingest and scoring.
+
+Quiver payloads repeat the same handful of date strings across thousands of
+rows, so parse_dt is memoized. Unparseable or missing values return None;
+callers decide what "unknown date" means instead of silently getting "now".
+
+utcnow() is the "as of" time that lookback windows and trade ages are
+measured from; a replay pins it to when the replayed run happened.
+"""
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+_pinned: Optional[datetime] = None
+
+
+def utcnow() -> datetime:
+    """The current UTC time, or the time set by pin_now."""
+    return _pinned or datetime.now(timezone.utc)
+
+
+def pin_now(dt: Optional[datetime]):
+    """Measure windows and ages from `dt` instead of the clock (None to unpin)."""
+    global _pinned
+    _pinned = dt
+
+
+@lru_cache(maxsize=8192)
+def _parse_str(s: str) -> Optional[datetime]:
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        try:
+            dt = datetime.strptime(s[:10], "%Y-%m-%d")
+        except ValueError:
+            return None
+
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def parse_dt(value: Any) -> Optional[datetime]:
+    """
+    Parse YYYY-MM-DD or ISO datetimes (with or without Z) into a UTC-aware
+    datetime. Returns None for missing or unparseable input.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    s = str(value).strip()
+    return _parse_str(s) if s else None
+
+
+def iso_date(value: Any) -> Optional[str]:
+    """Normalized YYYY-MM-DD for storage, or None if the value can't be parsed."""
+    dt = parse_dt(value)
+    return dt.date().isoformat() if dt else None
+
+
+def days_since(dt: Optional[datetime], now: Optional[datetime] = None) -> Optional[int]:
+    if dt is None:
+        return None
+    return ((now or utcnow()) - dt).days
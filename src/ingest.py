@@ -0,0 +1,410 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from operator import attrgetter, itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from amounts import parse_range
+from dates import iso_date, parse_dt, utcnow
+from metrics import incr, timed_iter
+from records import ContractAward, GovTrade, InsiderTrade
+
+# SQLite builds older than 3.32 cap bound parameters at 999.
+_MAX_PARAMS = 900
+
+# Rows normalized, deduped and handed to scoring per step when streaming.
+BATCH_SIZE = 5000
+
+
+def hash_id(*args) -> str:
+    return hashlib.sha256("".join(map(str, args)).encode("utf-8")).hexdigest()
+
+
+def safe_get(d: Dict[str, Any], *keys: str, default: Any = None) -> Any:
+    for k in keys:
+        if k in d and d[k] not in (None, ""):
+            return d[k]
+    return default
+
+
+def norm_ticker(x: Any) -> Optional[str]:
+    if x is None:
+        return None
+    s = str(x).strip().upper()
+    return s or None
+
+
+def norm_side(side: Any) -> str:
+    """
+    Normalize side to BUY/SELL/UNKNOWN from various Quiver strings.
+    """
+    s = (str(side or "")).strip().lower()
+    if any(k in s for k in ["buy", "purchase", "acquire"]):
+        return "BUY"
+    if any(k in s for k in ["sell", "sale", "dispose"]):
+        return "SELL"
+    return "UNKNOWN"
+
+
+def _raw_key(x: Any) -> str:
+    # Raw field as it enters hash_id; missing values hash as "" so the id
+    # of an undated row is stable across runs.
+    return "" if x in (None, "") else str(x)
+
+
+def _within_last_days(dt: Optional[datetime], days: int) -> bool:
+    if not dt:
+        return False
+    cutoff = utcnow() - timedelta(days=days)
+    return dt >= cutoff
+
+
+# -----------------------
+# Compiled field mapping
+# -----------------------
+
+class FieldMap:
+    """
+    Alias lookup compiled once per payload. The first row's keys decide which
+    alias each field reads, and rows with that same key set are unpacked with
+    a single itemgetter call. Rows whose keys differ, or whose mapped value is
+    empty, fall back to safe_get over the full alias list.
+    """
+
+    def __init__(self, *fields: Tuple[str, Tuple[str, ...], Any]):
+        self.fields = fields
+        self.defaults = [default for _, _, default in fields]
+        self._keys = None
+        self._slots: List[int] = []
+        self._getter = None
+
+    def _compile(self, row: Dict[str, Any]):
+        keys = []
+        self._slots = []
+        for i, (_, aliases, _) in enumerate(self.fields):
+            k = next((a for a in aliases if a in row), None)
+            if k is not None:
+                self._slots.append(i)
+                keys.append(k)
+        getter = itemgetter(*keys) if keys else (lambda r: ())
+        self._getter = (lambda r: (getter(r),)) if len(keys) == 1 else getter
+        self._keys = set(row.keys())
+
+    def extract(self, row: Dict[str, Any]) -> List[Any]:
+        if self._keys is None:
+            self._compile(row)
+        if row.keys() != self._keys:
+            return [safe_get(row, *aliases, default=default) for _, aliases, default in self.fields]
+
+        out = list(self.defaults)
+        for i, v in zip(self._slots, self._getter(row)):
+            if v is None or v == "":
+                _, aliases, default = self.fields[i]
+                v = safe_get(row, *aliases, default=default)
+            out[i] = v
+        return out
+
+
+def government_fields() -> FieldMap:
+    return FieldMap(
+        ("ticker", ("Ticker", "ticker", "Symbol"), None),
+        ("actor", ("Representative", "RepresentativeName", "Name"), "Unknown"),
+        ("chamber", ("Chamber", "chamber", "House", "Senate"), "Congress"),
+        ("side", ("TransactionType", "Transaction", "transaction"), "Unknown"),
+        ("amount", ("Amount", "amount", "AmountRange"), 0),
+        ("tx_date", ("TransactionDate", "TransactionDateTime", "Date"), None),
+        ("disc_date", ("DisclosureDate", "DisclosedDate", "ReportDate", "FilingDate"), None),
+        ("link", ("Link", "FilingLink", "URL"), ""),
+    )
+
+
+def insider_fields() -> FieldMap:
+    return FieldMap(
+        ("ticker", ("Ticker", "ticker", "Symbol"), None),
+        ("actor", ("InsiderName", "Insider", "Name"), "Unknown"),
+        ("role", ("Title", "OfficerTitle", "Role"), ""),
+        ("side", ("TransactionType", "Transaction", "transaction"), "Unknown"),
+        ("value", ("Value", "value", "TotalValue", "TransactionValue", "Amount"), 0),
+        ("tx_date", ("TransactionDate", "TransactionDateTime", "Date"), None),
+        ("filed_date", ("FilingDate", "DisclosureDate", "ReportedDate", "ReportDate"), None),
+        ("link", ("Link", "FilingLink", "URL"), ""),
+    )
+
+
+def contract_fields() -> FieldMap:
+    return FieldMap(
+        ("ticker", ("Ticker", "ticker", "Symbol"), None),
+        ("award_date", ("Date", "AwardDate", "ActionDate", "date"), None),
+        ("amount", ("Amount", "amount", "Value"), 0),
+        ("agency", ("Agency", "agency", "AwardingAgency"), ""),
+        ("description", ("Description", "description"), ""),
+        ("award_id", ("AwardID", "Award_ID", "award_id", "ContractID"), None),
+    )
+
+
+# -----------------------
+# Normalization: raw payload -> records
+# -----------------------
+# Normalizers are generators so a streamed payload flows through
+# filtering, dedupe and scoring without ever being held in full.
+
+def _count_normalized(dataset: str, seen: int, kept: int, undated: int = 0):
+    incr("rows_fetched", seen, dataset)
+    incr("rows_filtered", seen - kept, dataset)
+    incr("rows_undated", undated, dataset)
+
+
+def normalize_government(
+    payload: Iterable[Dict[str, Any]], lookback_days: int = 0, since: Optional[str] = None,
+    quiet: bool = False,
+) -> Iterator[GovTrade]:
+    fields = government_fields()
+    undated = seen = kept = 0
+    for t in payload or []:
+        seen += 1
+        raw_ticker, rep, chamber, side, amt, tx_date_raw, disc_date_raw, link = fields.extract(t)
+        ticker = norm_ticker(raw_ticker)
+        if not ticker:
+            continue
+
+        # Parsed once here; records and SQLite carry normalized YYYY-MM-DD
+        # (None when unparseable, so scoring never assumes "today").
+        disc_dt = parse_dt(disc_date_raw)
+        tx_date = iso_date(tx_date_raw)
+        disc_date = disc_dt.date().isoformat() if disc_dt else None
+        if disc_dt is None:
+            undated += 1
+
+        if lookback_days and disc_dt and not _within_last_days(disc_dt, lookback_days):
+            continue
+        if since and disc_dt and disc_date < since:
+            continue
+
+        kept += 1
+        yield GovTrade(
+            hash_id("gov", ticker, _raw_key(tx_date_raw), _raw_key(disc_date_raw), rep, side, amt),
+            ticker, rep, chamber, side, amt, tx_date, disc_date, link, *parse_range(amt),
+        )
+    _count_normalized("government_trades", seen, kept, undated)
+    if undated and not quiet:
+        print(f"[ingest] government_trades: {undated} row(s) without a parseable disclosure date")
+
+
+def normalize_insider(
+    payload: Iterable[Dict[str, Any]], lookback_days: int = 0, since: Optional[str] = None,
+    quiet: bool = False,
+) -> Iterator[InsiderTrade]:
+    fields = insider_fields()
+    undated = seen = kept = 0
+    for t in payload or []:
+        seen += 1
+        raw_ticker, insider, title, side, value, tx_date_raw, filing_raw, link = fields.extract(t)
+        ticker = norm_ticker(raw_ticker)
+        if not ticker:
+            continue
+
+        tx_dt = parse_dt(tx_date_raw)
+        filing_dt = parse_dt(filing_raw) or tx_dt
+        tx_date = tx_dt.date().isoformat() if tx_dt else None
+        filing_date = filing_dt.date().isoformat() if filing_dt else None
+        if filing_dt is None:
+            undated += 1
+
+        if lookback_days and filing_dt and not _within_last_days(filing_dt, lookback_days):
+            continue
+        if since and filing_dt and filing_date < since:
+            continue
+
+        tx_key = _raw_key(tx_date_raw)
+        kept += 1
+        yield InsiderTrade(
+            hash_id("insider", ticker, tx_key, _raw_key(filing_raw) or tx_key, insider, side, value, title),
+            ticker, insider, title, side, value, tx_date, filing_date, link, *parse_range(value),
+        )
+    _count_normalized("insider_trades", seen, kept, undated)
+    if undated and not quiet:
+        print(f"[ingest] insider_trades: {undated} row(s) without a parseable filing date")
+
+
+def normalize_contracts(
+    payload: Iterable[Dict[str, Any]], since: Optional[str] = None
+) -> Iterator[ContractAward]:
+    fields = contract_fields()
+    seen = kept = 0
+    for t in payload or []:
+        seen += 1
+        raw_ticker, award_raw, amount, agency, description, award_id = fields.extract(t)
+        ticker = norm_ticker(raw_ticker)
+        award_dt = parse_dt(award_raw)
+        if not ticker or not award_dt:
+            continue
+
+        award_date = award_dt.date().isoformat()
+        if since and award_date < since:
+            continue
+
+        # Prefer the award's own id; payloads without one get a content hash.
+        tid = str(award_id) if award_id else hash_id("contract", ticker, award_date, agency, amount, description)
+        kept += 1
+        yield ContractAward(tid, ticker, award_date, amount, agency, description)
+    _count_normalized("contracts", seen, kept)
+
+
+# -----------------------
+# Bulk insert: rows -> only the new ones
+# -----------------------
+
+# table -> ordered (column, record field or callable) pairs
+TABLE_COLUMNS: Dict[str, Sequence[Tuple[str, Any]]] = {
+    "trades": (
+        ("id", "tid"),
+        ("source", lambda r: "government"),
+        ("person", "actor"),
+        ("chamber", "chamber"),
+        ("ticker", "ticker"),
+        ("side", "side"),
+        ("amount", "amount"),
+        ("amount_low", "amount_low"),
+        ("amount_high", "amount_high"),
+        ("transaction_date", "transaction_date"),
+        ("disclosed_date", "disclosed_date"),
+        ("url", "link"),
+    ),
+    "insider_trades": (
+        ("id", "tid"),
+        ("insider", "actor"),
+        ("role", "role"),
+        ("ticker", "ticker"),
+        ("side", "side"),
+        ("value", "value"),
+        ("value_low", "value_low"),
+        ("value_high", "value_high"),
+        ("transaction_date", "transaction_date"),
+        ("filed_date", "filed_date"),
+        ("url", "link"),
+    ),
+    "contracts": (
+        ("id", "tid"),
+        ("ticker", "ticker"),
+        ("award_date", "award_date"),
+        ("amount", "amount"),
+        ("agency", "agency"),
+        ("description", "description"),
+    ),
+}
+
+
+def existing_ids(conn, table: str, ids: Sequence[str], column: str = "id") -> set:
+    found = set()
+    for i in range(0, len(ids), _MAX_PARAMS):
+        chunk = ids[i:i + _MAX_PARAMS]
+        marks = ",".join("?" * len(chunk))
+        found.update(
+            r[0] for r in conn.execute(
+                f"SELECT {column} FROM {table} WHERE {column} IN ({marks})", chunk
+            )
+        )
+    return found
+
+
+def insert_new(conn, table: str, rows: Sequence[Any], known_in: Optional[str] = None) -> List[Any]:
+    """
+    Insert rows into `table` with a single executemany and return only the
+    rows that were not already stored (also dropping repeats within `rows`).
+    `known_in` is a table or view to dedupe against instead, e.g.
+    retention.table_or_archive(). Runs inside the caller's transaction; the
+    caller commits.
+    """
+    if not rows:
+        return []
+
+    seen = existing_ids(conn, known_in or table, [r.tid for r in rows])
+    fresh: List[Any] = []
+    for r in rows:
+        if r.tid in seen:
+            continue
+        seen.add(r.tid)
+        fresh.append(r)
+
+    if fresh:
+        cols = TABLE_COLUMNS[table]
+        getters = [k if callable(k) else attrgetter(k) for _, k in cols]
+        names = ",".join(c for c, _ in cols)
+        marks = ",".join("?" * len(cols))
+        conn.executemany(
+            f"INSERT INTO {table} ({names}) VALUES ({marks}) ON CONFLICT(id) DO NOTHING",
+            ([g(r) for g in getters] for r in fresh)
+        )
+    return fresh
+
+
+def insert_new_batches(
+    conn, table: str, rows: Iterable[Any], batch_size: int = BATCH_SIZE
+) -> Iterator[List[Any]]:
+    """
+    Stream rows into `table` in fixed-size batches, yielding the new rows of
+    each batch. Earlier batches are visible to later dedupe lookups because
+    they share the caller's connection and transaction.
+    """
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        fresh = insert_new(conn, table, batch)
+        if fresh:
+            yield fresh
+
+
+def ingest_government(
+    conn, payload, lookback_days: int = 0, since: Optional[str] = None, batch_size: int = BATCH_SIZE
+) -> Iterator[List[GovTrade]]:
+    rows = timed_iter("normalize", normalize_government(payload, lookback_days, since))
+    return insert_new_batches(conn, "trades", rows, batch_size)
+
+
+def ingest_insider(
+    conn, payload, lookback_days: int = 0, since: Optional[str] = None, batch_size: int = BATCH_SIZE
+) -> Iterator[List[InsiderTrade]]:
+    rows = timed_iter("normalize", normalize_insider(payload, lookback_days, since))
+    return insert_new_batches(conn, "insider_trades", rows, batch_size)
+
+
+def ingest_contracts(
+    conn, payload, since: Optional[str] = None, batch_size: int = BATCH_SIZE
+) -> Iterator[List[ContractAward]]:
+    rows = timed_iter("normalize", normalize_contracts(payload, since))
+    return insert_new_batches(conn, "contracts", rows, batch_size)
+
+
+def newest_date(rows: Iterable[Any], field: str) -> Optional[str]:
+    """Max YYYY-MM-DD of each record's `field`, used to advance a dataset's high-water mark."""
+    return max((str(v)[:10] for v in map(attrgetter(field), rows) if v), default=None)
+
+
+# -----------------------
+# Alert dedupe
+# -----------------------
+
+def unalerted(conn, alert_hashes: Sequence[str]) -> List[str]:
+    """
+    Return the hashes (in input order, de-duplicated) not yet in alerts_sent
+    nor among those retention pruned from it.
+    """
+    uniq = list(dict.fromkeys(alert_hashes))
+    sent = existing_ids(conn, "alerts_sent", uniq, column="alert_hash")
+    fresh = [h for h in uniq if h not in sent]
+    if fresh:
+        from retention import pruned_alerts
+
+        pruned = pruned_alerts(conn, fresh)
+        fresh = [h for h in fresh if h not in pruned]
+    return fresh
+
+
+def mark_alerted_many(conn, alert_hashes: Iterable[str]):
+    now = datetime.now(timezone.utc).isoformat()
+    conn.executemany(
+        "INSERT INTO alerts_sent VALUES (?,?) ON CONFLICT(alert_hash) DO NOTHING",
+        ((h, now) for h in alert_hashes)
+    )
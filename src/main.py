@@ -1,318 +1,664 @@
-import hashlib
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional, List
+"""
+Monitor pipeline and command line.
+
+    python src/main.py                 full run: fetch, ingest, score, alert, digest
+    python src/main.py fetch           store raw responses + a snapshot manifest
+    python src/main.py ingest          load the latest manifest into data.db
+    python src/main.py score           score unscored recent trades, queue alerts
+    python src/main.py alert           deliver the Telegram outbox
+    python src/main.py digest          queue and deliver the Top N digest
+    python src/main.py backfill        parse stored amounts, score every trade that has no score
+                                       (--load DATASET: import a history snapshot in parallel first)
+    python src/main.py retention       prune, archive and vacuum (see retention.py)
+    python src/main.py history         sync daily closes, fold matured returns into the track record
+
+Each command imports only the modules it needs (STAGE_MODULES) and records
+the time spent importing them, main included, in its run record, warning
+when that exceeds `cli.import_budget_ms`. Keep heavy imports inside the
+functions that use them; importing main must not parse config.yaml.
+"""
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from storage import init_db, get_conn
-from quiver_client import fetch_government_trades, fetch_insider_trades, fetch_contracts
-from scoring import score_government_trade, score_insider_trade
-from telegram import send_message
+from records import GovTrade, InsiderTrade, Pick
 from config import CONFIG
 
+MAIN_IMPORT_S = time.perf_counter() - _IMPORT_T0
 
-def hash_id(*args) -> str:
-    return hashlib.sha256("".join(map(str, args)).encode("utf-8")).hexdigest()
 
+_UNITS = ((1, ""), (1_000, "K"), (1_000_000, "M"), (1_000_000_000, "B"))
 
-def safe_get(d: Dict[str, Any], *keys: str, default: Any = None) -> Any:
-    for k in keys:
-        if k in d and d[k] not in (None, ""):
-            return d[k]
-    return default
 
+def _money(n: int) -> str:
+    """Dollars to 3 significant digits: $50K, $1.5M. 999,999 rounds up to $1M, not $1e+03K."""
+    i = 0
+    while i + 1 < len(_UNITS) and n >= _UNITS[i + 1][0]:
+        i += 1
+    value = float(f"{n / _UNITS[i][0]:.3g}")
+    if value >= 1000 and i + 1 < len(_UNITS):
+        i += 1
+        value = float(f"{n / _UNITS[i][0]:.3g}")
+    text = f"{value:g}" if value < 1000 else f"{value:,.0f}"
+    return f"${text}{_UNITS[i][1]}"
 
-def norm_ticker(x: Any) -> Optional[str]:
-    if x is None:
-        return None
-    s = str(x).strip().upper()
-    return s or None
 
+def _format_amount(p: Pick) -> str:
+    """Parsed bounds as "$50K–$100K" / "$1M+" / "$250K"; the raw string if unparsed."""
+    low, high = p.amount_low, p.amount_high
+    if low is None:
+        return str(p.amount) if p.amount not in (None, "") else ""
+    if high is None:
+        return f"{_money(low)}+"
+    # Compared after rounding: 999,500–1,000,000 is "$1M", not "$1M–$1M".
+    lo, hi = _money(low), _money(high)
+    return lo if lo == hi else f"{lo}–{hi}"
 
-def _parse_dt(value: Any) -> Optional[datetime]:
+
+def _format_pick(i: int, p: Pick) -> str:
+    who = p.actor or "Unknown"
+    role_str = f" ({p.role})" if p.role else ""
+    amt_label = "Amt" if p.kind == "government" else "Val"
+    amt = _format_amount(p)
+    reasons = "; ".join((p.reasons or [])[:3])
+
+    s = (
+        f"{i}) {p.ticker} — {p.score} — {p.side}\n"
+        f"   {who}{role_str} | {amt_label}: {amt} | Filed: {p.filed or ''}\n"
+        f"   {reasons}"
+    )
+    if p.link:
+        s += f"\n   {p.link}"
+    return s
+
+
+def _queue_alerts(conn, alerts: List[Tuple[str, str]]):
     """
-    Parse Quiver-ish dates safely into UTC-aware datetime.
-    Accepts YYYY-MM-DD or ISO datetimes. Returns None if missing/unparseable.
+    Queue (alert_hash, text) pairs not already recorded in alerts_sent,
+    using one lookup for the batch. The outbox ignores hashes already queued.
     """
-    if value in (None, ""):
-        return None
+    import metrics
+    from ingest import unalerted
+    from telegram import enqueue
 
-    s = str(value).strip()
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
+    texts = dict(alerts)
+    fresh = unalerted(conn, [ah for ah, _ in alerts])
+    for ah in fresh:
+        enqueue(conn, texts[ah], alert_hash=ah)
+    metrics.incr("alerts_queued", len(fresh))
 
-    try:
-        dt = datetime.fromisoformat(s)
-    except ValueError:
-        try:
-            dt = datetime.strptime(s[:10], "%Y-%m-%d")
-        except Exception:
-            return None
 
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
-    return dt
+def _score_government_batch(conn, batch: List[GovTrade], alerts, high_conv: int) -> List[Pick]:
+    from ingest import hash_id
+    from scores import government_pick
+    from scoring import score_government_trades
 
+    # Score the batch at once (one grouped query per pattern)
+    gov_scores = score_government_trades(batch, conn=conn)
 
-def to_iso_date(x: Any) -> str:
-    if x in (None, ""):
-        return datetime.now(timezone.utc).date().isoformat()
-    return str(x)
+    scored = []
+    for t, (score, reasons) in zip(batch, gov_scores):
+        scored.append(government_pick(t, score, reasons))
 
+        # Optional: keep high conviction as immediate-style alert
+        if alerts is not None and score >= high_conv:
+            alerts.append((
+                hash_id("gov_alert", t.tid),
+                "🚨 HIGH CONVICTION (Gov)\n\n"
+                f"{t.ticker} — {score}\n"
+                f"{t.actor} ({t.chamber})\n"
+                f"Txn: {t.side} | Amt: {t.amount}\n"
+                f"Txn Date: {t.transaction_date} | Disclosed: {t.disclosed_date}\n\n"
+                "Reasons:\n- " + "\n- ".join(reasons[:8]) +
+                (f"\n\nLink: {t.link}" if t.link else "") +
+                "\n\nNot financial advice."
+            ))
+    return scored
+
+
+def _score_insider_batch(conn, batch: List[InsiderTrade], alerts, high_conv: int) -> List[Pick]:
+    from ingest import hash_id
+    from scores import insider_pick
+    from scoring import score_insider_trade
+
+    scored = []
+    for t in batch:
+        score, reasons = score_insider_trade(t, conn=conn)
+        scored.append(insider_pick(t, score, reasons))
+
+        if alerts is not None and score >= high_conv:
+            alerts.append((
+                hash_id("insider_alert", t.tid),
+                "🚨 HIGH CONVICTION (Insider)\n\n"
+                f"{t.ticker} — {score}\n"
+                f"{t.actor} ({t.role})\n"
+                f"Txn: {t.side} | Value: {t.value}\n"
+                f"Txn Date: {t.transaction_date} | Filed: {t.filed_date}\n\n"
+                "Reasons:\n- " + "\n- ".join(reasons[:8]) +
+                (f"\n\nLink: {t.link}" if t.link else "") +
+                "\n\nNot financial advice."
+            ))
+    return scored
+
+
+def _settings():
+    return {
+        "high_conv": int(CONFIG.get("thresholds", {}).get("high_conviction", 85)),
+        "min_digest": int(CONFIG.get("thresholds", {}).get("digest_min_score", 0)),
+        "lookback_days": int(CONFIG.get("windows", {}).get("lookback_days", 7)),
+        "top_n": int(CONFIG.get("digest", {}).get("top_n", 10)),
+    }
+
+
+def _window_start(lookback_days: int) -> str:
+    from dates import utcnow
+
+    return (utcnow().date() - timedelta(days=lookback_days)).isoformat()
+
+
+def collect(conn, datasets=None, score: bool = True, filtered: bool = True) -> int:
+    """
+    Fetch -> ingest -> score -> queue alerts for `datasets` (default: all),
+    saving every score to the scores table. With score=False trades are only
+    ingested (score_unscored picks them up). With filtered=False every row is
+    ingested, not only those past the high-water mark and within the lookback.
+    Returns the number of new trades. The caller commits.
+    """
+    import metrics
+    from ingest import ingest_contracts, ingest_government, ingest_insider, newest_date
+    from patterns import add_awards, add_events, observe_trades
+    from quiver_client import fetch_all, high_water_since, record_high_water
+    from scores import save_picks
 
-def already_alerted(conn, alert_hash: str):
-    return conn.execute(
-        "SELECT 1 FROM alerts_sent WHERE alert_hash=?", (alert_hash,)
-    ).fetchone()
+    cfg = _settings()
+    high_conv = cfg["high_conv"]
+    lookback_days = cfg["lookback_days"] if filtered else 0
 
+    def since(dataset: str) -> Optional[str]:
+        return high_water_since(dataset) if filtered else None
 
-def mark_alerted(conn, alert_hash: str):
-    conn.execute(
-        "INSERT INTO alerts_sent VALUES (?,?)",
-        (alert_hash, datetime.now(timezone.utc).isoformat())
-    )
+    # All datasets are fetched concurrently over one pooled session.
+    # Contracts are optional (plan-gated) and may come back as [].
+    # Streamed datasets arrive as generators and are consumed batch by batch below.
+    with metrics.stage("fetch"):
+        data = fetch_all(datasets)
 
+    new_rows = 0
 
-def _within_last_days(dt: Optional[datetime], days: int) -> bool:
-    if not dt:
-        return False
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    return dt >= cutoff
+    # -------------------------
+    # Contracts: persisted first so contract timing sees this run's awards
+    # -------------------------
+    for batch in metrics.timed_iter(
+        "ingest", ingest_contracts(conn, data.get("contracts"), since=since("contracts"))
+    ):
+        metrics.incr("rows_new", len(batch), "contracts")
+        record_high_water("contracts", newest_date(batch, "award_date"))
+        add_awards(batch)
+        add_events("contract", batch)
 
+    # -------------------------
+    # Trades: both sources are ingested before either is scored, so a
+    # government trade and an insider buy arriving in the same run each
+    # count toward the other's convergence.
+    # -------------------------
+    gov_batches: List[list] = []
+    for batch in metrics.timed_iter("ingest", ingest_government(
+        conn, data.get("government_trades"), lookback_days, since=since("government_trades")
+    )):
+        new_rows += len(batch)
+        metrics.incr("rows_new", len(batch), "government_trades")
+        record_high_water("government_trades", newest_date(batch, "disclosed_date"))
+        add_events("government", batch)
+        observe_trades(conn, batch)
+        if score:
+            gov_batches.append(batch)
+
+    insider_batches: List[list] = []
+    for batch in metrics.timed_iter("ingest", ingest_insider(
+        conn, data.get("insider_trades"), lookback_days, since=since("insider_trades")
+    )):
+        new_rows += len(batch)
+        metrics.incr("rows_new", len(batch), "insider_trades")
+        record_high_water("insider_trades", newest_date(batch, "filed_date"))
+        add_events("insider", batch)
+        if score:
+            insider_batches.append(batch)
 
-def _format_pick(i: int, p: Dict[str, Any]) -> str:
-    who = p.get("actor", "Unknown")
-    role = p.get("role") or p.get("chamber") or ""
-    role_str = f" ({role})" if role else ""
-    filed = p.get("filed", "")
-    side = p.get("side", "")
-    amt_label = "Amt" if p.get("kind") == "government" else "Val"
-    amt = p.get("amount") if p.get("kind") == "government" else p.get("value")
-    amt = amt if amt not in (None, "") else ""
-    reasons = "; ".join((p.get("reasons") or [])[:3])
-    link = p.get("link") or ""
+    # -------------------------
+    # Score -> queue alerts, per ingested batch
+    # -------------------------
+    for kind, batches, score_batch in (
+        ("government_trades", gov_batches, _score_government_batch),
+        ("insider_trades", insider_batches, _score_insider_batch),
+    ):
+        for batch in batches:
+            alerts: List[Tuple[str, str]] = []
+            with metrics.stage("score"), metrics.profiled():
+                save_picks(conn, score_batch(conn, batch, alerts, high_conv))
+            metrics.incr("rows_scored", len(batch), kind)
+            with metrics.stage("alert"):
+                _queue_alerts(conn, alerts)
+
+    if not new_rows:
+        print("[main] no new trades since last run; nothing scored.")
+    return new_rows
+
+
+def score_unscored(conn, since: str, high_conv: Optional[int] = None) -> int:
+    """
+    Score stored trades filed on/after `since` that have no scores row yet
+    (ingested by `main.py ingest`, or before the scores table existed).
+    Alerts are queued only when `high_conv` is given. The caller commits.
+    """
+    import metrics
+    from scores import save_picks, unscored_government, unscored_insider
+
+    n = 0
+    alerts: Optional[List[Tuple[str, str]]] = [] if high_conv is not None else None
+    gov = unscored_government(conn, since)
+    if gov:
+        n += save_picks(conn, _score_government_batch(conn, gov, alerts, high_conv or 0))
+        metrics.incr("rows_scored", len(gov), "government_trades")
+    ins = unscored_insider(conn, since)
+    if ins:
+        n += save_picks(conn, _score_insider_batch(conn, ins, alerts, high_conv or 0))
+        metrics.incr("rows_scored", len(ins), "insider_trades")
+    if alerts:
+        _queue_alerts(conn, alerts)
+    return n
+
+
+def queue_digest(conn):
+    """
+    Enqueue the Top N digest: an indexed query over scores filed in the last
+    `lookback_days`, independent of what this run fetched. The caller commits.
+    """
+    import metrics
+    from scores import count_candidates, top_picks
+    from telegram import enqueue
+
+    cfg = _settings()
+    top_n, min_digest, lookback_days = cfg["top_n"], cfg["min_digest"], cfg["lookback_days"]
+    since = _window_start(lookback_days)
+
+    with metrics.stage("digest"):
+        backfilled = score_unscored(conn, since)
+        if backfilled:
+            print(f"[main] scored {backfilled} stored trades for the digest.")
+        top = top_picks(conn, since, min_digest, top_n)
+        candidates = count_candidates(conn, since, min_digest)
+
+        header = (
+            f"📌 Digest (Top {top_n}) — last {lookback_days} days\n"
+            f"Min score: {min_digest} | Candidates: {candidates}\n\n"
+        )
 
-    s = (
-        f"{i}) {p['ticker']} — {p['score']} — {side}\n"
-        f"   {who}{role_str} | {amt_label}: {amt} | Filed: {filed}\n"
-        f"   {reasons}"
-    )
-    if link:
-        s += f"\n   {link}"
-    return s
+        if not top:
+            enqueue(conn, header + "No trades met the minimum score.\n\nNot financial advice.")
+        else:
+            lines = []
+            for i, p in enumerate(top, start=1):
+                lines.append(_format_pick(i, p))
+            enqueue(conn, header + "\n\n".join(lines) + "\n\nNot financial advice.")
+        metrics.incr("digest_candidates", candidates)
 
 
-def run():
-    init_db()
-    conn = get_conn()
-    cur = conn.cursor()
+def _print_queued(conn, after_id: int):
+    for r in conn.execute("SELECT text FROM outbox WHERE id > ? ORDER BY id", (after_id,)):
+        print(r["text"] + "\n" + "-" * 40)
 
-    # Config
-    high_conv = int(CONFIG.get("thresholds", {}).get("high_conviction", 85))
-    min_digest = int(CONFIG.get("thresholds", {}).get("digest_min_score", 0))
-    lookback_days = int(CONFIG.get("windows", {}).get("lookback_days", 7))
-    top_n = int(CONFIG.get("digest", {}).get("top_n", 10))
 
-    # Optional: warm contracts cache / patterns (safe to call; may return [])
+def run_cycle(
+    conn, datasets=None, digest: bool = True, dry_run: bool = False, fetch: bool = True,
+    filtered: bool = True, import_s: float = 0.0,
+) -> int:
+    """
+    One instrumented monitor cycle on an open connection: collect (unless
+    fetch is False), optionally queue the digest, commit, then deliver the
+    outbox. With dry_run the queued messages are printed and everything is
+    rolled back. `filtered` is passed to collect; `import_s` (the CLI's
+    import time) is recorded as the run's "import" stage. Returns the number
+    of new trades.
+    """
+    import metrics
+    import patterns
+    from quiver_client import commit_fetch_state, discard_fetch_state, write_run_manifest
+    from telegram import flush
+
+    metrics.start(command="run" if fetch else "digest")
+    if import_s:
+        metrics.RUN.add_time("import", import_s)
+    new_rows = 0
     try:
-        _ = fetch_contracts()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+        if fetch:
+            new_rows = collect(conn, datasets, filtered=filtered)
+            write_run_manifest()
+
+        # -------------------------
+        # Digest: Top N in last X days
+        # -------------------------
+        if digest:
+            queue_digest(conn)
+
+        if dry_run:
+            _print_queued(conn, last_id)
+            conn.rollback()
+            patterns.invalidate()
+            discard_fetch_state()
+            metrics.finish(conn, status="dry_run")
+            return new_rows
+
+        commit_fetch_state(conn)
+        conn.commit()
+
+        # Delivery happens after the run's data is committed; anything Telegram
+        # rejects stays in the outbox for the next run.
+        with metrics.stage("deliver"):
+            flush(conn)
     except Exception as e:
-        print(f"[main] contracts fetch failed (non-fatal): {e}")
+        conn.rollback()
+        # The indexes hold the rolled-back trades; they reload from the tables.
+        patterns.invalidate()
+        discard_fetch_state()
+        # Keep what was fetched so the failing input can be replayed.
+        write_run_manifest()
+        metrics.finish(conn, status="error", error=f"{type(e).__name__}: {e}")
+        raise
+    metrics.finish(conn)
+    return new_rows
+
+
+def run(replay: Optional[str] = None, import_s: float = 0.0):
+    """
+    One monitor run. With `replay` (a snapshot run manifest), see replay_run.
+    """
+    if replay:
+        replay_run(replay)
+        return
+    init_db()
+    conn = get_conn()
+    try:
+        run_cycle(conn, import_s=import_s)
+    finally:
+        conn.close()
 
-    gov_picks: List[Dict[str, Any]] = []
-    insider_picks: List[Dict[str, Any]] = []
 
-    # -------------------------
-    # Government trades (historical)
-    # -------------------------
-    for t in fetch_government_trades() or []:
-        ticker = norm_ticker(safe_get(t, "Ticker", "ticker", "Symbol", default=None))
-        if not ticker:
-            continue
-
-        rep = safe_get(t, "Representative", "RepresentativeName", "Name", default="Unknown")
-        chamber = safe_get(t, "Chamber", "chamber", "House", "Senate", default="Congress")
-
-        side = safe_get(t, "TransactionType", "Transaction", "transaction", default="Unknown")
-        amt = safe_get(t, "Amount", "amount", "AmountRange", default=0)
-
-        tx_date_raw = safe_get(t, "TransactionDate", "TransactionDateTime", "Date", default=None)
-        disc_date_raw = safe_get(t, "DisclosureDate", "DisclosedDate", "ReportDate", "FilingDate", default=None)
-
-        tx_date = to_iso_date(tx_date_raw)
-        disc_date = to_iso_date(disc_date_raw)
-
-        disc_dt = _parse_dt(disc_date_raw) or _parse_dt(disc_date)
-        if lookback_days and not _within_last_days(disc_dt, lookback_days):
-            continue
-
-        link = safe_get(t, "Link", "FilingLink", "URL", default="")
-
-        tid = hash_id("gov", ticker, tx_date, disc_date, rep, side, amt)
-        if cur.execute("SELECT 1 FROM trades WHERE id=?", (tid,)).fetchone():
-            continue
-
-        cur.execute(
-            "INSERT INTO trades VALUES (?,?,?,?,?,?,?,?,?,?)",
-            (
-                tid,
-                "government",
-                rep,
-                chamber,
-                ticker,
-                side,
-                amt,
-                tx_date,
-                disc_date,
-                link,
-            )
-        )
+def _swap_db_caches(caches: Optional[Tuple[Any, ...]] = None) -> Tuple[Any, ...]:
+    """
+    Replace the module-level caches loaded from a database (pattern indexes,
+    fetch state, actor stats, alert Bloom filters) with `caches`, or with
+    empty ones. Returns the caches replaced, to swap back later.
+    """
+    import patterns
+    import quiver_client
+    import retention
+    import track_record
+
+    previous = (
+        patterns.EVENTS, patterns.AWARDS, patterns.CLUSTERS, quiver_client._state_cache,
+        quiver_client._pending, track_record._stats, retention._slices,
+    )
+    (
+        patterns.EVENTS, patterns.AWARDS, patterns.CLUSTERS, quiver_client._state_cache,
+        quiver_client._pending, track_record._stats, retention._slices,
+    ) = caches or (patterns.EventIndex(), patterns.AwardIndex(), patterns.ClusterWindow(), {}, {}, None, None)
+    return previous
 
-        score, reasons = score_government_trade({
-            "side": side,
-            "amount": amt,
-            "disclosed_date": disc_date,
-            "ticker": ticker,
-            "actor": rep,
-            "chamber": chamber,
-            "transaction_date": tx_date,
-        })
-
-        if score >= min_digest:
-            gov_picks.append({
-                "kind": "government",
-                "ticker": ticker,
-                "score": score,
-                "side": side,
-                "amount": amt,
-                "actor": rep,
-                "chamber": chamber,
-                "filed": disc_date,
-                "link": link,
-                "reasons": reasons,
-                "tid": tid,
-            })
 
-        # Optional: keep high conviction as immediate-style alert
-        if score >= high_conv:
-            ah = hash_id("gov_alert", tid)
-            if not already_alerted(conn, ah):
-                send_message(
-                    "🚨 HIGH CONVICTION (Gov)\n\n"
-                    f"{ticker} — {score}\n"
-                    f"{rep} ({chamber})\n"
-                    f"Txn: {side} | Amt: {amt}\n"
-                    f"Txn Date: {tx_date} | Disclosed: {disc_date}\n\n"
-                    "Reasons:\n- " + "\n- ".join(reasons[:8]) +
-                    (f"\n\nLink: {link}" if link else "") +
-                    "\n\nNot financial advice."
-                )
-                mark_alerted(conn, ah)
+def replay_run(ref: str):
+    """
+    Re-run the pipeline offline from a snapshot run manifest, as of the time
+    the manifest was written. It runs in a temporary database, with empty
+    module caches, so data.db's rows and high-water marks don't filter the
+    replayed trades out or feed their scores. Every trade in the snapshots
+    is ingested and scored, regardless of lookback. The queued messages are
+    printed; nothing is kept or sent.
+    """
+    import tempfile
+    from pathlib import Path
+
+    import storage
+    from dates import parse_dt, pin_now
+    from quiver_client import set_replay
+    from snapshots import load_manifest
+
+    manifest = load_manifest(ref)
+    live_db = storage.DB_PATH
+    with tempfile.TemporaryDirectory(prefix="replay-") as tmp:
+        storage.DB_PATH = Path(tmp) / "data.db"
+        live_caches = _swap_db_caches()
+        set_replay(manifest)
+        pin_now(parse_dt(manifest.get("created_at")))
+        try:
+            init_db()
+            conn = get_conn()
+            try:
+                run_cycle(conn, dry_run=True, filtered=False)
+            finally:
+                conn.close()
+        finally:
+            pin_now(None)
+            set_replay(None)
+            _swap_db_caches(live_caches)
+            storage.DB_PATH = live_db
+
+
+# -----------------------
+# Stages
+# -----------------------
+# Each runs in its own process (e.g. one cron entry per stage), commits its
+# own work and records a run in the runs table under its command name.
+
+def fetch_stage(conn, args) -> None:
+    """Fetch datasets into snapshots; validators are committed by `ingest`."""
+    import metrics
+    import snapshots
+    from quiver_client import discard_fetch_state, fetch_all, write_run_manifest
+
+    if not snapshots.enabled():
+        raise SystemExit("[main] fetch needs snapshots.enabled: ingest reads the run manifest")
+    with metrics.stage("fetch"):
+        data = fetch_all(args.datasets)
+        for name, rows in data.items():
+            # Draining streamed datasets is what writes their snapshots.
+            metrics.incr("rows_fetched", sum(1 for _ in rows), name)
+    write_run_manifest()
+    discard_fetch_state()
+
+
+def ingest_stage(conn, args) -> None:
+    """Ingest a fetch manifest (default: the latest) without scoring."""
+    import snapshots
+    from quiver_client import commit_fetch_state, set_replay, stage_validators
+
+    ref = args.manifest or snapshots.latest_manifest()
+    if not ref:
+        raise SystemExit("[main] no snapshot manifest to ingest; run `main.py fetch` first")
+    manifest = snapshots.load_manifest(str(ref))
+    set_replay(manifest)
+    try:
+        collect(conn, datasets=list(manifest["datasets"]), score=False)
+    finally:
+        set_replay(None)
+    stage_validators(manifest)
+    commit_fetch_state(conn)
 
-    # -------------------------
-    # Insider trades (historical)
-    # -------------------------
-    for t in fetch_insider_trades() or []:
-        ticker = norm_ticker(safe_get(t, "Ticker", "ticker", "Symbol", default=None))
-        if not ticker:
-            continue
-
-        insider = safe_get(t, "InsiderName", "Insider", "Name", default="Unknown")
-        title = safe_get(t, "Title", "OfficerTitle", "Role", default="")
-
-        side = safe_get(t, "TransactionType", "Transaction", "transaction", default="Unknown")
-        value = safe_get(t, "Value", "value", "TotalValue", "TransactionValue", "Amount", default=0)
-
-        tx_date_raw = safe_get(t, "TransactionDate", "TransactionDateTime", "Date", default=None)
-        filing_raw = safe_get(t, "FilingDate", "DisclosureDate", "ReportedDate", "ReportDate", default=None)
-
-        tx_date = to_iso_date(tx_date_raw)
-        filing_date = to_iso_date(filing_raw) if filing_raw else tx_date
-
-        filing_dt = _parse_dt(filing_raw) or _parse_dt(filing_date)
-        if lookback_days and not _within_last_days(filing_dt, lookback_days):
-            continue
-
-        link = safe_get(t, "Link", "FilingLink", "URL", default="")
-
-        tid = hash_id("insider", ticker, tx_date, filing_date, insider, side, value, title)
-        if cur.execute("SELECT 1 FROM insider_trades WHERE id=?", (tid,)).fetchone():
-            continue
-
-        cur.execute(
-            "INSERT INTO insider_trades VALUES (?,?,?,?,?,?,?,?)",
-            (
-                tid,
-                insider,
-                title,
-                ticker,
-                side,
-                value,
-                tx_date,
-                link,
-            )
-        )
 
-        score, reasons = score_insider_trade({
-            "side": side,
-            "value": value,
-            "transaction_date": tx_date,
-            "role": title,
-            "ticker": ticker,
-            "actor": insider,
-        })
-
-        if score >= min_digest:
-            insider_picks.append({
-                "kind": "insider",
-                "ticker": ticker,
-                "score": score,
-                "side": side,
-                "value": value,
-                "actor": insider,
-                "role": title,
-                "filed": filing_date,
-                "link": link,
-                "reasons": reasons,
-                "tid": tid,
-            })
-
-        if score >= high_conv:
-            ah = hash_id("insider_alert", tid)
-            if not already_alerted(conn, ah):
-                send_message(
-                    "🚨 HIGH CONVICTION (Insider)\n\n"
-                    f"{ticker} — {score}\n"
-                    f"{insider} ({title})\n"
-                    f"Txn: {side} | Value: {value}\n"
-                    f"Txn Date: {tx_date} | Filed: {filing_date}\n\n"
-                    "Reasons:\n- " + "\n- ".join(reasons[:8]) +
-                    (f"\n\nLink: {link}" if link else "") +
-                    "\n\nNot financial advice."
-                )
-                mark_alerted(conn, ah)
+def score_stage(conn, args) -> None:
+    cfg = _settings()
+    n = score_unscored(conn, _window_start(cfg["lookback_days"]), high_conv=cfg["high_conv"])
+    print(f"[main] scored {n} trades.")
 
-    # -------------------------
-    # Digest: Top N in last X days
-    # -------------------------
-    all_picks = sorted(gov_picks + insider_picks, key=lambda x: x["score"], reverse=True)
-    top = all_picks[:top_n]
 
-    header = (
-        f"📌 Digest (Top {top_n}) — last {lookback_days} days\n"
-        f"Min score: {min_digest} | Candidates: {len(all_picks)}\n\n"
-    )
+def alert_stage(conn, args) -> None:
+    import metrics
+    from telegram import flush
+
+    with metrics.stage("deliver"):
+        flush(conn)
 
-    if not top:
-        send_message(header + "No trades met the minimum score.\n\nNot financial advice.")
-    else:
-        lines = []
-        for i, p in enumerate(top, start=1):
-            lines.append(_format_pick(i, p))
-        send_message(header + "\n\n".join(lines) + "\n\nNot financial advice.")
 
+def digest_stage(conn, args) -> None:
+    import metrics
+    from telegram import flush
+
+    queue_digest(conn)
     conn.commit()
+    with metrics.stage("deliver"):
+        flush(conn)
+
+
+def backfill_stage(conn, args) -> None:
+    import metrics
+    from amounts import backfill
+
+    if getattr(args, "load", None):
+        _load_history(conn, args)
+    with metrics.stage("parse"):
+        metrics.incr("amounts_backfilled", backfill(conn))
+    n = score_unscored(conn, args.since or "")
+    print(f"[main] backfilled scores for {n} stored trades.")
+
+
+def _load_history(conn, args) -> None:
+    """Import `--load` datasets from a run manifest's snapshots over a process pool."""
+    import metrics
+    import snapshots
+    from backfill import load_history
+
+    ref = args.manifest or snapshots.latest_manifest()
+    if not ref:
+        raise SystemExit("[main] no snapshot manifest to load; run `main.py fetch --datasets ...` first")
+    manifest = snapshots.load_manifest(str(ref))
+    for dataset in args.load:
+        sha = (manifest["datasets"].get(dataset) or {}).get("sha")
+        if not sha:
+            raise SystemExit(f"[main] manifest {ref} has no {dataset} snapshot; fetch it first")
+        with metrics.stage("load"):
+            load_history(conn, dataset, sha, since=args.since, workers=args.workers, restart=args.restart)
+
+
+def retention_stage(conn, args) -> None:
+    import retention
+
+    retention.run(conn, force_vacuum=bool(getattr(args, "vacuum", False)))
+
+
+def history_stage(conn, args) -> None:
+    import metrics
+    from pricing import sync_prices
+    from track_record import refresh_actor_stats
+
+    with metrics.stage("prices"):
+        metrics.incr("closes_stored", sync_prices(conn))
+    with metrics.stage("track_record"):
+        metrics.incr("returns_scored", refresh_actor_stats(conn))
+
+
+# command -> (function, modules it imports). "run" is the full cycle.
+STAGES: Dict[str, Tuple[Callable[[Any, Any], None], Tuple[str, ...]]] = {
+    "fetch": (fetch_stage, ("quiver_client", "snapshots")),
+    "ingest": (ingest_stage, ("quiver_client", "snapshots", "ingest", "patterns")),
+    "score": (score_stage, ("ingest", "scoring", "scores", "telegram")),
+    "alert": (alert_stage, ("telegram",)),
+    "digest": (digest_stage, ("scoring", "scores", "telegram")),
+    "backfill": (backfill_stage, ("amounts", "ingest", "scoring", "scores")),
+    "retention": (retention_stage, ("retention",)),
+    "history": (history_stage, ("pricing", "track_record")),
+}
+STAGE_MODULES: Dict[str, Tuple[str, ...]] = {
+    "run": ("quiver_client", "snapshots", "ingest", "patterns", "scoring", "scores", "telegram"),
+    **{name: modules for name, (_, modules) in STAGES.items()},
+}
+
+
+def load_stage(command: str) -> float:
+    """Import a command's modules; returns the seconds spent."""
+    import importlib
+
+    t0 = time.perf_counter()
+    for module in STAGE_MODULES[command]:
+        importlib.import_module(module)
+    return time.perf_counter() - t0
+
+
+def _check_import_budget(command: str, seconds: float):
+    budgets = (CONFIG.get("cli", {}) or {}).get("import_budget_ms", {}) or {}
+    budget = budgets.get(command)
+    if budget is not None and seconds * 1000 > float(budget):
+        print(f"[main] {command}: imports took {seconds * 1000:.0f} ms (budget {budget} ms)")
+
+
+def run_stage(command: str, args=None, conn=None, main_import_s: float = 0.0) -> None:
+    """
+    Run one stage as its own instrumented, committed run, on `conn` if given
+    (the daemon's warm connection) or a fresh one. The CLI passes the time
+    it spent importing main, which counts toward the budget.
+    """
+    import metrics
+
+    import_s = main_import_s + load_stage(command)
+    _check_import_budget(command, import_s)
+    fn, _ = STAGES[command]
+
+    own = conn is None
+    if own:
+        init_db()
+        conn = get_conn()
+    metrics.start(command=command)
+    metrics.RUN.add_time("import", import_s)
+    try:
+        fn(conn, args)
+        conn.commit()
+    except BaseException as e:
+        conn.rollback()
+        metrics.finish(conn, status="error", error=f"{type(e).__name__}: {e}")
+        if own:
+            conn.close()
+        raise
+    metrics.finish(conn)
+    if own:
+        conn.close()
 
 
 if __name__ == "__main__":
-    run()
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Fetch, score and alert on new Quiver trades.")
+    ap.add_argument("--replay", metavar="SNAPSHOT",
+                    help="run offline from a snapshot run manifest (path or timestamp); nothing is sent")
+    sub = ap.add_subparsers(dest="command", metavar="COMMAND")
+    sub.add_parser("run", help="full run (the default)")
+    p = sub.add_parser("fetch", help="fetch datasets into snapshots and write a run manifest")
+    p.add_argument("--datasets", nargs="+", choices=("government_trades", "insider_trades", "contracts"))
+    p = sub.add_parser("ingest", help="ingest a run manifest (default: the latest) without scoring")
+    p.add_argument("--manifest", help="manifest path or timestamp")
+    sub.add_parser("score", help="score unscored trades in the lookback window and queue alerts")
+    sub.add_parser("alert", help="deliver queued alerts")
+    sub.add_parser("digest", help="queue and deliver the Top N digest from stored scores")
+    p = sub.add_parser("backfill", help="parse stored amounts and score trades that have no score (no alerts)")
+    p.add_argument("--since", help="only trades filed on/after this date (YYYY-MM-DD)")
+    p.add_argument("--load", nargs="+", choices=("government_trades", "insider_trades"),
+                   help="first import these datasets' snapshots in parallel (see backfill.py)")
+    p.add_argument("--manifest", help="manifest path or timestamp for --load (default: the latest)")
+    p.add_argument("--workers", type=int, help="worker processes for --load (default: backfill.workers)")
+    p.add_argument("--restart", action="store_true", help="ignore --load checkpoints and start over")
+    p = sub.add_parser("retention", help="prune alerts_sent, archive old trades, ANALYZE/VACUUM")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM even if not due")
+    sub.add_parser("history", help="sync daily closes and refresh per-actor track records")
+    args = ap.parse_args()
+
+    command = args.command or "run"
+    if command == "run":
+        import_s = MAIN_IMPORT_S + load_stage("run")
+        _check_import_budget("run", import_s)
+        run(args.replay, import_s=import_s)
+    else:
+        if args.replay:
+            ap.error("--replay applies to the full run only")
+        run_stage(command, args, main_import_s=MAIN_IMPORT_S)
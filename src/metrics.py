@@ -0,0 +1,229 @@
+"""
+Per-run instrumentation: stage timers, counters and an optional cProfile
+of the scoring loop.
+
+One RunMetrics is active per process (RUN). Modules call stage()/incr()
+while main.run works; finish() turns it into a JSON run record stored in
+the runs table and, if configured, a Prometheus textfile.
+
+Stage times are wall-clock and cumulative across batches. They nest:
+"ingest" includes the "normalize" time spent pulling rows through it.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from config import CONFIG
+
+
+def _cfg() -> Dict[str, Any]:
+    # Read per run, not at import: `import main` must not parse config.yaml.
+    return CONFIG.get("metrics", {}) or {}
+
+
+class RunMetrics:
+    def __init__(self, profile_path: Optional[str] = None, command: str = "run"):
+        self.command = command
+        self.started_at = datetime.now(timezone.utc)
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.datasets: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()  # fetch workers count retries concurrently
+        self.profile_path = profile_path
+        self.profiler = None
+        if profile_path:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def incr(self, name: str, n: int = 1, dataset: Optional[str] = None):
+        if not n:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if dataset:
+                per = self.datasets.setdefault(dataset, {})
+                per[name] = per.get(name, 0) + n
+
+    def record(self, status: str = "ok", error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "command": self.command,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_s": round(time.perf_counter() - self._t0, 4),
+            "status": status,
+            "error": error,
+            "stages": {k: round(v, 4) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+            "datasets": {k: dict(v) for k, v in self.datasets.items()},
+        }
+
+
+RUN = RunMetrics()
+
+
+def start(profile_path: Optional[str] = None, command: str = "run") -> RunMetrics:
+    """Begin a fresh run record (discarding anything collected so far)."""
+    global RUN
+    # metrics.profile_path: when set, the scoring loop is profiled and pstats are dumped there.
+    RUN = RunMetrics(profile_path or _cfg().get("profile_path"), command)
+    return RUN
+
+
+# -----------------------
+# Timers and counters
+# -----------------------
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        RUN.add_time(name, time.perf_counter() - t0)
+
+
+def timed(name: str):
+    """Decorator form of stage()."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def timed_iter(name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+    """Yield from `iterable`, charging only the time spent producing items to `name`."""
+    it = iter(iterable)
+    perf = time.perf_counter
+    spent = 0.0
+    try:
+        while True:
+            t0 = perf()
+            try:
+                item = next(it)
+            except StopIteration:
+                spent += perf() - t0
+                return
+            spent += perf() - t0
+            yield item
+    finally:
+        RUN.add_time(name, spent)
+
+
+def incr(name: str, n: int = 1, dataset: Optional[str] = None):
+    RUN.incr(name, n, dataset)
+
+
+@contextmanager
+def profiled():
+    """Profile the enclosed block when profiling is enabled for this run."""
+    prof = RUN.profiler
+    if prof is None:
+        yield
+        return
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+
+
+# -----------------------
+# Export
+# -----------------------
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(record: Dict[str, Any]) -> str:
+    lines = [
+        "# HELP qq_run_duration_seconds Wall-clock duration of the last monitor run.",
+        "# TYPE qq_run_duration_seconds gauge",
+        f"qq_run_duration_seconds {record['duration_s']}",
+        "# HELP qq_run_success Whether the last monitor run completed.",
+        "# TYPE qq_run_success gauge",
+        f"qq_run_success {1 if record['status'] == 'ok' else 0}",
+        "# HELP qq_run_finished_timestamp_seconds Unix time the last run finished.",
+        "# TYPE qq_run_finished_timestamp_seconds gauge",
+        f"qq_run_finished_timestamp_seconds {datetime.fromisoformat(record['finished_at']).timestamp():.0f}",
+        "# HELP qq_run_stage_seconds Time spent per stage in the last run.",
+        "# TYPE qq_run_stage_seconds gauge",
+    ]
+    for name, secs in sorted(record["stages"].items()):
+        lines.append(f'qq_run_stage_seconds{{stage="{_prom_escape(name)}"}} {secs}')
+
+    lines += [
+        "# HELP qq_run_count Rows, alerts and retries counted in the last run.",
+        "# TYPE qq_run_count gauge",
+    ]
+    for name, n in sorted(record["counters"].items()):
+        lines.append(f'qq_run_count{{name="{_prom_escape(name)}",dataset="all"}} {n}')
+    for dataset, counts in sorted(record["datasets"].items()):
+        for name, n in sorted(counts.items()):
+            lines.append(
+                f'qq_run_count{{name="{_prom_escape(name)}",dataset="{_prom_escape(dataset)}"}} {n}'
+            )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(record: Dict[str, Any], path: str):
+    # Write-then-rename so the collector never reads a half-written file.
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text(record))
+    os.replace(tmp, path)
+
+
+def finish(conn, status: str = "ok", error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Close the current run: persist its record to the runs table (committed),
+    write the Prometheus textfile and profile dump if configured, and print
+    a one-line summary. Returns the record.
+    """
+    record = RUN.record(status, error)
+    conn.execute(
+        "INSERT INTO runs (started_at, finished_at, duration_s, status, record) VALUES (?, ?, ?, ?, ?)",
+        (record["started_at"], record["finished_at"], record["duration_s"], status, json.dumps(record))
+    )
+    conn.commit()
+
+    # Written after each run for node_exporter's textfile collector.
+    textfile = _cfg().get("prometheus_textfile")
+    if textfile:
+        try:
+            write_prometheus(record, textfile)
+        except OSError as e:
+            print(f"[metrics] could not write {textfile}: {e}")
+
+    if RUN.profiler is not None:
+        RUN.profiler.create_stats()
+        if RUN.profiler.stats:  # nothing scored -> keep the previous dump
+            RUN.profiler.dump_stats(RUN.profile_path)
+            print(f"[metrics] scoring profile written to {RUN.profile_path}")
+
+    stages = " ".join(f"{k}={v:.2f}s" for k, v in record["stages"].items())
+    counts = " ".join(f"{k}={v}" for k, v in record["counters"].items())
+    print(f"[metrics] {RUN.command} {status} in {record['duration_s']:.2f}s | {stages} | {counts}")
+    return record
+
+
+def last_runs(conn, limit: int = 10):
+    """Most recent run records, newest first."""
+    return [
+        json.loads(r["record"])
+        for r in conn.execute("SELECT record FROM runs ORDER BY id DESC LIMIT ?", (limit,))
+    ]
@@ -1,21 +1,469 @@
-from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import CONFIG
+from dates import utcnow
+from ingest import norm_side
 from storage import get_conn
 
-def detect_cluster(ticker, days=10):
-    conn = get_conn()
-    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    count = conn.execute(
-        "SELECT COUNT(*) c FROM trades WHERE ticker=? AND disclosed_date>=?",
-        (ticker, since)
-    ).fetchone()["c"]
-    return count >= 3
-
-def detect_contract_timing(ticker, trade_date, window=14):
-    conn = get_conn()
-    start = (trade_date - timedelta(days=window)).isoformat()
-    end = (trade_date + timedelta(days=window)).isoformat()
-    count = conn.execute(
-        "SELECT COUNT(*) c FROM contracts WHERE ticker=? AND award_date BETWEEN ? AND ?",
-        (ticker, start, end)
-    ).fetchone()["c"]
-    return count > 0
+
+def _today() -> date:
+    return utcnow().date()
+
+
+def _cluster_days() -> int:
+    return int(CONFIG.get("patterns", {}).get("cluster_days", 10))
+
+
+def _keep_from(today: Optional[date] = None) -> str:
+    """
+    First day the persisted window keeps: enough for any trade within
+    windows.lookback_days to see its full cluster_days.
+    """
+    keep = _cluster_days() + int(CONFIG.get("windows", {}).get("lookback_days", 7))
+    return ((today or _today()) - timedelta(days=keep)).isoformat()
+
+
+def _window_start(day: Optional[str], days: int) -> Optional[str]:
+    try:
+        return (date.fromisoformat(str(day)[:10]) - timedelta(days=days)).isoformat()
+    except ValueError:
+        return None
+
+
+# -----------------------
+# Cluster window
+# -----------------------
+
+class ClusterWindow:
+    """
+    Government disclosures per ticker and side (BUY / SELL): each distinct
+    actor's disclosure days from `cutoff` on. A trade disclosed on day d
+    counts the distinct actors who disclosed in [d - days, d], as
+    backtest.window_distinct does. Repeat filings by the same member count
+    once, and other sides (exchanges) not at all.
+
+    Days are also bucketed, so advance() pops whole expired days and each
+    event is expired once. The live window is mirrored in cluster_actors:
+    observe_trades() seeds it, adds and prunes, and load() only reads. With
+    keep=False nothing expires (history windows).
+    """
+
+    def __init__(self, days: Optional[int] = None, keep: bool = True):
+        self.days = days
+        self.keep = keep
+        self.actors: Dict[str, Dict[str, Dict[str, List[str]]]] = {}  # ticker -> side -> actor -> sorted days
+        self.buckets: Dict[str, List[Tuple[str, str, str]]] = {}        # day -> [(ticker, side, actor)]
+        self.cutoff: Optional[str] = None
+        self.loaded = False
+
+    def add(self, ticker: Optional[str], side: str, actor: Optional[str], day: Optional[str]):
+        if not ticker or not day or side not in ("BUY", "SELL"):
+            return
+        day = str(day)[:10]
+        if self.cutoff and day < self.cutoff:
+            return
+        days = self.actors.setdefault(ticker, {}).setdefault(side, {}).setdefault(actor or "", [])
+        i = bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            return
+        days.insert(i, day)
+        self.buckets.setdefault(day, []).append((ticker, side, actor or ""))
+
+    def advance(self, cutoff: str):
+        """Expire days before `cutoff` (YYYY-MM-DD)."""
+        if not self.keep or (self.cutoff is not None and cutoff <= self.cutoff):
+            return
+        for day in [d for d in self.buckets if d < cutoff]:
+            for ticker, side, actor in self.buckets.pop(day):
+                by_actor = self.actors[ticker][side]
+                by_actor[actor].remove(day)
+                if not by_actor[actor]:
+                    del by_actor[actor]
+        self.cutoff = cutoff
+
+    def covers(self, start: str) -> bool:
+        """Whether every disclosure from `start` on is in the window."""
+        return self.cutoff is None or start >= self.cutoff
+
+    def count(self, ticker: str, side: str, start: str, end: str) -> int:
+        """Distinct actors on `ticker` / `side` with a disclosure in [start, end]."""
+        n = 0
+        for days in self.actors.get(ticker, {}).get(side, {}).values():
+            i = bisect_left(days, start)
+            if i < len(days) and days[i] <= end:
+                n += 1
+        return n
+
+    def subset(self, tickers: Iterable[str]) -> "ClusterWindow":
+        """A loaded copy holding only `tickers`, which can be added to without touching this window."""
+        out = ClusterWindow(self.days, self.keep)
+        out.cutoff, out.loaded = self.cutoff, True
+        for ticker in tickers:
+            for side, by_actor in self.actors.get(ticker, {}).items():
+                for actor, days in by_actor.items():
+                    for day in days:
+                        out.add(ticker, side, actor, day)
+        return out
+
+    def load(self, conn=None):
+        """
+        Restore the window from cluster_actors, which holds every disclosure
+        from cluster_state 'since' on. Read only: before observe_trades has
+        seeded the table nothing is covered and cluster_features reads
+        trades instead.
+        """
+        conn = conn or get_conn()
+        if self.days is None:
+            self.days = _cluster_days()
+        since = conn.execute("SELECT value FROM cluster_state WHERE key = 'since'").fetchone()
+        self.actors, self.buckets = {}, {}
+        self.cutoff = since[0] if since else "9999-12-31"
+        self.advance(_keep_from())
+        for r in conn.execute(
+            "SELECT ticker, side, actor, day FROM cluster_actors WHERE day >= ?", (self.cutoff,)
+        ):
+            self.add(r[0], r[1], r[2], r[3])
+        self.loaded = True
+        return self
+
+
+def _save_days(conn, events: Iterable[Tuple[Optional[str], str, Optional[str], Optional[str]]]):
+    conn.executemany(
+        "INSERT INTO cluster_actors (ticker, side, actor, day) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(ticker, side, actor, day) DO NOTHING",
+        (
+            (ticker, side, actor or "", str(day)[:10])
+            for ticker, side, actor, day in events
+            if ticker and day and side in ("BUY", "SELL")
+        )
+    )
+
+
+def _since(conn) -> Optional[str]:
+    row = conn.execute("SELECT value FROM cluster_state WHERE key = 'since'").fetchone()
+    return row[0] if row else None
+
+
+def seed_clusters(conn, keep_from: Optional[str] = None):
+    """
+    Rebuild cluster_actors from the trades disclosed on/after `keep_from`
+    (default: what the live window keeps). The caller commits.
+    """
+    keep_from = keep_from or _keep_from()
+    conn.execute("DELETE FROM cluster_actors")
+    _save_days(conn, (
+        (r[0], norm_side(r[2]), r[1], r[3]) for r in conn.execute(
+            "SELECT ticker, person, side, disclosed_date FROM trades "
+            "WHERE disclosed_date >= ? AND ticker IS NOT NULL", (keep_from,)
+        ).fetchall()
+    ))
+    conn.execute(
+        "INSERT INTO cluster_state (key, value) VALUES ('since', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value", (keep_from,)
+    )
+    CLUSTERS.loaded = False
+    print(f"[patterns] seeded cluster window from trades disclosed since {keep_from}")
+
+
+def stored_window(
+    conn, spans: Optional[Dict[str, Tuple[str, str]]] = None, table: str = "trades"
+) -> ClusterWindow:
+    """
+    A window over stored trades that never expires: every trade, or for
+    `spans` (ticker -> (first day, last day)) only those. `table` may be
+    retention's all_trades view. Read only.
+    """
+    out = ClusterWindow(_cluster_days(), keep=False)
+    out.loaded = True
+    if spans is None:
+        rows = conn.execute(
+            f"SELECT ticker, person, side, disclosed_date FROM {table} "
+            "WHERE ticker IS NOT NULL AND disclosed_date IS NOT NULL"
+        )
+    else:
+        rows = (
+            r for ticker, (lo, hi) in spans.items() for r in conn.execute(
+                f"SELECT ticker, person, side, disclosed_date FROM {table} "
+                "WHERE ticker = ? AND disclosed_date BETWEEN ? AND ?", (ticker, lo, hi)
+            )
+        )
+    for r in rows:
+        out.add(r[0], norm_side(r[2]), r[1], r[3])
+    return out
+
+
+CLUSTERS = ClusterWindow()
+
+
+def cluster_window(conn=None) -> ClusterWindow:
+    """The live cluster window, loaded on first use and advanced to today (UTC)."""
+    if not CLUSTERS.loaded:
+        CLUSTERS.load(conn)
+    CLUSTERS.advance(_keep_from())
+    return CLUSTERS
+
+
+def observe_trades(conn, trades: Iterable[Any]):
+    """
+    Record freshly ingested (already stored) GovTrade records in the cluster
+    window and its table, pruning days the window no longer keeps. The table
+    is seeded from trades first if it never was, or keeps less than
+    cluster_days + lookback_days (either grew). Writes run in the caller's
+    transaction, which commits them with the trades. With conn=None only the
+    loaded in-memory window is updated.
+    """
+    events = [(t.ticker, norm_side(t.side), t.actor or "", t.disclosed_date) for t in trades]
+    if conn is not None:
+        since, keep_from = _since(conn), _keep_from()
+        if since is None or since > keep_from:
+            # The seed reads trades, which already hold this batch.
+            seed_clusters(conn, keep_from)
+            return
+        if since < keep_from:
+            conn.execute("DELETE FROM cluster_actors WHERE day < ?", (keep_from,))
+            conn.execute("UPDATE cluster_state SET value = ? WHERE key = 'since'", (keep_from,))
+            since = keep_from
+        _save_days(conn, (e for e in events if e[3] and str(e[3])[:10] >= since))
+    if CLUSTERS.loaded:
+        for e in events:
+            CLUSTERS.add(*e)
+
+
+def cluster_features(
+    items: Sequence[Tuple[Optional[str], Optional[str]]], conn=None
+) -> List[Tuple[int, int]]:
+    """
+    For each (ticker, disclosure day): (distinct buyers, distinct sellers)
+    who disclosed within cluster_days up to and including that day. Days
+    older than the live window (backfills) are counted from trades.
+    """
+    window = cluster_window(conn)
+    days = window.days or _cluster_days()
+    starts = [_window_start(day, days) if ticker and day else None for ticker, day in items]
+
+    spans: Dict[str, Tuple[str, str]] = {}
+    for (ticker, day), start in zip(items, starts):
+        if start and not window.covers(start):
+            lo, hi = spans.get(ticker, (start, str(day)[:10]))
+            spans[ticker] = (min(lo, start), max(hi, str(day)[:10]))
+    older = stored_window(conn or get_conn(), spans) if spans else None
+
+    out = []
+    for (ticker, day), start in zip(items, starts):
+        if not start:
+            out.append((0, 0))
+            continue
+        w = window if window.covers(start) else older
+        end = str(day)[:10]
+        out.append((w.count(ticker, "BUY", start, end), w.count(ticker, "SELL", start, end)))
+    return out
+
+
+# -----------------------
+# Contract timing
+# -----------------------
+
+class AwardIndex:
+    """
+    In-memory ticker -> sorted award dates (YYYY-MM-DD), loaded from the
+    contracts table once per process and kept current by add() as new
+    contracts are ingested. Window checks are two bisects per trade.
+    """
+
+    def __init__(self):
+        self.dates: Dict[str, List[str]] = {}
+        self.loaded = False
+
+    def load(self, conn=None):
+        conn = conn or get_conn()
+        dates: Dict[str, List[str]] = {}
+        for r in conn.execute(
+            "SELECT ticker, award_date FROM contracts "
+            "WHERE ticker IS NOT NULL AND award_date IS NOT NULL "
+            "ORDER BY ticker, award_date"
+        ):
+            dates.setdefault(r["ticker"], []).append(str(r["award_date"])[:10])
+        self.dates = dates
+        self.loaded = True
+        return self
+
+    def add(self, ticker: str, award_date: str):
+        # Before the first load the table itself is the source of truth.
+        if self.loaded and ticker and award_date:
+            insort(self.dates.setdefault(ticker, []), str(award_date)[:10])
+
+    def has_award_within(self, ticker: str, trade_date: Optional[datetime], window=14) -> bool:
+        dates = self.dates.get(ticker)
+        if not dates or trade_date is None:
+            return False
+        start = (trade_date - timedelta(days=window)).date().isoformat()
+        end = (trade_date + timedelta(days=window)).date().isoformat()
+        return bisect_right(dates, end) > bisect_left(dates, start)
+
+
+AWARDS = AwardIndex()
+
+
+def award_index(conn=None) -> AwardIndex:
+    return AWARDS if AWARDS.loaded else AWARDS.load(conn)
+
+
+def add_awards(rows: Iterable[Any]):
+    """Keep the award index in step with freshly ingested ContractAward records."""
+    for r in rows:
+        AWARDS.add(r.ticker, r.award_date)
+
+
+def contract_timing_hits(
+    items: Sequence[Tuple[str, datetime]],
+    window=14,
+    conn=None,
+) -> List[bool]:
+    """
+    For each (ticker, trade_date) pair, report whether any contract was
+    awarded within +/- `window` days, via the in-memory award index.
+    """
+    index = award_index(conn)
+    return [index.has_award_within(ticker, trade_date, window) for ticker, trade_date in items]
+
+
+# -----------------------
+# Cross-source events
+# -----------------------
+# Government trades, insider trades and contract awards on one timeline per
+# ticker, keyed by the day the event happened (transaction / award date,
+# falling back to the filing date), so "who else traded X around then?" is
+# two bisects plus a scan of the window.
+
+SOURCES = ("government", "insider", "contract")
+
+
+class Event(NamedTuple):
+    date: str          # YYYY-MM-DD
+    source: str        # one of SOURCES
+    actor: Optional[str]
+    side: str          # BUY / SELL / UNKNOWN; AWARD for contracts
+
+
+class EventIndex:
+    """
+    In-memory ticker -> date-sorted events across trades, insider_trades and
+    contracts. Loaded once per process and kept current by add() as rows are
+    ingested, like AwardIndex.
+    """
+
+    def __init__(self):
+        self.dates: Dict[str, List[str]] = {}
+        self.events: Dict[str, List[Event]] = {}
+        self.loaded = False
+
+    def load(self, conn=None):
+        conn = conn or get_conn()
+        rows = conn.execute(
+            "SELECT ticker, COALESCE(transaction_date, disclosed_date) AS d, 'government' AS source, "
+            "person AS actor, side FROM trades WHERE ticker IS NOT NULL "
+            "UNION ALL "
+            "SELECT ticker, COALESCE(transaction_date, filed_date), 'insider', insider, side "
+            "FROM insider_trades WHERE ticker IS NOT NULL "
+            "UNION ALL "
+            "SELECT ticker, award_date, 'contract', agency, 'AWARD' FROM contracts WHERE ticker IS NOT NULL "
+            "ORDER BY 1, 2"
+        )
+        dates: Dict[str, List[str]] = {}
+        events: Dict[str, List[Event]] = {}
+        for r in rows:
+            if not r[1]:
+                continue
+            side = r[4] if r[2] == "contract" else norm_side(r[4])
+            dates.setdefault(r[0], []).append(str(r[1])[:10])
+            events.setdefault(r[0], []).append(Event(str(r[1])[:10], r[2], r[3], side))
+        self.dates, self.events = dates, events
+        self.loaded = True
+        return self
+
+    def add(self, ticker: Optional[str], event: Event):
+        # Before the first load the tables themselves are the source of truth.
+        if not (self.loaded and ticker and event.date):
+            return
+        dates = self.dates.setdefault(ticker, [])
+        i = bisect_right(dates, event.date)
+        dates.insert(i, event.date)
+        self.events.setdefault(ticker, []).insert(i, event)
+
+    def window(self, ticker: str, day: Optional[str], days: int) -> List[Event]:
+        """Events on `ticker` within +/- `days` of `day` (YYYY-MM-DD)."""
+        dates = self.dates.get(ticker)
+        if not dates or not day:
+            return []
+        d = datetime.fromisoformat(day[:10])
+        lo = bisect_left(dates, (d - timedelta(days=days)).date().isoformat())
+        hi = bisect_right(dates, (d + timedelta(days=days)).date().isoformat())
+        return self.events[ticker][lo:hi]
+
+    def actors(self, ticker: str, day: Optional[str], days: int, side: Optional[str] = None) -> Dict[str, set]:
+        """source -> distinct actors with events in the window (optionally one side only)."""
+        out: Dict[str, set] = {}
+        for e in self.window(ticker, day, days):
+            if side is None or e.side == side:
+                out.setdefault(e.source, set()).add(e.actor)
+        return out
+
+
+EVENTS = EventIndex()
+
+
+def event_index(conn=None) -> EventIndex:
+    return EVENTS if EVENTS.loaded else EVENTS.load(conn)
+
+
+def add_events(source: str, rows: Iterable[Any]):
+    """Keep the event index in step with freshly ingested records of `source`."""
+    if not EVENTS.loaded:
+        return
+    for r in rows:
+        if source == "government":
+            EVENTS.add(r.ticker, Event(r.transaction_date or r.disclosed_date, source, r.actor, norm_side(r.side)))
+        elif source == "insider":
+            EVENTS.add(r.ticker, Event(r.transaction_date or r.filed_date, source, r.actor, norm_side(r.side)))
+        else:
+            EVENTS.add(r.ticker, Event(r.award_date, source, r.agency, "AWARD"))
+
+
+def invalidate():
+    """
+    Drop the in-memory indexes, e.g. after the rows they were kept current
+    with were rolled back. Each reloads from its table on next use.
+    """
+    CLUSTERS.loaded = AWARDS.loaded = EVENTS.loaded = False
+
+
+def convergence_buyers(
+    items: Sequence[Tuple[Optional[str], Optional[str], str]],
+    days=7,
+    conn=None,
+) -> List[int]:
+    """
+    For each (ticker, event date, source) buy, the number of distinct actors
+    from the other trade source buying the same ticker within +/- `days`.
+    """
+    index = event_index(conn)
+    other = {"government": "insider", "insider": "government"}
+    return [
+        len(index.actors(ticker, day, days, side="BUY").get(other[source], ()))
+        if ticker else 0
+        for ticker, day, source in items
+    ]
+
+
+# -----------------------
+# Single-trade wrappers
+# -----------------------
+
+def detect_cluster(ticker, conn=None):
+    return cluster_features([(ticker, _today().isoformat())], conn=conn)[0][0] >= 3
+
+
+def detect_contract_timing(ticker, trade_date, window=14, conn=None):
+    return contract_timing_hits([(ticker, trade_date)], window=window, conn=conn)[0]
@@ -1 +1,279 @@
+"""
+Daily close cache (prices table) and vectorized forward returns.
 
+pandas / numpy / yfinance are imported inside the functions that need them,
+so modules that only import pricing for its names stay cheap to load.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import CONFIG
+from dates import utcnow
+from storage import get_conn
+
+
+def _horizons() -> Tuple[int, ...]:
+    return tuple(CONFIG.get("pricing", {}).get("horizons", [5, 20, 60]))
+
+
+def _history_start() -> str:
+    return str(CONFIG.get("pricing", {}).get("history_start", "2018-01-01"))
+
+# yfinance handles a few hundred symbols per download comfortably.
+DOWNLOAD_BATCH = 200
+
+
+# -----------------------
+# Price sources
+# -----------------------
+# A source returns a long DataFrame with columns ticker, date (YYYY-MM-DD), close
+# for the requested tickers over [start, end] inclusive.
+
+class YFinanceSource:
+    def fetch(self, tickers: Sequence[str], start: str, end: str):
+        import pandas as pd
+        import yfinance as yf
+
+        frames = []
+        for i in range(0, len(tickers), DOWNLOAD_BATCH):
+            chunk = list(tickers[i:i + DOWNLOAD_BATCH])
+            raw = yf.download(
+                chunk,
+                start=start,
+                # yfinance treats `end` as exclusive
+                end=(date.fromisoformat(end) + timedelta(days=1)).isoformat(),
+                auto_adjust=True,
+                progress=False,
+                threads=True,
+            )
+            if raw is None or raw.empty:
+                continue
+            close = raw["Close"]
+            if isinstance(close, pd.Series):
+                close = close.to_frame(name=chunk[0])
+            frames.append(_wide_to_long(close))
+        if not frames:
+            return _empty_long()
+        return pd.concat(frames, ignore_index=True)
+
+
+class LocalFileSource:
+    """
+    Offline source backed by a CSV or parquet file with ticker, date, close
+    columns (case-insensitive). Handy for tests and backtests.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._df = None
+
+    def _load(self):
+        import pandas as pd
+
+        if self._df is None:
+            if self.path.endswith((".parquet", ".pq")):
+                df = pd.read_parquet(self.path)
+            else:
+                df = pd.read_csv(self.path)
+            df.columns = [c.lower() for c in df.columns]
+            df["ticker"] = df["ticker"].astype(str).str.upper()
+            df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+            self._df = df[["ticker", "date", "close"]].dropna()
+        return self._df
+
+    def fetch(self, tickers: Sequence[str], start: str, end: str):
+        df = self._load()
+        mask = df["ticker"].isin(set(tickers)) & (df["date"] >= start) & (df["date"] <= end)
+        return df.loc[mask].reset_index(drop=True)
+
+
+def default_source():
+    path = CONFIG.get("pricing", {}).get("local_path")
+    return LocalFileSource(path) if path else YFinanceSource()
+
+
+def _empty_long():
+    import pandas as pd
+    return pd.DataFrame({"ticker": [], "date": [], "close": []})
+
+
+def _wide_to_long(wide):
+    long = wide.stack().rename("close").reset_index()
+    long.columns = ["date", "ticker", "close"]
+    long["date"] = long["date"].dt.strftime("%Y-%m-%d")
+    long["ticker"] = long["ticker"].astype(str).str.upper()
+    return long[["ticker", "date", "close"]]
+
+
+# -----------------------
+# Cache maintenance
+# -----------------------
+
+def tracked_tickers(conn) -> List[str]:
+    rows = conn.execute(
+        "SELECT ticker FROM trades WHERE ticker IS NOT NULL "
+        "UNION SELECT ticker FROM insider_trades WHERE ticker IS NOT NULL"
+    ).fetchall()
+    return sorted(r[0] for r in rows)
+
+
+def missing_ranges(conn, tickers: Iterable[str], start: str, end: str) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Work out which date ranges each ticker still needs, grouped as
+    (range_start, range_end) -> tickers so each range is one bulk download.
+    Only the edges before the first / after the last cached close or
+    requested day (price_fetches) are considered; interior gaps are market
+    holidays or halts.
+    """
+    have = {
+        r["ticker"]: (r["lo"], r["hi"])
+        for r in conn.execute(
+            "SELECT ticker, MIN(lo) lo, MAX(hi) hi FROM ("
+            "SELECT ticker, MIN(date) lo, MAX(date) hi FROM prices GROUP BY ticker "
+            "UNION ALL SELECT ticker, lo, hi FROM price_fetches) GROUP BY ticker"
+        )
+    }
+    plan: Dict[Tuple[str, str], List[str]] = {}
+    for t in tickers:
+        if t not in have:
+            plan.setdefault((start, end), []).append(t)
+            continue
+        lo, hi = have[t]
+        if start < lo:
+            before = (date.fromisoformat(lo) - timedelta(days=1)).isoformat()
+            plan.setdefault((start, before), []).append(t)
+        if hi < end:
+            after = (date.fromisoformat(hi) + timedelta(days=1)).isoformat()
+            plan.setdefault((after, end), []).append(t)
+    return plan
+
+
+def sync_prices(conn=None, source=None, tickers=None, start: Optional[str] = None, end: Optional[str] = None) -> int:
+    """
+    Fetch only missing closes for every tracked ticker and bulk-insert them.
+    Each requested span is recorded in price_fetches, so tickers the source
+    has no closes for are not asked for the same days again. `end` (default
+    today, UTC) is left open: its close may not be out yet. Returns the
+    number of rows written.
+    """
+    conn = conn or get_conn()
+    source = source or default_source()
+    tickers = list(tickers) if tickers is not None else tracked_tickers(conn)
+    start = start or _history_start()
+    end = end or utcnow().date().isoformat()
+    settled = (date.fromisoformat(end) - timedelta(days=1)).isoformat()
+
+    written = 0
+    for (lo, hi), group in missing_ranges(conn, tickers, start, end).items():
+        if lo > hi:
+            continue
+        df = source.fetch(group, lo, hi)
+        if df is not None and not df.empty:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO prices (ticker, date, close) VALUES (?,?,?) "
+                "ON CONFLICT(ticker, date) DO NOTHING",
+                df[["ticker", "date", "close"]].itertuples(index=False, name=None)
+            )
+            written += conn.total_changes - before
+        if lo <= min(hi, settled):
+            conn.executemany(
+                "INSERT INTO price_fetches (ticker, lo, hi) VALUES (?,?,?) "
+                "ON CONFLICT(ticker) DO UPDATE SET lo=MIN(lo, excluded.lo), hi=MAX(hi, excluded.hi)",
+                ((t, lo, min(hi, settled)) for t in group)
+            )
+    conn.commit()
+    print(f"[pricing] stored {written} closes for {len(tickers)} tickers")
+    return written
+
+
+# -----------------------
+# Vectorized returns
+# -----------------------
+
+def load_closes(conn, tickers: Optional[Iterable[str]] = None, start: Optional[str] = None):
+    """Wide frame of closes: DatetimeIndex of trading days x ticker columns, forward-filled."""
+    import pandas as pd
+
+    sql = "SELECT ticker, date, close FROM prices"
+    params: list = []
+    if start:
+        sql += " WHERE date >= ?"
+        params.append(start)
+    long = pd.read_sql_query(sql, conn, params=params)
+    if tickers is not None:
+        long = long[long["ticker"].isin(set(tickers))]
+    if long.empty:
+        return pd.DataFrame(dtype=float)
+    wide = long.pivot(index="date", columns="ticker", values="close")
+    wide.index = pd.to_datetime(wide.index)
+    return wide.sort_index().ffill()
+
+
+def forward_returns(events, closes, horizons: Optional[Sequence[int]] = None):
+    """
+    Forward returns for many events at once.
+
+    `events` has ticker and date columns; `closes` is load_closes() output.
+    The base close is the first trading day on/after the event date and
+    ret_<h> is the close h trading days later over the base, minus one.
+    Missing tickers or horizons past the end of the data give NaN.
+    `horizons` defaults to pricing.horizons.
+    """
+    import numpy as np
+    import pandas as pd
+
+    horizons = horizons or _horizons()
+    out = events.copy()
+    if closes is None or closes.empty or events.empty:
+        for h in horizons:
+            out[f"ret_{h}"] = np.nan
+        return out
+
+    values = closes.to_numpy(dtype=float)
+    n_days = values.shape[0]
+    col_of = {t: i for i, t in enumerate(closes.columns)}
+
+    cols = events["ticker"].map(col_of).to_numpy(dtype=float)
+    known = ~np.isnan(cols)
+    cols = np.where(known, cols, 0).astype(int)
+
+    ev_dates = pd.to_datetime(events["date"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    pos = np.searchsorted(closes.index.to_numpy(dtype="datetime64[ns]"), ev_dates, side="left")
+    valid = known & ~np.isnat(ev_dates) & (pos < n_days)
+
+    base = np.full(len(out), np.nan)
+    base[valid] = values[pos[valid], cols[valid]]
+
+    for h in horizons:
+        fwd_pos = pos + h
+        ok = valid & (fwd_pos < n_days)
+        ret = np.full(len(out), np.nan)
+        ret[ok] = values[fwd_pos[ok], cols[ok]] / base[ok] - 1.0
+        out[f"ret_{h}"] = ret
+    return out
+
+
+def trade_events(conn):
+    """All stored trades as events: id, kind, actor, ticker, date."""
+    import pandas as pd
+
+    return pd.read_sql_query(
+        "SELECT id, 'government' AS kind, person AS actor, ticker, disclosed_date AS date FROM trades "
+        "UNION ALL "
+        "SELECT id, 'insider' AS kind, insider AS actor, ticker, COALESCE(filed_date, transaction_date) AS date FROM insider_trades",
+        conn,
+    )
+
+
+def trade_forward_returns(conn=None, horizons: Optional[Sequence[int]] = None):
+    conn = conn or get_conn()
+    events = trade_events(conn)
+    return forward_returns(events, load_closes(conn, events["ticker"].unique()), horizons)
+
+
+if __name__ == "__main__":
+    from storage import init_db
+
+    init_db()
+    sync_prices()
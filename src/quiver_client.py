@@ -1,12 +1,29 @@
+import codecs
+import json
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
 import requests
-from config import QUIVER_API_KEY
+from requests.adapters import HTTPAdapter
+from config import CONFIG, QUIVER_API_KEY, QUIVER_BASE_URL
+from metrics import incr
+import snapshots
+from storage import get_conn
 
-BASE = "https://api.quiverquant.com/beta"
+BASE = QUIVER_BASE_URL
 
 DEFAULT_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
 MAX_RETRIES = 3
 BACKOFF_S = 1.5
+BACKOFF_MAX_S = 30
+
+# Statuses worth retrying; other 4xx (403 plan-gated, 404) fail fast.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def _headers():
@@ -19,36 +36,447 @@ def _headers():
     }
 
 
-def _get_json(path: str, params=None):
+# -----------------------
+# Pooled session + shared rate limiter
+# -----------------------
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session, so each host pays the TLS handshake once."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update(_headers())
+            _session = s
+    return _session
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every Quiver request in the process.
+    `rate` requests are allowed per `per` seconds, with bursts up to `rate`.
+    """
+
+    def __init__(self, rate: float, per: float):
+        self.capacity = max(float(rate), 1.0)
+        self.fill_rate = self.capacity / max(float(per), 1e-9)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def rate_limiter() -> RateLimiter:
+    """Process-wide limiter from quiver.rate_limit, built on first request."""
+    global _rate_limiter
+    with _session_lock:
+        if _rate_limiter is None:
+            cfg = CONFIG.get("quiver", {}).get("rate_limit", {})
+            _rate_limiter = RateLimiter(cfg.get("requests", 60), cfg.get("per_seconds", 60))
+    return _rate_limiter
+
+
+def _timeout(dataset: Optional[str]):
+    read = CONFIG.get("quiver", {}).get("timeouts", {}).get(dataset, DEFAULT_TIMEOUT)
+    return (CONNECT_TIMEOUT, float(read))
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when given."""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_S * (2 ** (attempt - 1))))
+
+
+def _request(path: str, params=None, extra_headers=None, timeout=None, stream=False):
     url = f"{BASE}{path}"
+    session = get_session()
 
-    last_err = None
+    last_err: Optional[Exception] = None
     for attempt in range(1, MAX_RETRIES + 1):
+        retry_after = None
         try:
-            r = requests.get(url, headers=_headers(), params=params, timeout=DEFAULT_TIMEOUT)
+            rate_limiter().acquire()
+            r = session.get(
+                url, headers=extra_headers, params=params,
+                timeout=timeout or _timeout(None), stream=stream,
+            )
+        except requests.RequestException as e:
+            last_err = e
+        else:
+            if r.status_code < 400:
+                return r
+
             ct = (r.headers.get("Content-Type") or "").lower()
             preview = (r.text or "")[:300]
+            last_err = RuntimeError(
+                f"Quiver API error {r.status_code} for {url}. "
+                f"Content-Type={ct}. Body (first 300 chars): {preview}"
+            )
+            if r.status_code not in RETRY_STATUSES:
+                raise last_err
+            retry_after = r.headers.get("Retry-After")
 
-            if r.status_code >= 400:
-                raise RuntimeError(
-                    f"Quiver API error {r.status_code} for {url}. "
-                    f"Content-Type={ct}. Body (first 300 chars): {preview}"
-                )
+        if attempt < MAX_RETRIES:
+            incr("api_retries")
+            # Sleeps only this dataset's worker thread; other fetches proceed.
+            time.sleep(_backoff(attempt, retry_after))
+    raise last_err
 
-            try:
-                return r.json()
-            except Exception as e:
-                raise RuntimeError(
-                    f"Quiver returned non-JSON for {url}. Content-Type={ct}. "
-                    f"Body (first 300 chars): {preview}"
-                ) from e
 
-        except Exception as e:
-            last_err = e
-            if attempt < MAX_RETRIES:
-                time.sleep(BACKOFF_S * attempt)
-                continue
-            raise last_err
+def _decode_json(r):
+    try:
+        return r.json()
+    except Exception as e:
+        ct = (r.headers.get("Content-Type") or "").lower()
+        preview = (r.text or "")[:300]
+        raise RuntimeError(
+            f"Quiver returned non-JSON for {r.url}. Content-Type={ct}. "
+            f"Body (first 300 chars): {preview}"
+        ) from e
+
+
+def _get_json(path: str, params=None):
+    return _decode_json(_request(path, params=params))
+
+
+# -----------------------
+# Streaming JSON
+# -----------------------
+
+STREAM_CHUNK_BYTES = 1 << 16
+_WS = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+def _iter_json_array(r, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[Any]:
+    """
+    Incrementally decode a top-level JSON array from a streamed response,
+    yielding one element at a time. Only the unparsed tail of the body is
+    buffered, so memory stays flat regardless of payload size.
+    A non-array body is decoded whole (and yielded item-wise if it is a list).
+    """
+    chunks = r.iter_content(chunk_size=chunk_size)
+    utf8 = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, exhausted
+        if exhausted:
+            return False
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+            pos = 0
+            return False
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        return True
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    skip_ws()
+    if pos >= len(buf):
+        return
+    if buf[pos] != "[":
+        while fill():
+            pass
+        try:
+            value = json.loads(buf[pos:])
+        except ValueError as e:
+            raise RuntimeError(
+                f"Quiver returned non-JSON for {r.url}. "
+                f"Body (first 300 chars): {buf[pos:pos + 300]}"
+            ) from e
+        yield from (value if isinstance(value, list) else [value])
+        return
+
+    pos += 1
+    while True:
+        skip_ws()
+        if pos >= len(buf):
+            raise RuntimeError(f"Quiver stream for {r.url} ended inside the JSON array.")
+        if buf[pos] == "]":
+            for _ in chunks:  # drain trailing whitespace so the body is fully read
+                pass
+            return
+        if buf[pos] == ",":
+            pos += 1
+            continue
+        try:
+            obj, end = _decoder.raw_decode(buf, pos)
+        except ValueError:
+            obj, end = None, -1
+        # A number cut at the chunk edge still decodes ("12" of "12.5"), so a
+        # scalar only counts once the following delimiter has been read.
+        truncated = (
+            end >= 0 and not exhausted and not isinstance(obj, (dict, list))
+            and (end == len(buf) or buf[end] not in _WS + ",]")
+        )
+        if end < 0 or truncated:
+            if not fill():
+                if end < 0:
+                    raise RuntimeError(
+                        f"Quiver stream for {r.url} has malformed JSON near: {buf[pos:pos + 300]}"
+                    )
+            continue
+        pos = end
+        yield obj
+
+
+def _stream_datasets() -> Set[str]:
+    return set(CONFIG.get("quiver", {}).get("stream_datasets", []) or [])
+
+
+# -----------------------
+# Incremental fetch state
+# -----------------------
+# Validators (ETag / Last-Modified) and the newest filing date seen are kept
+# per dataset in the fetch_state table. New values are staged in _pending and
+# only written by commit_fetch_state(), inside the same transaction as the
+# ingested rows, so a crashed run never skips data on the next attempt.
+
+_state_cache: Dict[str, Dict[str, Any]] = {}
+_pending: Dict[str, Dict[str, Any]] = {}
+
+
+def _load_state(dataset: str) -> Dict[str, Any]:
+    if dataset not in _state_cache:
+        conn = get_conn()
+        row = conn.execute(
+            "SELECT etag, last_modified, high_water FROM fetch_state WHERE dataset=?",
+            (dataset,)
+        ).fetchone()
+        conn.close()
+        _state_cache[dataset] = dict(row) if row else {}
+    return _state_cache[dataset]
+
+
+def high_water(dataset: str) -> Optional[str]:
+    """Newest filing date (YYYY-MM-DD) already ingested for a dataset, if any."""
+    pending = _pending.get(dataset, {}).get("high_water")
+    return pending or _load_state(dataset).get("high_water")
+
+
+def high_water_since(dataset: str) -> Optional[str]:
+    """
+    Earliest filing date worth ingesting: the high-water mark minus the
+    configured overlap, so late-posted filings for recent days still land.
+    """
+    hw = high_water(dataset)
+    if not hw:
+        return None
+    overlap = int(CONFIG.get("quiver", {}).get("high_water_overlap_days", 1))
+    return (date.fromisoformat(hw[:10]) - timedelta(days=overlap)).isoformat()
+
+
+def record_high_water(dataset: str, value: Optional[str]):
+    if not value:
+        return
+    value = str(value)[:10]
+    current = high_water(dataset)
+    if not current or value > current:
+        _pending.setdefault(dataset, {})["high_water"] = value
+
+
+def commit_fetch_state(conn):
+    """Persist staged validators/high-water marks. Caller commits."""
+    now = datetime.now(timezone.utc).isoformat()
+    for dataset, staged in _pending.items():
+        state = {**_load_state(dataset), **staged}
+        conn.execute(
+            "INSERT INTO fetch_state (dataset, etag, last_modified, high_water, updated_at) "
+            "VALUES (?,?,?,?,?) ON CONFLICT(dataset) DO UPDATE SET "
+            "etag=excluded.etag, last_modified=excluded.last_modified, "
+            "high_water=excluded.high_water, updated_at=excluded.updated_at",
+            (dataset, state.get("etag"), state.get("last_modified"), state.get("high_water"), now)
+        )
+        _state_cache[dataset] = state
+    _pending.clear()
+
+
+def discard_fetch_state():
+    """Drop staged state after a failed run so a later commit can't persist it."""
+    _pending.clear()
+
+
+def _since_params(dataset: str) -> Optional[Dict[str, str]]:
+    """
+    Date-bounded query params for endpoints that accept them. Configured in
+    config.yaml (quiver.since_params: {dataset: {param: strftime format}})
+    because support differs per endpoint and plan.
+    """
+    spec = CONFIG.get("quiver", {}).get("since_params", {}).get(dataset)
+    since = high_water_since(dataset)
+    if not spec or not since:
+        return None
+    d = date.fromisoformat(since)
+    return {param: d.strftime(fmt) for param, fmt in spec.items()}
+
+
+# -----------------------
+# Raw response snapshots
+# -----------------------
+# Every 200 body is stored by snapshots.py; runs inside the TTL read the
+# latest snapshot instead of calling the API, and replay mode reads only
+# snapshots listed in a run manifest.
+
+_replay: Optional[Dict[str, Any]] = None
+_run_snapshots: Dict[str, Dict[str, Any]] = {}
+
+
+def set_replay(manifest: Optional[Dict[str, Any]]):
+    """Serve datasets from a run manifest's snapshots instead of the API (None to stop)."""
+    global _replay
+    _replay = manifest
+
+
+def _snapshot_fetched(dataset: str, sha: str, r):
+    snapshots.set_ref(dataset, sha, url=r.url, etag=r.headers.get("ETag"))
+    _run_snapshots[dataset] = {
+        "sha": sha, "status": "fetched",
+        # Lets a separate ingest process commit the validators (stage_validators).
+        "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+    }
+
+
+def stage_validators(manifest: Dict[str, Any]):
+    """
+    Stage the validators a manifest's fetches returned, for a process that
+    ingests a manifest written by another (`main.py fetch` then `ingest`).
+    """
+    for dataset, entry in manifest["datasets"].items():
+        if entry.get("status") == "fetched":
+            staged = _pending.setdefault(dataset, {})
+            staged["etag"] = entry.get("etag")
+            staged["last_modified"] = entry.get("last_modified")
+
+
+class _TeeBody:
+    """Streamed response whose chunks are also written to a snapshot."""
+
+    def __init__(self, r, dataset: str):
+        self.r = r
+        self.dataset = dataset
+        self.url = r.url
+        self.encoding = r.encoding
+
+    def iter_content(self, chunk_size: int = STREAM_CHUNK_BYTES):
+        writer = snapshots.SnapshotWriter()
+        try:
+            for chunk in self.r.iter_content(chunk_size=chunk_size):
+                writer.write(chunk)
+                yield chunk
+        except BaseException:
+            # Abandoned or failed mid-body: never store a partial snapshot.
+            writer.abort()
+            raise
+        _snapshot_fetched(self.dataset, writer.commit(), self.r)
+
+
+def _from_snapshot(sha: str, stream: bool):
+    return _iter_json_array(snapshots.SnapshotBody(sha)) if stream else snapshots.load_json(sha)
+
+
+def snapshot_records(sha: str) -> Iterator[Any]:
+    """Stream the records of a stored snapshot, one at a time."""
+    return _iter_json_array(snapshots.SnapshotBody(sha))
+
+
+def write_run_manifest() -> Optional[str]:
+    """
+    Write the manifest of snapshots this run read (for --replay); returns
+    its path. Nothing is written while snapshots are disabled.
+    """
+    if _replay is not None or not _run_snapshots or not snapshots.enabled():
+        _run_snapshots.clear()
+        return None
+    path = snapshots.write_manifest(dict(_run_snapshots))
+    _run_snapshots.clear()
+    print(f"[quiver_client] snapshot manifest: {path}")
+    return str(path)
+
+
+def _get_dataset_json(dataset: str, path: str):
+    """
+    Conditional GET for a dataset. Returns [] on 304 Not Modified and
+    stages the new validators for commit_fetch_state(). Datasets listed in
+    quiver.stream_datasets come back as a generator of records.
+    Fresh snapshots (or the replay manifest) are used instead of the API.
+    """
+    stream = dataset in _stream_datasets()
+    if _replay is not None:
+        entry = _replay["datasets"].get(dataset) or {}
+        return _from_snapshot(entry["sha"], stream) if entry.get("sha") else []
+
+    ref = snapshots.fresh_ref(dataset)
+    if ref:
+        print(f"[quiver_client] {dataset}: reusing snapshot fetched {ref['fetched_at']}.")
+        _run_snapshots[dataset] = {"sha": ref["sha"], "status": "cached"}
+        return _from_snapshot(ref["sha"], stream)
+
+    state = _load_state(dataset)
+    extra = {}
+    if state.get("etag"):
+        extra["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        extra["If-Modified-Since"] = state["last_modified"]
+
+    r = _request(
+        path, params=_since_params(dataset), extra_headers=extra,
+        timeout=_timeout(dataset), stream=stream,
+    )
+    if r.status_code == 304:
+        print(f"[quiver_client] {dataset}: not modified since last run.")
+        if snapshots.enabled():
+            _run_snapshots[dataset] = {"sha": None, "status": "not_modified"}
+        incr("api_not_modified", dataset=dataset)
+        return []
+
+    staged = _pending.setdefault(dataset, {})
+    staged["etag"] = r.headers.get("ETag")
+    staged["last_modified"] = r.headers.get("Last-Modified")
+    if not snapshots.enabled():
+        return _iter_json_array(r) if stream else _decode_json(r)
+    if stream:
+        return _iter_json_array(_TeeBody(r, dataset))
+    data = _decode_json(r)
+    _snapshot_fetched(dataset, snapshots.store_bytes(r.content), r)
+    return data
 
 
 def _safe_dataset(callable_fn, dataset_name: str):
@@ -76,23 +504,58 @@ def _safe_dataset(callable_fn, dataset_name: str):
 
 def fetch_government_trades():
     # Hobbyist: LIVE congress trades feed (historical congresstrading 404s on hobbyist)
-    return _safe_dataset(lambda: _get_json("/live/congresstrading"), "government_trades")
+    return _safe_dataset(
+        lambda: _get_dataset_json("government_trades", "/live/congresstrading"), "government_trades"
+    )
 
 
 def fetch_insider_trades():
     # Hobbyist: historical insider trading (live insiders is typically gated)
-    return _safe_dataset(lambda: _get_json("/historical/insidertrading"), "insider_trades")
+    return _safe_dataset(
+        lambda: _get_dataset_json("insider_trades", "/historical/insidertrading"), "insider_trades"
+    )
 
 
 def fetch_contracts():
     # Contracts are commonly gated (403) on hobbyist, but keep safe fallbacks.
     def _fetch():
         try:
-            return _get_json("/historical/governmentcontracts")
+            return _get_dataset_json("contracts", "/historical/governmentcontracts")
         except RuntimeError as e:
             # If historical path not present, try alternate common route
             if "error 404" in str(e).lower() or "not found" in str(e).lower():
-                return _get_json("/governmentcontracts")
+                return _get_dataset_json("contracts", "/governmentcontracts")
             raise
 
     return _safe_dataset(_fetch, "contracts")
+
+
+# -----------------------
+# Concurrent fetch
+# -----------------------
+
+FETCHERS: Dict[str, Callable[[], Any]] = {
+    "government_trades": fetch_government_trades,
+    "insider_trades": fetch_insider_trades,
+    "contracts": fetch_contracts,
+}
+
+
+def fetch_all(datasets=None, optional=("contracts",)) -> Dict[str, Any]:
+    """
+    Fetch several datasets concurrently over the shared session.
+    Failures in `optional` datasets are logged and yield []; others raise.
+    """
+    names = list(datasets or FETCHERS)
+    results: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=len(names) or 1, thread_name_prefix="quiver") as pool:
+        futures = {name: pool.submit(FETCHERS[name]) for name in names}
+        for name, fut in futures.items():
+            try:
+                results[name] = fut.result() or []
+            except Exception as e:
+                if name not in optional:
+                    raise
+                print(f"[quiver_client] {name} fetch failed (non-fatal): {e}")
+                results[name] = []
+    return results
@@ -0,0 +1,68 @@
+"""
+Compact record types passed between ingest, scoring and the digest.
+
+NamedTuples keep per-row memory at tuple size (no per-instance __dict__)
+and make field access an index lookup.
+"""
+from typing import Any, List, Mapping, NamedTuple, Optional
+
+
+class GovTrade(NamedTuple):
+    tid: str
+    ticker: str
+    actor: str
+    chamber: str
+    side: str
+    amount: Any
+    transaction_date: Optional[str]      # YYYY-MM-DD, None if unparseable
+    disclosed_date: Optional[str]
+    link: str = ""
+    amount_low: Optional[int] = None     # amounts.parse_range bounds of `amount`
+    amount_high: Optional[int] = None    # None when open-ended ("1,000,000+")
+
+
+class InsiderTrade(NamedTuple):
+    tid: str
+    ticker: str
+    actor: str
+    role: str
+    side: str
+    value: Any
+    transaction_date: Optional[str]
+    filed_date: Optional[str]
+    link: str = ""
+    value_low: Optional[int] = None
+    value_high: Optional[int] = None
+
+
+class ContractAward(NamedTuple):
+    tid: str
+    ticker: str
+    award_date: str
+    amount: Any
+    agency: str
+    description: str
+
+
+class Pick(NamedTuple):
+    kind: str
+    ticker: str
+    score: int
+    side: str
+    amount: Any           # government amount or insider value
+    actor: str
+    role: str             # chamber for government trades
+    filed: Optional[str]
+    link: str
+    reasons: List[str]
+    tid: str
+    amount_low: Optional[int] = None
+    amount_high: Optional[int] = None
+
+
+def from_mapping(cls, d: Mapping[str, Any], **overrides):
+    """Build a record from a loose dict (missing fields become None)."""
+    values = {f: d.get(f) for f in cls._fields}
+    values.update(overrides)
+    return cls(**values)
+
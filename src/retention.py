@@ -0,0 +1,350 @@
+"""
+Retention: keep data.db small.
+
+  - alerts_sent rows older than `alerts_ttl_days` are deleted; their hashes
+    go into a Bloom filter (alert_bloom) that unalerted() still consults,
+    so a pruned alert is never sent twice.
+  - trades, insider_trades and contracts filed more than `archive_after_days`
+    ago move to gzipped JSONL partitions, archive/<table>/<YYYY-MM>.jsonl.gz.
+    open_archive() loads them back into temp tables for backtests.
+  - ANALYZE after every pass, VACUUM every `vacuum_every_days`.
+
+    python src/main.py retention
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from config import BASE_DIR, CONFIG
+
+
+def _cfg() -> Dict[str, Any]:
+    return CONFIG.get("retention", {}) or {}
+
+
+def archive_dir() -> Path:
+    path = Path(_cfg().get("archive_dir") or "archive")
+    return path if path.is_absolute() else Path(BASE_DIR) / path
+
+
+# table -> (filing date expression, actor column or None, kind for archived_counts)
+ARCHIVED_TABLES: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {
+    "trades": ("disclosed_date", "person", "government"),
+    "insider_trades": ("COALESCE(filed_date, transaction_date)", "insider", "insider"),
+    "contracts": ("award_date", None, None),
+}
+
+
+# -----------------------
+# Bloom filter
+# -----------------------
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over hex SHA-256 alert hashes. Bit positions come
+    from double hashing two 64-bit slices of the hash itself, so membership
+    tests cost k bit reads and no extra hashing.
+    """
+
+    def __init__(self, m: int, k: int, bits: Optional[bytearray] = None, count: int = 0):
+        self.m = m
+        self.k = k
+        self.bits = bits if bits is not None else bytearray((m + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, n: int, error_rate: float) -> "BloomFilter":
+        m = max(8, math.ceil(-n * math.log(error_rate) / math.log(2) ** 2))
+        k = max(1, round(m / n * math.log(2)))
+        return cls(m, k)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        try:
+            a, b = int(key[:16], 16), int(key[16:32], 16)
+        except ValueError:
+            digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+            a, b = int(digest[:16], 16), int(digest[16:32], 16)
+        b |= 1
+        return ((a + i * b) % self.m for i in range(self.k))
+
+    def add(self, key: str):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+# Slices are loaded once per process; prune_alerts() refreshes them.
+_slices: Optional[List[Tuple[int, int, BloomFilter]]] = None
+
+
+def _load_slices(conn) -> List[Tuple[int, int, BloomFilter]]:
+    global _slices
+    if _slices is None:
+        _slices = [
+            (r["id"], r["capacity"], BloomFilter(r["m"], r["k"], bytearray(r["bits"]), r["count"]))
+            for r in conn.execute("SELECT id, capacity, m, k, count, bits FROM alert_bloom ORDER BY id")
+        ]
+    return _slices
+
+
+def invalidate():
+    global _slices
+    _slices = None
+
+
+def pruned_alerts(conn, alert_hashes: Iterable[str]) -> set:
+    """The hashes that were (probably) sent and later pruned from alerts_sent."""
+    slices = _load_slices(conn)
+    if not slices:
+        return set()
+    return {h for h in alert_hashes if any(h in bf for _, _, bf in slices)}
+
+
+def _remember(conn, alert_hashes: List[str]):
+    """Add hashes to the newest slice, starting a new one when it is full."""
+    slices = _load_slices(conn)
+    i = 0
+    while i < len(alert_hashes):
+        if not slices or slices[-1][2].count >= slices[-1][1]:
+            capacity = int(_cfg().get("bloom_capacity", 200000))
+            bf = BloomFilter.for_capacity(capacity, float(_cfg().get("bloom_error_rate", 1e-6)))
+            cur = conn.execute(
+                "INSERT INTO alert_bloom (capacity, m, k, count, bits) VALUES (?,?,?,0,?)",
+                (capacity, bf.m, bf.k, bytes(bf.bits))
+            )
+            slices.append((cur.lastrowid, capacity, bf))
+        slice_id, capacity, bf = slices[-1]
+        take = alert_hashes[i:i + capacity - bf.count]
+        for h in take:
+            bf.add(h)
+        conn.execute(
+            "UPDATE alert_bloom SET count=?, bits=? WHERE id=?", (bf.count, bytes(bf.bits), slice_id)
+        )
+        i += len(take)
+
+
+def prune_alerts(conn, ttl_days: Optional[float] = None) -> int:
+    """
+    Move alerts_sent rows older than ttl_days (default: alerts_ttl_days)
+    into the Bloom filter and delete outbox rows sent or dead-lettered
+    before then. The caller commits.
+    """
+    if ttl_days is None:
+        ttl_days = float(_cfg().get("alerts_ttl_days", 90))
+    if ttl_days <= 0:
+        return 0
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ttl_days)).isoformat()
+    hashes = [r[0] for r in conn.execute("SELECT alert_hash FROM alerts_sent WHERE sent_at < ?", (cutoff,))]
+    if hashes:
+        try:
+            _remember(conn, hashes)
+        except BaseException:
+            invalidate()  # in-memory slices may be ahead of the rolled-back table
+            raise
+        conn.execute("DELETE FROM alerts_sent WHERE sent_at < ?", (cutoff,))
+    # Delivered outbox rows are only an audit trail past this point, and so
+    # are dead-lettered ones (reported when they failed).
+    conn.execute(
+        "DELETE FROM outbox WHERE (status = 'sent' AND sent_at < ?) OR (status = 'failed' AND created_at < ?)",
+        (cutoff, cutoff)
+    )
+    metrics.incr("alerts_pruned", len(hashes))
+    return len(hashes)
+
+
+# -----------------------
+# Archive
+# -----------------------
+
+def _partition(table: str, month: str) -> Path:
+    return archive_dir() / table / f"{month}.jsonl.gz"
+
+
+def archive_table(conn, table: str, cutoff: str) -> int:
+    """
+    Append rows of `table` filed before `cutoff` (YYYY-MM-DD) to their monthly
+    partitions, then delete them. Partitions are flushed to disk before the
+    delete; a crash in between only leaves duplicates, which readers drop.
+    The caller commits.
+    """
+    date_expr, actor_col, kind = ARCHIVED_TABLES[table]
+    where = f"{date_expr} < ?"
+    cur = conn.execute(f"SELECT *, substr({date_expr}, 1, 7) AS _month FROM {table} WHERE {where} "
+                       f"ORDER BY {date_expr}", (cutoff,))
+    n = 0
+    actors: Dict[str, int] = {}
+    month, raw, out = None, None, None
+
+    def close():
+        nonlocal raw, out
+        out.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+        raw.close()
+        raw = out = None
+
+    try:
+        for r in cur:
+            row = dict(r)
+            m = row.pop("_month")
+            if m != month:
+                if out is not None:
+                    close()
+                month = m
+                path = _partition(table, month)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Appending adds a gzip member; gzip readers concatenate them.
+                raw = open(path, "ab")
+                out = gzip.GzipFile(fileobj=raw, mode="wb")
+            out.write((json.dumps(row, separators=(",", ":")) + "\n").encode("utf-8"))
+            n += 1
+            if actor_col and row.get(actor_col):
+                actors[row[actor_col]] = actors.get(row[actor_col], 0) + 1
+    finally:
+        if out is not None:
+            close()
+    if not n:
+        return 0
+
+    conn.execute(f"DELETE FROM {table} WHERE {where}", (cutoff,))
+    if table in ("trades", "insider_trades"):
+        conn.execute("DELETE FROM scores WHERE kind = ? AND filed_date < ?", (kind, cutoff))
+    if kind:
+        conn.executemany(
+            "INSERT INTO archived_counts (kind, actor, n) VALUES (?,?,?) "
+            "ON CONFLICT(kind, actor) DO UPDATE SET n = n + excluded.n",
+            ((kind, actor, c) for actor, c in actors.items())
+        )
+    metrics.incr("rows_archived", n, table)
+    return n
+
+
+def iter_archive(table: str, since: Optional[str] = None) -> Iterable[Dict[str, Any]]:
+    """Archived rows of `table`, optionally only partitions from month `since` (YYYY-MM) on."""
+    seen = set()
+    for path in sorted((archive_dir() / table).glob("*.jsonl.gz")):
+        if since and path.name[:7] < since[:7]:
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row["id"] not in seen:
+                    seen.add(row["id"])
+                    yield row
+
+
+def open_archive(conn, tables: Iterable[str] = tuple(ARCHIVED_TABLES)) -> int:
+    """
+    Load archived rows into temp.archived_<table> and create temp views
+    all_<table> (live UNION ALL archived) on this connection. Idempotent.
+    Returns the number of archived rows loaded.
+    """
+    loaded = 0
+    for table in tables:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_temp_master WHERE type='view' AND name=?", (f"all_{table}",)
+        ).fetchone()
+        if exists:
+            continue
+        cols = [r["name"] for r in conn.execute(f"PRAGMA main.table_info({table})")]
+        conn.execute(f"CREATE TEMP TABLE archived_{table} AS SELECT * FROM main.{table} WHERE 0")
+        names = ",".join(cols)
+        marks = ",".join("?" * len(cols))
+        before = conn.total_changes
+        conn.executemany(
+            f"INSERT INTO temp.archived_{table} ({names}) VALUES ({marks})",
+            ([row.get(c) for c in cols] for row in iter_archive(table))
+        )
+        loaded += conn.total_changes - before
+        conn.execute(f"CREATE INDEX temp.idx_archived_{table}_id ON archived_{table} (id)")
+        # A pass interrupted before its delete committed leaves rows in both.
+        conn.execute(
+            f"CREATE TEMP VIEW all_{table} AS SELECT * FROM main.{table} UNION ALL "
+            f"SELECT * FROM temp.archived_{table} WHERE id NOT IN (SELECT id FROM main.{table})"
+        )
+    return loaded
+
+
+def table_or_archive(conn, table: str) -> str:
+    """`all_<table>` once open_archive() ran on this connection, else the live table."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_temp_master WHERE type='view' AND name=?", (f"all_{table}",)
+    ).fetchone()
+    return f"all_{table}" if exists else table
+
+
+# -----------------------
+# Maintenance
+# -----------------------
+
+def _state(conn, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM retention_state WHERE key=?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_state(conn, key: str, value: str):
+    conn.execute(
+        "INSERT INTO retention_state (key, value) VALUES (?,?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (key, value)
+    )
+
+
+def _db_size_mb(conn) -> float:
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    return pages * conn.execute("PRAGMA page_size").fetchone()[0] / (1024 * 1024)
+
+
+def maintain(conn, force_vacuum: bool = False) -> bool:
+    """ANALYZE, and VACUUM when due. Commits. Returns True if it vacuumed."""
+    conn.commit()
+    conn.execute("ANALYZE")
+    now = datetime.now(timezone.utc)
+    last = _state(conn, "last_vacuum")
+    every_days = float(_cfg().get("vacuum_every_days", 7))
+    due = force_vacuum or (
+        every_days > 0
+        and (not last or now - datetime.fromisoformat(last) >= timedelta(days=every_days))
+    )
+    if due:
+        before = _db_size_mb(conn)
+        with metrics.stage("vacuum"):
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"[retention] vacuumed data.db: {before:.1f} MB -> {_db_size_mb(conn):.1f} MB")
+        _set_state(conn, "last_vacuum", now.isoformat())
+    conn.commit()
+    return due
+
+
+def run(conn, archive_after_days: Optional[float] = None, force_vacuum: bool = False) -> Dict[str, int]:
+    """One retention pass: prune alerts, archive old rows, then ANALYZE/VACUUM."""
+    if archive_after_days is None:
+        archive_after_days = float(_cfg().get("archive_after_days", 365))
+    lookback = int(CONFIG.get("windows", {}).get("lookback_days", 7))
+    if archive_after_days and archive_after_days <= lookback:
+        # Ingest dedupes against the live tables over the lookback window.
+        raise ValueError(f"retention.archive_after_days must exceed windows.lookback_days ({lookback})")
+
+    with metrics.stage("prune"):
+        report = {"alerts_pruned": prune_alerts(conn)}
+    if archive_after_days > 0:
+        cutoff = (datetime.now(timezone.utc).date() - timedelta(days=archive_after_days)).isoformat()
+        with metrics.stage("archive"):
+            for table in ARCHIVED_TABLES:
+                report[table] = archive_table(conn, table, cutoff)
+    conn.commit()
+    invalidate()
+
+    maintain(conn, force_vacuum=force_vacuum)
+    print("[retention] " + ", ".join(f"{k}={v}" for k, v in report.items()))
+    return report
@@ -0,0 +1,262 @@
+"""
+Declarative scoring rules.
+
+config.yaml `rules` lists, per trade kind, predicates over a trade's
+features with a weight and an optional reason:
+
+    rules:
+      government:
+        - if: {side: BUY}
+          weight: buy_base          # a key of `scoring`, or a number
+          reason: Government buy
+        - if: {amount: {gt: 50000}}
+          weight: large_trade_bonus
+          reason: Large disclosed amount
+
+A clause maps a feature to a value (equality), a list (membership),
+{gt|ge|lt|le|ne: x} (comparison) or {any: [keywords]} (case-insensitive
+substring). Every clause of a rule must hold, and a missing feature fails
+every clause. Reasons are format strings over the features plus the
+`patterns` settings and `horizon_days`.
+
+Each RuleSet is compiled once into closures for per-trade scoring
+(score). masks() / evaluate() run the same rules over whole feature columns
+with numpy, giving the same scores and reasons.
+"""
+import operator
+from collections import ChainMap
+from string import Formatter
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from config import CONFIG
+
+MAX_SCORE = 100
+
+# Features scoring.government_features / insider_features provide.
+FEATURES: Dict[str, Tuple[str, ...]] = {
+    "government": (
+        "side", "amount", "role", "age", "cluster", "cluster_sellers", "contract", "convergence",
+        "history", "history_avg",
+    ),
+    "insider": ("side", "amount", "role", "age", "convergence", "history", "history_avg"),
+}
+
+_COMPARE = {"gt": operator.gt, "ge": operator.ge, "lt": operator.lt, "le": operator.le, "ne": operator.ne}
+
+
+class Clause(NamedTuple):
+    feature: str
+    op: str              # eq, in, any, or a _COMPARE key
+    arg: Any
+
+
+class Rule(NamedTuple):
+    key: str             # weight name in `scoring`, or "<kind>.<name>" for a literal weight
+    clauses: Tuple[Clause, ...]
+    weight: float
+    reason: Optional[str]
+
+
+# -----------------------
+# Parsing
+# -----------------------
+
+def _clauses(kind: str, feature: str, spec: Any) -> List[Clause]:
+    if feature not in FEATURES[kind]:
+        raise ValueError(f"rules.{kind}: unknown feature {feature!r}; expected one of {FEATURES[kind]}")
+    if isinstance(spec, dict):
+        out = []
+        for op, arg in spec.items():
+            if op == "any":
+                words = arg if isinstance(arg, (list, tuple)) else [arg]
+                out.append(Clause(feature, "any", tuple(str(w).lower() for w in words)))
+            elif op in _COMPARE:
+                out.append(Clause(feature, op, arg))
+            else:
+                raise ValueError(f"rules.{kind}: unknown operator {op!r} on {feature!r}")
+        return out
+    if isinstance(spec, (list, tuple)):
+        return [Clause(feature, "in", frozenset(spec))]
+    return [Clause(feature, "eq", spec)]
+
+
+def _number(w: Any) -> float:
+    w = float(w)
+    return int(w) if w.is_integer() else w
+
+
+def parse_rules(kind: str, specs: Sequence[Mapping[str, Any]], weights: Mapping[str, Any]) -> List[Rule]:
+    rules = []
+    for i, spec in enumerate(specs or []):
+        clauses = tuple(c for feature, s in (spec.get("if") or {}).items() for c in _clauses(kind, feature, s))
+        weight = spec.get("weight", 0)
+        if isinstance(weight, str):
+            if weight not in weights:
+                raise ValueError(f"rules.{kind}[{i}]: weight {weight!r} is not a key of `scoring`")
+            key, value = weight, weights[weight]
+        else:
+            key, value = f"{kind}.{spec.get('name') or i}", weight
+        rules.append(Rule(key, clauses, _number(value), spec.get("reason")))
+    return rules
+
+
+# -----------------------
+# Compiled rule sets
+# -----------------------
+
+def _compile_clause(c: Clause) -> Callable[[Mapping[str, Any]], bool]:
+    k, arg = c.feature, c.arg
+    if c.op == "eq":
+        return lambda f: f[k] is not None and f[k] == arg
+    if c.op == "in":
+        return lambda f: f[k] is not None and f[k] in arg
+    if c.op == "any":
+        return lambda f: f[k] is not None and any(w in str(f[k]).lower() for w in arg)
+    op = _COMPARE[c.op]
+    return lambda f: f[k] is not None and op(f[k], arg)
+
+
+def _compile_rule(rule: Rule) -> Callable[[Mapping[str, Any]], bool]:
+    tests = [_compile_clause(c) for c in rule.clauses]
+    if not tests:
+        return lambda f: True
+    if len(tests) == 1:
+        return tests[0]
+    return lambda f: all(t(f) for t in tests)
+
+
+class RuleSet:
+    def __init__(self, kind: str, rules: Sequence[Rule], params: Optional[Mapping[str, Any]] = None):
+        self.kind = kind
+        self.rules = list(rules)
+        self.params = dict(params or {})
+        self._compiled = [
+            (_compile_rule(r), r.weight, r.reason, bool(r.reason) and "{" in r.reason)
+            for r in self.rules
+        ]
+
+    def score(self, features: Mapping[str, Any]) -> Tuple[int, List[str]]:
+        """Score one trade's features: (min(total weight, MAX_SCORE), reasons)."""
+        score = 0
+        reasons: List[str] = []
+        for test, weight, reason, templated in self._compiled:
+            if test(features):
+                score += weight
+                if reason:
+                    reasons.append(reason.format_map(ChainMap(features, self.params)) if templated else reason)
+        return min(score, MAX_SCORE), reasons
+
+    # Vectorized -----------------------
+
+    def masks(self, columns: Mapping[str, Any], n: int) -> List[Any]:
+        """One boolean array per rule over feature columns of length n (NaN / None = missing)."""
+        import numpy as np
+
+        series = {}
+        out = []
+        for rule in self.rules:
+            mask = np.ones(n, dtype=bool)
+            for c in rule.clauses:
+                if c.feature not in series:
+                    series[c.feature] = _series(columns[c.feature], n)
+                mask &= _clause_mask(series[c.feature], c)
+            out.append(mask)
+        return out
+
+    def evaluate(self, columns: Mapping[str, Any], n: int) -> Tuple[Any, List[List[str]]]:
+        """Score n trades at once: (scores array, reasons per trade), as score() would."""
+        import numpy as np
+
+        total = np.zeros(n, dtype=float)
+        reasons: List[List[str]] = [[] for _ in range(n)]
+        for rule, mask in zip(self.rules, self.masks(columns, n)):
+            total += rule.weight * mask
+            if not rule.reason:
+                continue
+            if "{" in rule.reason:
+                values = {k: np.asarray(columns[k]) for k in _fields(rule.reason, columns)}
+                for i in np.flatnonzero(mask):
+                    row = {k: _scalar(v[i]) for k, v in values.items()}
+                    reasons[i].append(rule.reason.format_map(ChainMap(row, self.params)))
+            else:
+                for i in np.flatnonzero(mask):
+                    reasons[i].append(rule.reason)
+        scores = np.minimum(total, MAX_SCORE)
+        if all(isinstance(r.weight, int) for r in self.rules):
+            scores = scores.astype(np.int64)
+        return scores, reasons
+
+
+def _series(values: Any, n: int):
+    import pandas as pd
+
+    s = pd.Series(values) if not isinstance(values, pd.Series) else values.reset_index(drop=True)
+    if len(s) != n:
+        raise ValueError(f"feature column has {len(s)} rows, expected {n}")
+    return s
+
+
+def _fields(template: str, columns: Mapping[str, Any]) -> List[str]:
+    """Feature columns a reason template reads."""
+    names = {name for _, name, _, _ in Formatter().parse(template) if name}
+    return [k for k in columns if k in names]
+
+
+def _scalar(v: Any) -> Any:
+    v = v.item() if hasattr(v, "item") else v
+    return None if isinstance(v, float) and v != v else v
+
+
+def _clause_mask(s, c: Clause):
+    import numpy as np
+    import pandas as pd
+
+    present = s.notna().to_numpy()
+    if c.op == "eq":
+        return present & s.eq(c.arg).to_numpy(dtype=bool)
+    if c.op == "in":
+        return present & s.isin(list(c.arg)).to_numpy(dtype=bool)
+    if c.op == "any":
+        text = s.where(s.notna(), "").astype(str).str.lower()
+        hit = np.zeros(len(s), dtype=bool)
+        for w in c.arg:
+            hit |= text.str.contains(w, regex=False).to_numpy(dtype=bool)
+        return present & hit
+    op = _COMPARE[c.op]
+    if isinstance(c.arg, (int, float)) and not isinstance(c.arg, bool):
+        values = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            return ~np.isnan(values) & op(values, c.arg)
+    return present & s.map(lambda v: v is not None and v == v and bool(op(v, c.arg))).to_numpy(dtype=bool)
+
+
+# -----------------------
+# Loading
+# -----------------------
+
+def _params(config: Mapping[str, Any]) -> Dict[str, Any]:
+    params = dict(config.get("patterns", {}) or {})
+    params["horizon_days"] = int((config.get("history", {}) or {}).get("horizon_days", 20))
+    return params
+
+
+def compile_rules(config: Mapping[str, Any] = CONFIG) -> Dict[str, RuleSet]:
+    """kind -> RuleSet from a config mapping's `rules` and `scoring` sections."""
+    spec = config.get("rules") or {}
+    weights = config.get("scoring") or {}
+    missing = [k for k in FEATURES if k not in spec]
+    if missing:
+        raise ValueError(f"config has no rules for {missing}")
+    params = _params(config)
+    return {kind: RuleSet(kind, parse_rules(kind, spec[kind], weights), params) for kind in FEATURES}
+
+
+_RULES: Optional[Dict[str, RuleSet]] = None
+
+
+def rule_set(kind: str) -> RuleSet:
+    """The compiled rules for `kind`, built from config.yaml on first use."""
+    global _RULES
+    if _RULES is None:
+        _RULES = compile_rules()
+    return _RULES[kind]
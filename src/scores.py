@@ -0,0 +1,105 @@
+"""
+Persisted trade scores.
+
+Every scored trade is stored in the scores table (one row per trade id,
+updated on rescore), so digests are an indexed top-N query over
+(filed_date, score) rather than whatever the current run happened to fetch.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+from records import GovTrade, InsiderTrade, Pick
+
+_PICK_COLUMNS = (
+    "kind, ticker, score, side, amount, actor, role, filed_date, link, reasons, trade_id, "
+    "amount_low, amount_high"
+)
+
+
+def government_pick(t: GovTrade, score: int, reasons: List[str]) -> Pick:
+    return Pick(
+        "government", t.ticker, score, t.side, t.amount, t.actor, t.chamber,
+        t.disclosed_date, t.link, reasons, t.tid, t.amount_low, t.amount_high,
+    )
+
+
+def insider_pick(t: InsiderTrade, score: int, reasons: List[str]) -> Pick:
+    return Pick(
+        "insider", t.ticker, score, t.side, t.value, t.actor, t.role,
+        t.filed_date, t.link, reasons, t.tid, t.value_low, t.value_high,
+    )
+
+
+def save_picks(conn, picks: Iterable[Pick]) -> int:
+    """Upsert scores for the given picks. Runs in the caller's transaction."""
+    now = datetime.now(timezone.utc).isoformat()
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT INTO scores (trade_id, kind, ticker, score, side, amount, actor, role, "
+        "filed_date, link, reasons, scored_at, amount_low, amount_high) "
+        "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?) "
+        "ON CONFLICT(trade_id) DO UPDATE SET score=excluded.score, reasons=excluded.reasons, "
+        "scored_at=excluded.scored_at",
+        (
+            (p.tid, p.kind, p.ticker, p.score, p.side,
+             None if p.amount is None else str(p.amount),
+             p.actor, p.role, p.filed, p.link, json.dumps(p.reasons or []), now,
+             p.amount_low, p.amount_high)
+            for p in picks
+        )
+    )
+    return conn.total_changes - before
+
+
+def _to_pick(r) -> Pick:
+    return Pick(
+        r["kind"], r["ticker"], r["score"], r["side"], r["amount"], r["actor"], r["role"],
+        r["filed_date"], r["link"] or "", json.loads(r["reasons"] or "[]"), r["trade_id"],
+        r["amount_low"], r["amount_high"],
+    )
+
+
+def top_picks(conn, since: str, min_score: int, limit: int) -> List[Pick]:
+    """Highest scores filed on/after `since` (YYYY-MM-DD), newest first among ties."""
+    rows = conn.execute(
+        f"SELECT {_PICK_COLUMNS} FROM scores "
+        "WHERE filed_date >= ? AND score >= ? "
+        "ORDER BY score DESC, filed_date DESC, trade_id LIMIT ?",
+        (since, min_score, limit)
+    ).fetchall()
+    return [_to_pick(r) for r in rows]
+
+
+def count_candidates(conn, since: str, min_score: int) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM scores WHERE filed_date >= ? AND score >= ?", (since, min_score)
+    ).fetchone()[0]
+
+
+# -----------------------
+# Backfill
+# -----------------------
+# Trades stored before the scores table existed (or whose run failed after
+# ingest) have no score yet; digests score them on demand.
+
+def unscored_government(conn, since: str) -> List[GovTrade]:
+    rows = conn.execute(
+        "SELECT t.id, t.ticker, t.person, t.chamber, t.side, t.amount, "
+        "t.transaction_date, t.disclosed_date, t.url, t.amount_low, t.amount_high FROM trades t "
+        "LEFT JOIN scores s ON s.trade_id = t.id "
+        "WHERE t.disclosed_date >= ? AND s.trade_id IS NULL",
+        (since,)
+    ).fetchall()
+    return [GovTrade(*(r[i] for i in range(8)), r["url"] or "", r["amount_low"], r["amount_high"]) for r in rows]
+
+
+def unscored_insider(conn, since: str) -> List[InsiderTrade]:
+    rows = conn.execute(
+        "SELECT t.id, t.ticker, t.insider, t.role, t.side, t.value, "
+        "t.transaction_date, t.filed_date, t.url, t.value_low, t.value_high FROM insider_trades t "
+        "LEFT JOIN scores s ON s.trade_id = t.id "
+        "WHERE t.filed_date >= ? AND s.trade_id IS NULL",
+        (since,)
+    ).fetchall()
+    return [InsiderTrade(*(r[i] for i in range(8)), r["url"] or "", r["value_low"], r["value_high"]) for r in rows]
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-import re
-from datetime import datetime, timezone
-from typing import Any, Tuple, List
+from typing import Any, Dict, Tuple, List, Sequence
 
+from amounts import low_bound
 from config import CONFIG
-from patterns import detect_cluster, detect_contract_timing
+from dates import days_since, parse_dt, utcnow
+from ingest import norm_side
+from patterns import cluster_features, contract_timing_hits, convergence_buyers
+from records import GovTrade, InsiderTrade, from_mapping
+from rules import rule_set
+from track_record import history_status
+
+# The rules themselves live in config.yaml (`rules`, compiled by rules.py).
+# This module turns trades into the features those rules read.
 
 
 # -----------------------
@@ -14,148 +21,106 @@ from patterns import detect_cluster, detect_contract_timing
 
 def _parse_money_to_int(value: Any) -> int:
     """
-    Convert Quiver-style amount/value strings into a numeric proxy.
-    Examples:
-      "50,001 - 100,000" -> 50001 (lower bound)
-      "1,000,000+"       -> 1000000
-      "250,000"          -> 250000
-      None / "" / "--"   -> 0
-      12345              -> 12345
+    Lower bound of a Quiver amount/value as an int, 0 when unknown.
+    Ingested records carry it pre-parsed (amount_low / value_low); this is
+    the fallback for records built from loose dicts or older rows.
     """
-    if value in (None, "", "--"):
-        return 0
-
-    if isinstance(value, (int, float)):
-        return int(value)
-
-    s = str(value).strip()
-    if not s:
-        return 0
-
-    s = s.replace(",", "")
-
-    # Handle ranges: take the lower bound
-    if "-" in s:
-        left = s.split("-", 1)[0].strip()
-        nums = re.findall(r"\d+", left)
-        return int(nums[0]) if nums else 0
-
-    # Handle plus values: "100000+"
-    if "+" in s:
-        nums = re.findall(r"\d+", s)
-        return int(nums[0]) if nums else 0
-
-    nums = re.findall(r"\d+", s)
-    return int(nums[0]) if nums else 0
+    return low_bound(value)
 
 
-def _parse_iso_dt(value: Any) -> datetime:
-    """
-    Parse ISO-ish date/datetime safely.
-    - Accepts date-only 'YYYY-MM-DD'
-    - Accepts full ISO datetime, with or without Z
-    - Returns timezone-aware UTC datetime
-    """
-    if value in (None, ""):
-        return datetime.now(timezone.utc)
+def _low(parsed: Any, raw: Any) -> int:
+    return parsed if parsed is not None else _parse_money_to_int(raw)
 
-    s = str(value).strip()
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
 
-    try:
-        dt = datetime.fromisoformat(s)
-    except ValueError:
-        # If it's date-only but not ISO compliant somehow, fallback:
-        try:
-            dt = datetime.strptime(s[:10], "%Y-%m-%d")
-        except Exception:
-            dt = datetime.now(timezone.utc)
+def _convergence_days() -> int:
+    return int(CONFIG.get("patterns", {}).get("convergence_days", 7))
 
-    # Make timezone-aware UTC
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
-
-    return dt
 
+# -----------------------
+# Features
+# -----------------------
 
-def _norm_side(side: Any) -> str:
+def government_features(trades: Sequence[GovTrade], conn=None) -> List[Dict[str, Any]]:
     """
-    Normalize side to BUY/SELL/UNKNOWN from various Quiver strings.
+    Rule features for a batch of GovTrade records. Cluster buyers/sellers
+    as of each disclosure day come from the cluster window. Contract-window
+    hits and insider convergence are computed once for the whole batch
+    instead of one query per trade.
     """
-    s = (str(side or "")).strip().lower()
-    if any(k in s for k in ["buy", "purchase", "acquire"]):
-        return "BUY"
-    if any(k in s for k in ["sell", "sale", "dispose"]):
-        return "SELL"
-    return "UNKNOWN"
+    disclosed = [parse_dt(t.disclosed_date) for t in trades]
+    tickers = [t.ticker for t in trades]
+
+    clusters = cluster_features([(t.ticker, t.disclosed_date) for t in trades], conn=conn)
+    contract_hits = contract_timing_hits(
+        [(tk, d) for tk, d in zip(tickers, disclosed)],
+        window=int(CONFIG.get("patterns", {}).get("contract_window_days", 14)),
+        conn=conn,
+    )
+    insider_buyers = convergence_buyers(
+        [(t.ticker, t.transaction_date or t.disclosed_date, "government") for t in trades],
+        days=_convergence_days(),
+        conn=conn,
+    )
+
+    now = utcnow()
+    features = []
+    for trade, disc, ticker, contract_hit, insiders, (buyers, sellers) in zip(
+        trades, disclosed, tickers, contract_hits, insider_buyers, clusters
+    ):
+        history, avg = history_status("government", trade.actor, conn=conn)
+        features.append({
+            "side": norm_side(trade.side),
+            "amount": _low(trade.amount_low, trade.amount),
+            "role": trade.chamber,
+            "age": days_since(disc, now),
+            "cluster": buyers,
+            "cluster_sellers": sellers,
+            "contract": bool(ticker and contract_hit),
+            "convergence": insiders,
+            "history": history,
+            "history_avg": avg,
+        })
+    return features
+
+
+def insider_features(trade: InsiderTrade, conn=None) -> Dict[str, Any]:
+    side = norm_side(trade.side)
+    convergence = 0
+    if side == "BUY":
+        convergence = convergence_buyers(
+            [(trade.ticker, trade.transaction_date or trade.filed_date, "insider")],
+            days=_convergence_days(),
+            conn=conn,
+        )[0]
+    history, avg = history_status("insider", trade.actor, conn=conn)
+    return {
+        "side": side,
+        "amount": _low(trade.value_low, trade.value),
+        "role": trade.role,
+        "age": days_since(parse_dt(trade.transaction_date)),
+        "convergence": convergence,
+        "history": history,
+        "history_avg": avg,
+    }
 
 
 # -----------------------
 # Scoring
 # -----------------------
 
-def score_government_trade(trade) -> Tuple[int, List[str]]:
-    score = 0
-    reasons: List[str] = []
-
-    side = _norm_side(trade.get("side"))
-    amount = _parse_money_to_int(trade.get("amount"))
-
-    if side == "BUY":
-        score += CONFIG["scoring"]["buy_base"]
-        reasons.append("Government buy")
-    else:
-        score += CONFIG["scoring"]["sell_penalty"]
-
-    if amount > 50000:
-        score += CONFIG["scoring"]["large_trade_bonus"]
-        reasons.append("Large disclosed amount")
-
-    disclosed = _parse_iso_dt(trade.get("disclosed_date"))
-    if (datetime.now(timezone.utc) - disclosed).days <= 5:
-        score += CONFIG["scoring"]["recency_bonus"]
-        reasons.append("Recent disclosure")
-
-    ticker = trade.get("ticker")
-    if ticker and detect_cluster(ticker):
-        score += CONFIG["scoring"]["cluster_bonus"]
-        reasons.append("Cluster buying")
-
-    if ticker and detect_contract_timing(ticker, disclosed):
-        score += CONFIG["scoring"]["contract_bonus"]
-        reasons.append("Contract timing")
+def score_government_trades(trades: Sequence[GovTrade], conn=None) -> List[Tuple[int, List[str]]]:
+    """Score a whole batch of GovTrade records against rules.government."""
+    rules = rule_set("government")
+    return [rules.score(f) for f in government_features(trades, conn)]
 
-    return min(score, 100), reasons
 
+def score_government_trade(trade) -> Tuple[int, List[str]]:
+    if not isinstance(trade, GovTrade):
+        trade = from_mapping(GovTrade, trade)
+    return score_government_trades([trade])[0]
 
-def score_insider_trade(trade) -> Tuple[int, List[str]]:
-    score = 0
-    reasons: List[str] = []
-
-    side = _norm_side(trade.get("side"))
-    value = _parse_money_to_int(trade.get("value"))
-    role = (trade.get("role") or "").lower()
-
-    if side == "BUY":
-        score += CONFIG["scoring"]["insider_buy_bonus"]
-        reasons.append("Insider buy")
-    else:
-        score += CONFIG["scoring"]["sell_penalty"]
-
-    if role and any(r in role for r in ["ceo", "cfo", "cto", "president"]):
-        score += CONFIG["scoring"]["exec_role_bonus"]
-        reasons.append("Executive role")
-
-    if value > 100000:
-        score += CONFIG["scoring"]["large_trade_bonus"]
-        reasons.append("Large insider purchase")
-
-    tx_date = _parse_iso_dt(trade.get("transaction_date"))
-    if (datetime.now(timezone.utc) - tx_date).days <= 5:
-        score += CONFIG["scoring"]["recency_bonus"]
-        reasons.append("Recent transaction")
 
-    return min(score, 100), reasons
+def score_insider_trade(trade, conn=None) -> Tuple[int, List[str]]:
+    if not isinstance(trade, InsiderTrade):
+        trade = from_mapping(InsiderTrade, trade)
+    return rule_set("insider").score(insider_features(trade, conn))
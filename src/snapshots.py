@@ -0,0 +1,238 @@
+"""
+Content-addressed, gzip-compressed snapshots of raw Quiver responses.
+
+    snapshots/objects/ab/ab12....json.gz   raw body, named by sha256 of its bytes
+    snapshots/refs/<dataset>.json           latest snapshot per dataset (TTL reuse)
+    snapshots/runs/<UTC timestamp>.json     what each run fetched (replay input)
+
+Identical payloads are stored once. A run manifest lists, per dataset, the
+object it read or that the API answered 304; `python src/main.py --replay
+<manifest>` feeds those objects back through the pipeline offline.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from config import BASE_DIR, CONFIG
+
+# None follows snapshots.enabled; set True/False to override it (benchmarks do).
+ENABLED: Optional[bool] = None
+
+CHUNK_BYTES = 1 << 16
+
+# Manifests are written every run; the store is pruned at most this often.
+PRUNE_EVERY_S = 86400
+
+
+def _cfg() -> Dict[str, Any]:
+    return CONFIG.get("snapshots", {}) or {}
+
+
+def enabled() -> bool:
+    return bool(_cfg().get("enabled", True)) if ENABLED is None else ENABLED
+
+
+def snapshot_dir() -> Path:
+    path = Path(_cfg().get("dir") or "snapshots")
+    return path if path.is_absolute() else Path(BASE_DIR) / path
+
+
+def _object_path(sha: str) -> Path:
+    return snapshot_dir() / "objects" / sha[:2] / f"{sha}.json.gz"
+
+
+def _write_json(path: Path, data: Dict[str, Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, indent=1))
+    os.replace(tmp, path)
+
+
+# -----------------------
+# Writing
+# -----------------------
+
+class SnapshotWriter:
+    """
+    Incrementally gzip a response body into a temp file while hashing it;
+    commit() moves it to its content address (a no-op if already stored).
+    """
+
+    def __init__(self):
+        tmp_dir = snapshot_dir() / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".json.gz")
+        self._raw = os.fdopen(fd, "wb")
+        # mtime=0 keeps the compressed bytes deterministic for equal bodies.
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0)
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._sha.update(chunk)
+        self._gz.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        self._gz.close()
+        self._raw.close()
+        sha = self._sha.hexdigest()
+        dest = _object_path(sha)
+        if dest.exists():
+            os.unlink(self.tmp_path)
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.tmp_path, dest)
+        return sha
+
+    def abort(self):
+        self._gz.close()
+        self._raw.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+def store_bytes(body: bytes) -> str:
+    w = SnapshotWriter()
+    w.write(body)
+    return w.commit()
+
+
+def set_ref(dataset: str, sha: str, **meta):
+    _write_json(snapshot_dir() / "refs" / f"{dataset}.json", {
+        "dataset": dataset,
+        "sha": sha,
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        **meta,
+    })
+
+
+def fresh_ref(dataset: str, ttl_minutes: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    The dataset's latest snapshot if it was fetched within the TTL and still
+    exists. Runs within snapshots.ttl_minutes of the last fetch reuse its
+    snapshot instead of calling the API (0 disables); keep it below the
+    daemon's poll interval.
+    """
+    if ttl_minutes is None:
+        ttl_minutes = float(_cfg().get("ttl_minutes", 10))
+    if not enabled() or ttl_minutes <= 0:
+        return None
+    path = snapshot_dir() / "refs" / f"{dataset}.json"
+    try:
+        ref = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    fetched = datetime.fromisoformat(ref["fetched_at"])
+    if datetime.now(timezone.utc) - fetched > timedelta(minutes=ttl_minutes):
+        return None
+    return ref if _object_path(ref["sha"]).exists() else None
+
+
+def write_manifest(datasets: Dict[str, Dict[str, Any]]) -> Path:
+    """Record what one run read, then prune snapshots past snapshots.keep_days if due."""
+    now = datetime.now(timezone.utc)
+    path = snapshot_dir() / "runs" / f"{now:%Y%m%dT%H%M%S%fZ}.json"
+    _write_json(path, {"created_at": now.isoformat(), "datasets": datasets})
+    prune_if_due()
+    return path
+
+
+# -----------------------
+# Reading
+# -----------------------
+
+class SnapshotBody:
+    """
+    A stored body with the slice of the requests.Response interface the
+    streaming decoder uses (iter_content / encoding / url).
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, sha: str):
+        self.sha = sha
+        self.url = f"snapshot:{sha}"
+
+    def iter_content(self, chunk_size: int = CHUNK_BYTES) -> Iterator[bytes]:
+        with gzip.open(_object_path(self.sha), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+def load_json(sha: str) -> Any:
+    with gzip.open(_object_path(sha), "rb") as f:
+        return json.loads(f.read())
+
+
+def load_manifest(ref: str) -> Dict[str, Any]:
+    """Load a run manifest by path, file name or timestamp stem."""
+    path = Path(ref)
+    if not path.exists():
+        stem = path.name[:-5] if path.name.endswith(".json") else path.name
+        path = snapshot_dir() / "runs" / f"{stem}.json"
+    return json.loads(path.read_text())
+
+
+def latest_manifest() -> Optional[Path]:
+    runs = sorted((snapshot_dir() / "runs").glob("*.json"))
+    return runs[-1] if runs else None
+
+
+def load_payloads(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """dataset -> decoded payload for every snapshot in a manifest (304s become [])."""
+    return {
+        name: load_json(entry["sha"]) if entry.get("sha") else []
+        for name, entry in manifest["datasets"].items()
+    }
+
+
+# -----------------------
+# Retention
+# -----------------------
+
+def prune_if_due():
+    """prune() unless the store was pruned within PRUNE_EVERY_S (by any process)."""
+    marker = snapshot_dir() / "pruned"
+    try:
+        if time.time() - marker.stat().st_mtime < PRUNE_EVERY_S:
+            return
+    except FileNotFoundError:
+        pass
+    prune()
+    marker.touch()
+
+
+def prune(keep_days: Optional[float] = None):
+    """Drop run manifests older than keep_days and objects nothing refers to."""
+    if keep_days is None:
+        keep_days = float(_cfg().get("keep_days", 14))
+    if keep_days <= 0:
+        return
+    cutoff = time.time() - keep_days * 86400
+    keep = set()
+    for path in (snapshot_dir() / "runs").glob("*.json"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink()
+            continue
+        try:
+            keep.update(e.get("sha") for e in json.loads(path.read_text())["datasets"].values())
+        except (OSError, ValueError, KeyError):
+            continue
+    for path in (snapshot_dir() / "refs").glob("*.json"):
+        try:
+            keep.add(json.loads(path.read_text()).get("sha"))
+        except (OSError, ValueError):
+            continue
+    for path in (snapshot_dir() / "objects").glob("*/*.json.gz"):
+        if path.name[:-len(".json.gz")] not in keep and path.stat().st_mtime < cutoff:
+            path.unlink()
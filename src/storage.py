@@ -3,16 +3,33 @@ from pathlib import Path
 
 DB_PATH = Path("data.db")
 
+# Per-connection pragmas. journal_mode=WAL is persistent and set once in init_db.
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",      # safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size=-20000",       # ~20 MB page cache
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
 def get_conn():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
 
-    cur.executescript("""
+# -----------------------
+# Migrations
+# -----------------------
+# Each entry is (version, sql). Versions are applied in order and the
+# current version is kept in PRAGMA user_version, so existing data.db
+# files are upgraded in place. Never edit a shipped migration; append.
+
+MIGRATIONS = [
+    (1, """
     CREATE TABLE IF NOT EXISTS trades (
         id TEXT PRIMARY KEY,
         source TEXT,
@@ -57,6 +74,235 @@ def init_db():
         alert_hash TEXT PRIMARY KEY,
         sent_at TEXT
     );
-    """)
-    conn.commit()
+    """),
+    (2, """
+    -- patterns.cluster_counts: WHERE ticker IN (...) AND disclosed_date>=?
+    CREATE INDEX IF NOT EXISTS idx_trades_ticker_disclosed
+        ON trades (ticker, disclosed_date);
+
+    -- patterns.load_award_dates: covering, no table lookups needed
+    CREATE INDEX IF NOT EXISTS idx_contracts_ticker_award
+        ON contracts (ticker, award_date);
+
+    CREATE INDEX IF NOT EXISTS idx_insider_ticker_txdate
+        ON insider_trades (ticker, transaction_date);
+    """),
+    (3, """
+    -- quiver_client conditional requests + per-dataset high-water marks
+    CREATE TABLE IF NOT EXISTS fetch_state (
+        dataset TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        high_water TEXT,
+        updated_at TEXT
+    );
+    """),
+    (4, """
+    -- track_record: per-trade forward return, computed once
+    CREATE TABLE IF NOT EXISTS trade_returns (
+        trade_id TEXT PRIMARY KEY,
+        kind TEXT,
+        actor TEXT,
+        horizon INTEGER,
+        ret REAL,
+        computed_at TEXT
+    );
+
+    -- track_record: running per-actor aggregates for O(1) scoring lookups
+    CREATE TABLE IF NOT EXISTS actor_stats (
+        kind TEXT,
+        actor TEXT,
+        trade_count INTEGER,
+        ret_sum REAL,
+        ret_count INTEGER,
+        updated_at TEXT,
+        PRIMARY KEY (kind, actor)
+    );
+    """),
+    (5, """
+    -- telegram: persistent outbox; alert_hash is NULL for digests
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        alert_hash TEXT UNIQUE,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TEXT,
+        sent_at TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, id);
+    """),
+    (6, """
+    -- dates are parsed once at ingest and stored as YYYY-MM-DD
+    ALTER TABLE insider_trades ADD COLUMN filed_date TEXT;
+
+    UPDATE trades SET transaction_date = substr(transaction_date, 1, 10)
+        WHERE transaction_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*';
+    UPDATE trades SET disclosed_date = substr(disclosed_date, 1, 10)
+        WHERE disclosed_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*';
+    UPDATE insider_trades SET transaction_date = substr(transaction_date, 1, 10)
+        WHERE transaction_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*';
+    UPDATE insider_trades SET filed_date = transaction_date WHERE filed_date IS NULL;
+    UPDATE contracts SET award_date = substr(award_date, 1, 10)
+        WHERE award_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*';
+
+    CREATE INDEX IF NOT EXISTS idx_insider_ticker_filed
+        ON insider_trades (ticker, filed_date);
+    """),
+    (7, """
+    -- metrics: one JSON record per monitor run
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT,
+        finished_at TEXT,
+        duration_s REAL,
+        status TEXT,
+        record TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started_at);
+    """),
+    (8, """
+    -- scores: every scored trade, so digests are a query instead of a refetch
+    CREATE TABLE IF NOT EXISTS scores (
+        trade_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        ticker TEXT,
+        score INTEGER NOT NULL,
+        side TEXT,
+        amount TEXT,
+        actor TEXT,
+        role TEXT,
+        filed_date TEXT,
+        link TEXT,
+        reasons TEXT,
+        scored_at TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_scores_filed_score ON scores (filed_date, score);
+
+    -- scores.unscored_*: recent trades without a scores row
+    CREATE INDEX IF NOT EXISTS idx_trades_disclosed ON trades (disclosed_date);
+    CREATE INDEX IF NOT EXISTS idx_insider_filed ON insider_trades (filed_date);
+    """),
+    (9, """
+    -- retention: Bloom filter slices holding the hashes pruned from alerts_sent
+    CREATE TABLE IF NOT EXISTS alert_bloom (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        capacity INTEGER NOT NULL,
+        m INTEGER NOT NULL,
+        k INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        bits BLOB NOT NULL
+    );
+
+    -- retention: trades per actor moved to the archive (track_record trade counts)
+    CREATE TABLE IF NOT EXISTS archived_counts (
+        kind TEXT,
+        actor TEXT,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (kind, actor)
+    );
+
+    CREATE TABLE IF NOT EXISTS retention_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_alerts_sent_at ON alerts_sent (sent_at);
+    CREATE INDEX IF NOT EXISTS idx_contracts_award ON contracts (award_date);
+    """),
+    (10, """
+    -- amounts.parse_range bounds, parsed at ingest (amounts.backfill fills older rows)
+    ALTER TABLE trades ADD COLUMN amount_low INTEGER;
+    ALTER TABLE trades ADD COLUMN amount_high INTEGER;
+    ALTER TABLE insider_trades ADD COLUMN value_low INTEGER;
+    ALTER TABLE insider_trades ADD COLUMN value_high INTEGER;
+    ALTER TABLE scores ADD COLUMN amount_low INTEGER;
+    ALTER TABLE scores ADD COLUMN amount_high INTEGER;
+
+    -- size filters, e.g. WHERE amount_low >= 250000 AND disclosed_date >= ?
+    CREATE INDEX IF NOT EXISTS idx_trades_amount_low ON trades (amount_low, disclosed_date);
+    CREATE INDEX IF NOT EXISTS idx_insider_value_low ON insider_trades (value_low, filed_date);
+    """),
+    (11, """
+    -- patterns.ClusterWindow: every disclosure day per (ticker, side, actor)
+    -- from cluster_state 'since' on, restored on start instead of rescanning
+    -- trades. patterns.observe_trades seeds it from trades while 'since' is unset.
+    CREATE TABLE IF NOT EXISTS cluster_actors (
+        ticker TEXT NOT NULL,
+        side TEXT NOT NULL,
+        actor TEXT NOT NULL,
+        day TEXT NOT NULL,
+        PRIMARY KEY (ticker, side, actor, day)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_cluster_actors_day ON cluster_actors (day);
+
+    CREATE TABLE IF NOT EXISTS cluster_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """),
+    (12, """
+    -- backfill.load_history: raw rows of a snapshot already written, so an
+    -- interrupted history import resumes where its last commit left off
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+        dataset TEXT NOT NULL,
+        sha TEXT NOT NULL,
+        rows_done INTEGER NOT NULL DEFAULT 0,
+        rows_new INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT,
+        finished_at TEXT,
+        PRIMARY KEY (dataset, sha)
+    );
+    """),
+    (13, """
+    -- pricing.sync_prices: the span of days already requested per ticker,
+    -- whether or not the source had closes, so empty fetches are not retried
+    CREATE TABLE IF NOT EXISTS price_fetches (
+        ticker TEXT PRIMARY KEY,
+        lo TEXT NOT NULL,
+        hi TEXT NOT NULL
+    );
+    """),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """
+    Apply any pending migrations, each in its own transaction.
+    Returns the resulting schema version.
+    """
+    current = schema_version(conn)
+    for version, sql in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # PRAGMA does not accept bound parameters; version is an int we own.
+            conn.executescript(
+                f"BEGIN;\n{sql}\nPRAGMA user_version={int(version)};\nCOMMIT;"
+            )
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        print(f"[storage] migrated schema to v{version}")
+        current = version
+    return current
+
+
+def init_db():
+    conn = get_conn()
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrate(conn)
+    conn.execute("PRAGMA optimize")
     conn.close()
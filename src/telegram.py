@@ -1,9 +1,220 @@
-import requests
-from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
-
-def send_message(text):
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    requests.post(url, json={
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text
-    })
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import CONFIG, TELEGRAM_API_BASE, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
+from ingest import mark_alerted_many
+from metrics import incr
+
+TIMEOUT = (5, 20)
+MAX_MESSAGE_CHARS = 4096
+MAX_ATTEMPTS = 3
+
+ALERT_SEPARATOR = "\n\n— — —\n\n"
+
+
+def _cfg() -> Dict[str, Any]:
+    return CONFIG.get("telegram", {}) or {}
+
+
+def _max_retry_after_s() -> int:
+    """Longest retry_after we sleep through inline; beyond that the outbox keeps the message."""
+    return int(_cfg().get("max_retry_after_s", 60))
+
+
+def _coalesce_after() -> int:
+    """Coalesce pending alerts into one message once at least this many are queued."""
+    return int(_cfg().get("coalesce_after", 3))
+
+
+def _max_delivery_attempts() -> int:
+    """Failed deliveries per outbox row before it is marked 'failed' (dead-lettered)."""
+    return int(_cfg().get("max_delivery_attempts", 5))
+
+
+class TelegramError(RuntimeError):
+    def __init__(self, message: str, retry_after: Optional[int] = None, status: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status      # HTTP status, None when the request itself failed
+
+    @property
+    def rejected(self) -> bool:
+        """Telegram refused this message (4xx other than 429); others may still go through."""
+        return self.status is not None and 400 <= self.status < 500 and self.status != 429
+
+
+# requests is imported on first send, so stages that only queue into the
+# outbox (e.g. `main.py score`) don't pay for it.
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+    return _session
+
+
+def _post(text: str) -> Dict[str, Any]:
+    import requests
+
+    url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_TOKEN}/sendMessage"
+    try:
+        r = _get_session().post(url, json={
+            "chat_id": TELEGRAM_CHAT_ID,
+            "text": text[:MAX_MESSAGE_CHARS],
+        }, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        raise TelegramError(f"Telegram request failed: {e}") from e
+
+    try:
+        body = r.json()
+    except ValueError:
+        body = {}
+    if r.status_code == 200 and body.get("ok"):
+        return body
+
+    retry_after = (body.get("parameters") or {}).get("retry_after")
+    if retry_after is None and r.status_code == 429:
+        retry_after = int(r.headers.get("Retry-After") or 1)
+    raise TelegramError(
+        f"Telegram error {r.status_code}: {body.get('description') or (r.text or '')[:300]}",
+        retry_after=retry_after,
+        status=r.status_code,
+    )
+
+
+def send_message(text) -> Dict[str, Any]:
+    """
+    Send one message, sleeping through short 429 retry_after windows.
+    Raises TelegramError if it still fails.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return _post(text)
+        except TelegramError as e:
+            wait = e.retry_after
+            if wait is None or wait > _max_retry_after_s() or attempt == MAX_ATTEMPTS:
+                raise
+            print(f"[telegram] throttled, retrying in {wait}s")
+            incr("telegram_retries")
+            time.sleep(wait)
+
+
+# -----------------------
+# Persistent outbox
+# -----------------------
+# Alerts and digests are queued in the outbox table inside the run's
+# transaction and delivered by flush(). An alert is only recorded in
+# alerts_sent once Telegram has accepted it; failures stay pending until
+# they reach telegram.max_delivery_attempts, then are marked 'failed' and skipped.
+
+def enqueue(conn, text: str, alert_hash: Optional[str] = None):
+    conn.execute(
+        "INSERT INTO outbox (alert_hash, text, created_at) VALUES (?,?,?) "
+        "ON CONFLICT(alert_hash) DO NOTHING",
+        (alert_hash, text, datetime.now(timezone.utc).isoformat())
+    )
+
+
+def _pack(rows) -> List[List[Any]]:
+    """
+    Group pending rows into messages. During a burst of alerts, several are
+    coalesced into one message up to Telegram's size limit; digests (no
+    alert_hash) always go out on their own.
+    """
+    alerts = [r for r in rows if r["alert_hash"]]
+    coalesce = len(alerts) >= _coalesce_after()
+
+    groups: List[List[Any]] = []
+    current: List[Any] = []
+    size = 0
+    for r in rows:
+        if not (coalesce and r["alert_hash"]):
+            if current:
+                groups.append(current)
+                current, size = [], 0
+            groups.append([r])
+            continue
+        added = len(r["text"]) + len(ALERT_SEPARATOR)
+        if current and size + added > MAX_MESSAGE_CHARS - 64:
+            groups.append(current)
+            current, size = [], 0
+        current.append(r)
+        size += added
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _render(group) -> str:
+    if len(group) == 1:
+        return group[0]["text"]
+    return f"🚨 {len(group)} alerts\n\n" + ALERT_SEPARATOR.join(r["text"] for r in group)
+
+
+def _record_failure(conn, ids: List[int], error: TelegramError) -> int:
+    """Count a failed attempt on each row; returns how many were dead-lettered. The caller commits."""
+    marks = ",".join("?" * len(ids))
+    limit = _max_delivery_attempts()
+    conn.execute(
+        f"UPDATE outbox SET attempts=attempts+1, last_error=? WHERE id IN ({marks})",
+        (str(error)[:500], *ids)
+    )
+    failed = conn.execute(
+        f"UPDATE outbox SET status='failed' WHERE id IN ({marks}) AND attempts >= ?",
+        (*ids, limit)
+    ).rowcount
+    if failed:
+        print(f"[telegram] gave up on {failed} message(s) after {limit} attempts: {error}")
+        incr("outbox_failed", failed)
+    return failed
+
+
+def flush(conn) -> int:
+    """
+    Deliver pending outbox messages in order. Each delivered group is
+    committed immediately so a later failure never re-sends it. Failed
+    attempts are committed with the next delivery or once at the end. A
+    message Telegram rejects is skipped and the rest still go out.
+    Throttling or a failed request stops the flush until the next run.
+    Returns the number of outbox rows delivered.
+    """
+    rows = conn.execute(
+        "SELECT id, alert_hash, text FROM outbox WHERE status='pending' ORDER BY id"
+    ).fetchall()
+
+    delivered = 0
+    for group in _pack(rows):
+        ids = [r["id"] for r in group]
+        try:
+            send_message(_render(group))
+        except TelegramError as e:
+            if e.retry_after is not None:
+                # Throttled: not this message's fault, so no attempt is counted.
+                print(f"[telegram] throttled, {len(rows) - delivered} message(s) left in outbox: {e}")
+                break
+            _record_failure(conn, ids, e)
+            if e.rejected:
+                continue
+            print(f"[telegram] delivery failed, {len(rows) - delivered} message(s) left in outbox: {e}")
+            break
+
+        marks = ",".join("?" * len(ids))
+        conn.execute(
+            f"UPDATE outbox SET status='sent', sent_at=? WHERE id IN ({marks})",
+            (datetime.now(timezone.utc).isoformat(), *ids)
+        )
+        mark_alerted_many(conn, [r["alert_hash"] for r in group if r["alert_hash"]])
+        conn.commit()
+        delivered += len(group)
+        incr("messages_sent")
+    conn.commit()
+    incr("outbox_delivered", delivered)
+    return delivered
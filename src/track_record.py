@@ -0,0 +1,205 @@
+"""
+Per-actor (representative / insider) track record.
+
+Forward returns are computed once per trade, when its horizon has elapsed
+and prices exist, and stored in trade_returns from the actor's side of the
+trade: a sale ahead of a decline counts as a gain (actor_returns). Trades
+whose horizon has elapsed without a return (unknown ticker, no date, a
+side other than buy or sell) are stored with a NULL return so later
+refreshes skip them. actor_stats keeps running
+sums per actor so a refresh only touches trades that were not yet counted,
+and scoring reads the whole table into a dict for O(1) lookups.
+"""
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from config import CONFIG
+from storage import get_conn
+
+_stats: Optional[Dict[Tuple[str, str], Tuple[int, int, Optional[float]]]] = None
+
+
+_DIRECTION = {"BUY": 1.0, "SELL": -1.0}
+
+
+class Settings(NamedTuple):
+    horizon: int
+    min_trades: int
+    good_return: float
+    poor_return: float
+
+
+def settings() -> Settings:
+    """config.yaml `history`, read when used rather than at import."""
+    cfg = CONFIG.get("history", {}) or {}
+    return Settings(
+        int(cfg.get("horizon_days", 20)),
+        int(cfg.get("min_trades", 5)),
+        float(cfg.get("good_return", 0.02)),
+        float(cfg.get("poor_return", 0.0)),
+    )
+
+
+def refresh_actor_stats(conn=None) -> int:
+    """
+    Compute forward returns for trades that don't have one yet and fold them
+    into actor_stats. Trade counts are re-aggregated from the trade tables.
+    Run it after pricing.sync_prices: a matured trade without a return is
+    marked NULL for good. Returns the number of newly scored trades.
+    """
+    import pandas as pd
+    from pricing import forward_returns, load_closes
+
+    conn = conn or get_conn()
+    horizon = settings().horizon
+    pending = pd.read_sql_query(
+        "SELECT t.id, 'government' AS kind, t.person AS actor, t.ticker, t.side, t.disclosed_date AS date "
+        "FROM trades t LEFT JOIN trade_returns r ON r.trade_id = t.id WHERE r.trade_id IS NULL "
+        "UNION ALL "
+        "SELECT i.id, 'insider' AS kind, i.insider AS actor, i.ticker, i.side, "
+        "COALESCE(i.filed_date, i.transaction_date) AS date "
+        "FROM insider_trades i LEFT JOIN trade_returns r ON r.trade_id = i.id WHERE r.trade_id IS NULL",
+        conn,
+    )
+
+    col = f"ret_{horizon}"
+    fresh = unpriceable = pending.iloc[0:0]
+    if not pending.empty:
+        start = str(pending["date"].min())[:10]
+        closes = load_closes(conn, pending["ticker"].unique(), start=start)
+        rets = forward_returns(pending, closes, horizons=(horizon,))
+        rets[col] = actor_returns(rets["side"], rets[col])
+        scored = rets[col].notna()
+        fresh = rets[scored]
+        unpriceable = rets[~scored & _matured(conn, rets["date"], start, horizon)]
+
+    now = datetime.now(timezone.utc).isoformat()
+    if not unpriceable.empty:
+        conn.executemany(
+            "INSERT INTO trade_returns (trade_id, kind, actor, horizon, ret, computed_at) "
+            "VALUES (?,?,?,?,NULL,?) ON CONFLICT(trade_id) DO NOTHING",
+            ((r.id, r.kind, r.actor, horizon, now) for r in unpriceable.itertuples(index=False))
+        )
+    if not fresh.empty:
+        conn.executemany(
+            "INSERT INTO trade_returns (trade_id, kind, actor, horizon, ret, computed_at) "
+            "VALUES (?,?,?,?,?,?) ON CONFLICT(trade_id) DO NOTHING",
+            (
+                (r.id, r.kind, r.actor, horizon, float(getattr(r, col)), now)
+                for r in fresh.itertuples(index=False)
+            )
+        )
+        sums = fresh.groupby(["kind", "actor"])[col].agg(ret_sum="sum", ret_count="count").reset_index()
+        conn.executemany(
+            "INSERT INTO actor_stats (kind, actor, trade_count, ret_sum, ret_count, updated_at) "
+            "VALUES (?,?,0,?,?,?) ON CONFLICT(kind, actor) DO UPDATE SET "
+            "ret_sum = ret_sum + excluded.ret_sum, ret_count = ret_count + excluded.ret_count, "
+            "updated_at = excluded.updated_at",
+            (
+                (r.kind, r.actor, float(r.ret_sum), int(r.ret_count), now)
+                for r in sums.itertuples(index=False)
+            )
+        )
+
+    # Trades moved out by retention are counted in archived_counts.
+    conn.execute(
+        "INSERT INTO actor_stats (kind, actor, trade_count, ret_sum, ret_count, updated_at) "
+        "SELECT kind, actor, SUM(n), 0, 0, ? FROM ("
+        "SELECT 'government' AS kind, person AS actor, COUNT(*) AS n FROM trades WHERE person IS NOT NULL GROUP BY person "
+        "UNION ALL "
+        "SELECT 'insider', insider, COUNT(*) FROM insider_trades WHERE insider IS NOT NULL GROUP BY insider "
+        "UNION ALL "
+        "SELECT kind, actor, n FROM archived_counts"
+        ") WHERE true GROUP BY kind, actor "
+        "ON CONFLICT(kind, actor) DO UPDATE SET trade_count = excluded.trade_count",
+        (now,)
+    )
+    conn.commit()
+    invalidate()
+    print(f"[track_record] scored {len(fresh)} trades at {horizon}d horizon ({len(unpriceable)} without a return)")
+    return len(fresh)
+
+
+def actor_returns(sides, rets):
+    """
+    Forward returns as the actor's outcome: kept for buys, negated for
+    sells, NaN for other sides (exchanges), which are not scored.
+    """
+    import numpy as np
+    from ingest import norm_side
+
+    direction = np.array([_DIRECTION.get(norm_side(s), np.nan) for s in sides], dtype=float)
+    return np.asarray(rets, dtype=float) * direction
+
+
+def _matured(conn, dates, start: str, horizon: int):
+    """
+    True where `horizon` trading days have passed since the date, by the
+    calendar of every cached close (or the date is missing).
+    """
+    import numpy as np
+    import pandas as pd
+
+    calendar = pd.to_datetime(pd.Series(
+        [r[0] for r in conn.execute("SELECT DISTINCT date FROM prices WHERE date >= ? ORDER BY date", (start,))],
+        dtype=object,
+    )).to_numpy(dtype="datetime64[ns]")
+    ev = pd.to_datetime(dates, errors="coerce").to_numpy(dtype="datetime64[ns]")
+    pos = np.searchsorted(calendar, ev, side="left")
+    return np.isnat(ev) | (pos + horizon < len(calendar))
+
+
+# -----------------------
+# Lookups
+# -----------------------
+
+def invalidate():
+    global _stats
+    _stats = None
+
+
+def actor_stats(conn=None) -> Dict[Tuple[str, str], Tuple[int, int, Optional[float]]]:
+    """(kind, actor) -> (trade_count, scored_count, avg forward return or None), loaded once."""
+    global _stats
+    if _stats is None:
+        conn = conn or get_conn()
+        _stats = {
+            (r["kind"], r["actor"]): (
+                r["trade_count"],
+                r["ret_count"],
+                r["ret_sum"] / r["ret_count"] if r["ret_count"] else None,
+            )
+            for r in conn.execute(
+                "SELECT kind, actor, trade_count, ret_sum, ret_count FROM actor_stats"
+            )
+        }
+    return _stats
+
+
+def history_status(kind: str, actor: Optional[str], conn=None) -> Tuple[Optional[str], Optional[float]]:
+    """
+    ("good" | "poor" | None, average forward return) from the actor's record,
+    read by the `history` / `history_avg` scoring rules. "good" is a proven
+    average at/above history.good_return, "poor" one below poor_return.
+    Actors with fewer than history.min_trades scored trades are neutral.
+    """
+    if not actor:
+        return None, None
+    _, scored, avg = actor_stats(conn).get((kind, actor), (0, 0, None))
+    cfg = settings()
+    if avg is None or scored < cfg.min_trades:
+        return None, None
+    if avg >= cfg.good_return:
+        return "good", avg
+    if avg < cfg.poor_return:
+        return "poor", avg
+    return None, avg
+
+
+if __name__ == "__main__":
+    from pricing import sync_prices
+    from storage import init_db
+
+    init_db()
+    sync_prices()
+    refresh_actor_stats()
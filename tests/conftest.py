@@ -0,0 +1,23 @@
+"""
+Shared fixtures. src/ and benchmarks/ (for the Quiver / Telegram stubs and
+synthetic payloads) are put on sys.path; every test gets its own data.db.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "benchmarks")]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A migrated database in tmp_path, used by every get_conn() in the test."""
+    import storage
+
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "data.db")
+    storage.init_db()
+    conn = storage.get_conn()
+    yield conn
+    conn.close()
@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from amounts import parse_range, parse_ranges
+from main import _format_amount
+from records import Pick
+
+CASES = [
+    ("$50,001 - $100,000", (50001, 100000)),
+    ("$1,000,001 +", (1000001, None)),
+    ("1,000,000+", (1000000, None)),
+    ("250,000", (250000, 250000)),
+    (12345, (12345, 12345)),
+    (1500.75, (1500, 1500)),
+    (None, (None, None)),
+    ("", (None, None)),
+    ("--", (None, None)),
+    ("-5000", (None, None)),
+    ("$-5,000", (None, None)),
+    ("unknown", (None, None)),
+    (float("nan"), (None, None)),
+]
+
+
+@pytest.mark.parametrize("value, bounds", CASES)
+def test_parse_range(value, bounds):
+    assert parse_range(value) == bounds
+
+
+def test_vectorized_parse_matches_parse_range():
+    low, high = parse_ranges(v for v, _ in CASES)
+    for (value, (lo, hi)), vlo, vhi in zip(CASES, low, high):
+        assert (None if math.isnan(vlo) else int(vlo), None if math.isnan(vhi) else int(vhi)) == (lo, hi), value
+
+
+@pytest.mark.parametrize("low, high, text", [
+    (50001, 100000, "$50K–$100K"),
+    (1000001, None, "$1M+"),
+    (250000, 250000, "$250K"),
+    (999500, 1000000, "$1M"),
+    (999999, 5000000, "$1M–$5M"),
+    (1001, 15000, "$1K–$15K"),
+])
+def test_format_amount_rounds_both_ends_alike(low, high, text):
+    pick = Pick("government", "AAA", 50, "BUY", "raw", "Member", "Senate", None, "", [], "t", low, high)
+    assert _format_amount(pick) == text
+
+
+def test_format_amount_falls_back_to_the_raw_string():
+    pick = Pick("insider", "AAA", 50, "BUY", "n/a", "Insider", "CEO", None, "", [], "t")
+    assert _format_amount(pick) == "n/a"
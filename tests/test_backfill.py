@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import backfill
+import patterns
+import snapshots
+import storage
+import track_record
+from patterns import AwardIndex, ClusterWindow, EventIndex
+
+DAYS = ["2026-09-01", "2026-09-02", "2026-09-03", "2026-09-04", "2026-09-07", "2026-09-08"]
+
+
+def _rows():
+    """Six members buying AAA on consecutive days, newest first, plus one BBB buy."""
+    rows = [
+        {"Ticker": "AAA", "Representative": f"Member {i}", "ReportDate": day, "TransactionDate": day,
+         "Transaction": "Purchase", "Amount": "$1,001 - $15,000", "House": "Senate"}
+        for i, day in enumerate(DAYS)
+    ][::-1]
+    rows.insert(3, {"Ticker": "BBB", "Representative": "Member 0", "ReportDate": DAYS[0],
+                    "Transaction": "Purchase", "Amount": "$1,001 - $15,000"})
+    return rows
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    """A stored government snapshot, and module state as a fresh process has it."""
+    monkeypatch.setattr(snapshots, "_cfg", lambda: {"dir": str(tmp_path / "snapshots")})
+    monkeypatch.setattr(patterns, "CLUSTERS", ClusterWindow())
+    monkeypatch.setattr(patterns, "EVENTS", EventIndex())
+    monkeypatch.setattr(patterns, "AWARDS", AwardIndex())
+    monkeypatch.setattr(track_record, "_stats", None)
+    return snapshots.store_bytes(json.dumps(_rows()).encode("utf-8"))
+
+
+def _load(monkeypatch, conn, sha, chunk_rows):
+    monkeypatch.setattr(backfill, "_cfg", lambda: {"chunk_rows": chunk_rows, "shards_per_worker": 1})
+    return backfill.load_history(conn, "government_trades", sha, workers=1)
+
+
+def _scores(conn):
+    return sorted(
+        (r[0], r[1], r[2], r[3]) for r in conn.execute("SELECT ticker, actor, score, reasons FROM scores")
+    )
+
+
+def _fresh_db(monkeypatch, path):
+    monkeypatch.setattr(storage, "DB_PATH", path)
+    storage.init_db()
+    return storage.get_conn()
+
+
+def test_scores_do_not_depend_on_chunk_size(conn, snapshot, monkeypatch, tmp_path):
+    assert _load(monkeypatch, conn, snapshot, chunk_rows=100) == 7
+    whole = _scores(conn)
+    assert any("Cluster buying" in reasons for *_, reasons in whole)
+
+    chunked = _fresh_db(monkeypatch, tmp_path / "chunked.db")
+    assert _load(monkeypatch, chunked, snapshot, chunk_rows=1) == 7
+    assert _scores(chunked) == whole
+    chunked.close()
+
+
+def test_interrupted_import_resumes_after_its_last_chunk(conn, snapshot, monkeypatch, tmp_path):
+    write_chunk = backfill._write_chunk
+    calls = []
+
+    def failing(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return write_chunk(*args)
+
+    monkeypatch.setattr(backfill, "_write_chunk", failing)
+    with pytest.raises(KeyboardInterrupt):
+        _load(monkeypatch, conn, snapshot, chunk_rows=3)
+    assert backfill.checkpoint(conn, "government_trades", snapshot) == (3, 3, None)
+    assert conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 3
+
+    monkeypatch.setattr(backfill, "_write_chunk", write_chunk)
+    assert _load(monkeypatch, conn, snapshot, chunk_rows=3) == 4
+    done, new, finished = backfill.checkpoint(conn, "government_trades", snapshot)
+    assert (done, new) == (7, 7) and finished
+    assert _load(monkeypatch, conn, snapshot, chunk_rows=3) == 0
+
+    whole = _fresh_db(monkeypatch, tmp_path / "whole.db")
+    _load(monkeypatch, whole, snapshot, chunk_rows=100)
+    assert _scores(conn) == _scores(whole)
+    whole.close()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from backtest import evaluate, expand_grid, parse_grid, rule_matrix, sweep
+from rules import rule_set
+
+from test_rules import _features
+
+
+def test_parse_grid_ranges_include_their_stop():
+    grid = parse_grid(["buy_base=15,25", "cluster_bonus=0:30:10", "high_conviction=80"], ["buy_base", "cluster_bonus"])
+    assert grid == {"buy_base": [15, 25], "cluster_bonus": [0, 10, 20, 30], "high_conviction": [80]}
+
+    with pytest.raises(ValueError):
+        parse_grid(["nope=1"], ["buy_base"])
+
+
+def test_expand_grid_takes_other_weights_from_the_rules():
+    configs = expand_grid({"a": [1, 2], "b": [10, 20, 30]}, {"a": 5, "b": 6, "c": 7})
+    assert len(configs) == 6
+    assert {(c["a"], c["b"]) for c in configs} == {(a, b) for a in (1, 2) for b in (10, 20, 30)}
+    assert all(c["c"] == 7 and "high_conviction" in c for c in configs)
+    assert expand_grid({}, {"a": 5})[0]["a"] == 5
+
+
+def test_rule_matrix_scores_like_the_rules():
+    rows = [dict(r, kind=kind) for kind in ("government", "insider") for r in _features(kind, 200)]
+    features = pd.DataFrame(rows)
+    rule_sets = {kind: rule_set(kind) for kind in ("government", "insider")}
+    X, weights = rule_matrix(features, rule_sets)
+
+    scores = np.minimum(X @ np.array(list(weights.values()), dtype=float), backtest.MAX_SCORE)
+    expected = [rule_sets[r["kind"]].score(r)[0] for r in rows]
+    assert scores.tolist() == pytest.approx(expected)
+
+
+def test_parallel_sweep_matches_evaluate(monkeypatch):
+    monkeypatch.setattr(backtest, "CHUNK_CONFIGS", 2)
+    rng = np.random.default_rng(3)
+    X = rng.integers(0, 2, size=(400, 3)).astype(np.int8)
+    ret = rng.normal(0, 0.05, 400)
+    ret[::7] = np.nan
+    keys = ["a", "b", "c"]
+    configs = expand_grid({"a": [10, 40], "b": [0, 30], "high_conviction": [40, 60]}, {"a": 0, "b": 0, "c": 25})
+
+    serial = sweep(X, ret, configs, keys, workers=1)
+    parallel = sweep(X, ret, configs, keys, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+    priced = ~np.isnan(ret)
+    for config, row in zip(configs, serial.to_dict("records")):
+        stats = evaluate(X[priced], ret[priced], [config[k] for k in keys], config["high_conviction"])
+        assert row["signals"] == stats["signals"]
+        assert row["mean_ret"] == pytest.approx(stats["mean_ret"], nan_ok=True)
+        assert row["excess_ret"] == pytest.approx(stats["mean_ret"] - ret[priced].mean(), nan_ok=True)
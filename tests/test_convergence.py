@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+import main
+import patterns
+import quiver_client
+import snapshots
+from backtest import build_features
+from ingest import insert_new, normalize_government, normalize_insider
+from patterns import EventIndex
+from stubs import QuiverStub
+
+DAY = "2026-10-12"
+
+
+def _gov(who, day=DAY, side="Purchase", ticker="AAA"):
+    return {"Ticker": ticker, "Representative": who, "ReportDate": day, "TransactionDate": day,
+            "Transaction": side, "Amount": "$1,001 - $15,000", "House": "Senate"}
+
+
+def _insider(who, day=DAY, filed=DAY, side="Buy", ticker="AAA", n=0):
+    return {"Ticker": ticker, "Name": who, "Title": "Director", "TransactionType": side, "Date": day,
+            "FilingDate": filed, "Shares": 100, "PricePerShare": 10.0, "Value": 1000.0,
+            "AccessionNumber": f"0001-{who}-{n}"}
+
+
+@pytest.fixture(autouse=True)
+def events(monkeypatch):
+    monkeypatch.setattr(patterns, "EVENTS", EventIndex())
+
+
+def test_sources_arriving_together_both_converge(conn, monkeypatch):
+    monkeypatch.setattr(snapshots, "ENABLED", False)
+    monkeypatch.setattr(quiver_client, "_state_cache", {})
+    monkeypatch.setattr(quiver_client, "_pending", {})
+    payloads = {
+        "/live/congresstrading": [_gov("Member")],
+        "/historical/insidertrading": [_insider("Insider")],
+    }
+    with QuiverStub(payloads) as q:
+        monkeypatch.setattr(quiver_client, "BASE", q.url)
+        assert main.collect(conn, filtered=False) == 2
+
+    for kind, reason in (("government", "Insider buying"), ("insider", "Congress buying")):
+        reasons = json.loads(conn.execute("SELECT reasons FROM scores WHERE kind = ?", (kind,)).fetchone()[0])
+        assert any(r.startswith(reason) and r.endswith("(1)") for r in reasons), reasons
+
+
+def test_backtest_counts_distinct_buyers_like_live(conn):
+    insert_new(conn, "trades", list(normalize_government([
+        _gov("Member"), _gov("Seller", side="Sale (Full)"), _gov("Other", ticker="BBB"),
+    ])))
+    insert_new(conn, "insider_trades", list(normalize_insider([
+        _insider("A", n=1), _insider("A", "2026-10-14", "2026-10-14", n=2), _insider("B", "2026-10-08", n=3),
+        _insider("C", "2026-10-01", n=4),                     # outside convergence_days
+        _insider("D", filed="2026-10-20", n=5),               # filed after the government disclosure
+        _insider("E", side="Sell", n=6),
+    ])))
+    conn.commit()
+
+    trades, features, _ = build_features(conn)
+    counts = dict(zip(trades["actor"], features["convergence"]))
+    # Government trades of either side count insider buyers filed by their own disclosure.
+    assert (counts["Member"], counts["Seller"], counts["Other"]) == (2, 2, 0)
+    # Insider buys count government buyers; insider sells are never counted.
+    assert (counts["B"], counts["C"], counts["D"], counts["E"]) == (1, 0, 1, 0)
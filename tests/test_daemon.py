@@ -0,0 +1,94 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+import patterns
+import quiver_client
+import snapshots
+from daemon import Job, Monitor, Scheduler
+from patterns import AwardIndex, ClusterWindow, EventIndex
+from stubs import QuiverStub
+
+NOW = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+def test_interval_jobs_skip_slots_missed_while_another_ran():
+    job = Job("check", lambda: None, every=timedelta(minutes=15))
+    job.schedule_after(NOW)
+    assert job.next_run == NOW + timedelta(minutes=15)
+
+    job.schedule_after(NOW + timedelta(minutes=50))
+    assert job.next_run == NOW + timedelta(minutes=60)
+
+    job.defer(NOW + timedelta(minutes=55))
+    assert job.next_run == NOW + timedelta(minutes=70)
+
+
+def test_daily_jobs_run_at_the_next_time_of_day():
+    job = Job("digest", lambda: None, at=["16:00", "08:00"])
+    job.schedule_after(NOW)
+    assert job.next_run == datetime(2026, 10, 16, 16, 0, tzinfo=timezone.utc)
+    job.schedule_after(job.next_run)
+    assert job.next_run == datetime(2026, 10, 17, 8, 0, tzinfo=timezone.utc)
+
+    with pytest.raises(ValueError):
+        Job("never", lambda: None)
+
+
+def test_scheduler_keeps_serving_after_a_failed_job():
+    ran = []
+
+    def ok():
+        ran.append("ok")
+        if ran.count("ok") == 3:
+            scheduler.request_stop()
+
+    def fails():
+        ran.append("fails")
+        raise RuntimeError("boom")
+
+    scheduler = Scheduler([
+        Job("ok", ok, every=timedelta(milliseconds=20)),
+        Job("fails", fails, every=timedelta(hours=1)),
+    ])
+    t0 = time.perf_counter()
+    scheduler.run(run_first=("fails",))
+    assert ran[0] == "fails" and ran.count("ok") == 3
+    assert time.perf_counter() - t0 < 5
+
+
+def test_full_check_defers_the_congress_poll(monkeypatch):
+    monitor = Monitor(conn=None)
+    monkeypatch.setattr("daemon.run_cycle", lambda *a, **kw: 0)
+    monitor.jobs = [Job("congress", monitor.congress, every=timedelta(minutes=15))]
+    now = datetime.now(timezone.utc)
+    monitor.jobs[0].next_run = now
+
+    monitor.check()
+    assert monitor.jobs[0].next_run >= now + timedelta(minutes=15)
+
+
+def test_failed_cycle_drops_the_rolled_back_trades_from_the_indexes(conn, monkeypatch):
+    monkeypatch.setattr(snapshots, "ENABLED", False)
+    monkeypatch.setattr(quiver_client, "_state_cache", {})
+    monkeypatch.setattr(quiver_client, "_pending", {})
+    for name, index in (("EVENTS", EventIndex()), ("AWARDS", AwardIndex()), ("CLUSTERS", ClusterWindow())):
+        monkeypatch.setattr(patterns, name, index.load(conn))
+    day = datetime.now(timezone.utc).date().isoformat()
+    trade = {"Ticker": "AAA", "Representative": "Member", "ReportDate": day, "TransactionDate": day,
+             "Transaction": "Purchase", "Amount": "$1,001 - $15,000"}
+
+    def fail(conn):
+        raise RuntimeError("digest failed")
+
+    monkeypatch.setattr(main, "queue_digest", fail)
+    with QuiverStub({"/live/congresstrading": [trade]}) as q:
+        monkeypatch.setattr(quiver_client, "BASE", q.url)
+        with pytest.raises(RuntimeError):
+            main.run_cycle(conn, datasets=["government_trades"])
+
+    assert conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 0
+    assert patterns.event_index(conn).actors("AAA", day, 7) == {}
+    assert patterns.cluster_window(conn).count("AAA", "BUY", day, day) == 0
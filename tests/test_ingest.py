@@ -0,0 +1,44 @@
+import synth
+from ingest import insert_new, insert_new_batches, normalize_government
+
+
+def _trades(n: int = 20):
+    return list(normalize_government(synth.congress(n)))
+
+
+def _count(conn, table: str = "trades") -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_insert_new_returns_only_unstored_rows(conn):
+    trades = _trades()
+    first, rest = trades[:5], trades[5:]
+
+    assert insert_new(conn, "trades", first) == first
+    assert insert_new(conn, "trades", trades) == rest
+    assert insert_new(conn, "trades", trades) == []
+    assert _count(conn) == len(trades)
+
+
+def test_insert_new_drops_repeats_within_rows(conn):
+    trades = _trades(3)
+
+    assert insert_new(conn, "trades", trades + trades[::-1]) == trades
+    assert _count(conn) == 3
+
+
+def test_insert_new_dedupes_against_known_in(conn):
+    trades = _trades(4)
+    conn.execute("CREATE TEMP TABLE archived (id TEXT PRIMARY KEY)")
+    conn.execute("INSERT INTO archived VALUES (?)", (trades[0].tid,))
+
+    assert insert_new(conn, "trades", trades, known_in="archived") == trades[1:]
+    assert _count(conn) == 3
+
+
+def test_batches_see_earlier_batches(conn):
+    trades = _trades(10)
+
+    batches = list(insert_new_batches(conn, "trades", trades + trades[:4], batch_size=6))
+    assert [len(b) for b in batches] == [6, 4]
+    assert _count(conn) == 10
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import patterns
+from dates import pin_now
+from ingest import insert_new, normalize_government
+from patterns import ClusterWindow, cluster_features, observe_trades
+
+NOW = datetime(2026, 10, 16, 12, tzinfo=timezone.utc)
+KEEP_FROM = "2026-09-29"   # NOW - (cluster_days 10 + lookback_days 7)
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    """A pinned clock and an unloaded live window per test."""
+    pin_now(NOW)
+    monkeypatch.setattr(patterns, "CLUSTERS", ClusterWindow())
+    yield
+    pin_now(None)
+
+
+def _store(conn, *trades):
+    """(ticker, member, disclosure day, transaction) -> stored and observed GovTrades."""
+    rows = normalize_government([
+        {"Ticker": t, "Representative": who, "ReportDate": day, "TransactionDate": day,
+         "Transaction": side, "Amount": "$1,001 - $15,000"}
+        for t, who, day, side in trades
+    ])
+    fresh = insert_new(conn, "trades", list(rows))
+    observe_trades(conn, fresh)
+    conn.commit()
+    return fresh
+
+
+def _since(conn):
+    return conn.execute("SELECT value FROM cluster_state WHERE key = 'since'").fetchone()[0]
+
+
+def test_window_counts_distinct_actors_per_side():
+    w = ClusterWindow(days=10)
+    w.add("AAA", "BUY", "a", "2026-10-01")
+    w.add("AAA", "BUY", "a", "2026-10-05")
+    w.add("AAA", "BUY", "b", "2026-10-09")
+    w.add("AAA", "SELL", "c", "2026-10-09")
+    w.add("AAA", "UNKNOWN", "d", "2026-10-09")
+
+    assert w.count("AAA", "BUY", "2026-09-30", "2026-10-09") == 2
+    assert w.count("AAA", "BUY", "2026-10-06", "2026-10-09") == 1
+    assert w.count("AAA", "BUY", "2026-10-02", "2026-10-04") == 0
+    assert w.count("AAA", "SELL", "2026-09-30", "2026-10-09") == 1
+    assert w.count("BBB", "BUY", "2026-09-30", "2026-10-09") == 0
+
+    w.advance("2026-10-05")
+    assert w.count("AAA", "BUY", "2026-09-01", "2026-10-31") == 2
+    w.advance("2026-10-06")
+    assert w.count("AAA", "BUY", "2026-09-01", "2026-10-31") == 1
+    assert w.covers("2026-10-06") and not w.covers("2026-10-05")
+
+
+def test_first_ingest_seeds_the_table_and_load_only_reads(conn):
+    _store(conn, ("AAA", "a", "2026-10-10", "Purchase"), ("AAA", "b", "2026-09-01", "Purchase"))
+    assert _since(conn) == KEEP_FROM
+    assert [tuple(r) for r in conn.execute("SELECT ticker, side, actor, day FROM cluster_actors")] == [
+        ("AAA", "BUY", "a", "2026-10-10"),
+    ]
+
+    changes = conn.total_changes
+    w = ClusterWindow().load(conn)
+    assert conn.total_changes == changes and not conn.in_transaction
+    assert w.cutoff == KEEP_FROM
+    assert w.count("AAA", "BUY", "2026-10-01", "2026-10-16") == 1
+
+
+def test_load_before_seeding_covers_nothing(conn):
+    w = ClusterWindow().load(conn)
+    assert not w.covers("2026-10-16")
+    assert conn.execute("SELECT COUNT(*) FROM cluster_state").fetchone()[0] == 0
+
+
+def test_counts_end_at_each_trades_own_day(conn):
+    _store(
+        conn,
+        ("AAA", "a", "2026-10-10", "Purchase"),
+        ("AAA", "b", "2026-10-14", "Purchase"),
+        ("AAA", "b", "2026-10-15", "Purchase"),
+        ("AAA", "c", "2026-10-16", "Sale (Full)"),
+        ("AAA", "x", "2026-08-01", "Purchase"),   # older than the live window
+        ("AAA", "y", "2026-08-05", "Purchase"),
+    )
+    items = [
+        ("AAA", "2026-10-10"), ("AAA", "2026-10-15"), ("AAA", "2026-10-16"),
+        ("AAA", "2026-08-05"), ("BBB", "2026-10-16"), (None, "2026-10-16"),
+    ]
+    assert cluster_features(items, conn) == [(1, 0), (2, 0), (2, 1), (2, 0), (0, 0), (0, 0)]
+
+
+def test_table_is_pruned_as_the_clock_moves_and_reseeded_when_the_window_grows(conn, monkeypatch):
+    _store(conn, ("AAA", "a", "2026-10-01", "Purchase"))
+    pin_now(NOW + timedelta(days=10))
+    _store(conn, ("AAA", "b", "2026-10-20", "Purchase"))
+    assert _since(conn) == "2026-10-09"
+    assert [r[0] for r in conn.execute("SELECT actor FROM cluster_actors")] == ["b"]
+
+    monkeypatch.setattr(patterns, "_cluster_days", lambda: 30)
+    _store(conn, ("AAA", "c", "2026-10-21", "Purchase"))
+    assert _since(conn) == "2026-09-19"
+    assert sorted(r[0] for r in conn.execute("SELECT actor FROM cluster_actors")) == ["a", "b", "c"]
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dates import pin_now
+from pricing import LocalFileSource, forward_returns, load_closes, missing_ranges, sync_prices
+
+DAYS = [d.strftime("%Y-%m-%d") for d in pd.bdate_range("2026-03-02", "2026-03-13")]
+
+
+class RecordingSource(LocalFileSource):
+    """A local price file that records every (tickers, start, end) request."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.requests = []
+
+    def fetch(self, tickers, start, end):
+        self.requests.append((sorted(tickers), start, end))
+        return super().fetch(tickers, start, end)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "closes.csv"
+    pd.DataFrame({"ticker": "AAA", "date": DAYS, "close": [100.0 + i for i in range(len(DAYS))]}).to_csv(path)
+    pin_now(datetime(2026, 3, 13, 15, tzinfo=timezone.utc))
+    yield RecordingSource(str(path))
+    pin_now(None)
+
+
+def test_sync_fetches_only_days_not_yet_requested(conn, source):
+    assert sync_prices(conn, source, ["AAA", "ZZZ"], start="2026-03-02") == len(DAYS)
+    assert source.requests == [(["AAA", "ZZZ"], "2026-03-02", "2026-03-13")]
+
+    # ZZZ had no closes, but its days were requested: only today, still open, is asked again.
+    source.requests.clear()
+    assert sync_prices(conn, source, ["AAA", "ZZZ"], start="2026-03-02") == 0
+    assert source.requests == [(["ZZZ"], "2026-03-13", "2026-03-13")]
+
+    # An earlier start asks for the days before what either ticker has.
+    assert missing_ranges(conn, ["AAA", "ZZZ"], "2026-02-23", "2026-03-13") == {
+        ("2026-02-23", "2026-03-01"): ["AAA", "ZZZ"],
+        ("2026-03-13", "2026-03-13"): ["ZZZ"],
+    }
+
+
+def test_forward_returns_start_at_the_first_close_on_or_after_the_event(conn, source):
+    sync_prices(conn, source, ["AAA"], start="2026-03-02")
+    events = pd.DataFrame({
+        "ticker": ["AAA", "AAA", "AAA", "ZZZ", "AAA"],
+        "date": ["2026-03-02", "2026-03-07", "2026-03-12", "2026-03-02", None],
+    })
+    out = forward_returns(events, load_closes(conn), (1, 4))
+
+    assert out["ret_1"].tolist()[:2] == [pytest.approx(101 / 100 - 1), pytest.approx(106 / 105 - 1)]
+    assert out["ret_4"].tolist()[:2] == [pytest.approx(104 / 100 - 1), pytest.approx(109 / 105 - 1)]
+    assert np.isnan(out["ret_4"][2]) and out["ret_1"][2] == pytest.approx(109 / 108 - 1)
+    assert out[["ret_1", "ret_4"]].iloc[3:].isna().all().all()
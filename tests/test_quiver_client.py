@@ -0,0 +1,72 @@
+import pytest
+
+import quiver_client
+import snapshots
+import synth
+from stubs import QuiverStub
+
+PATH = "/live/congresstrading"
+DATASET = "government_trades"
+
+
+@pytest.fixture
+def quiver(conn, monkeypatch):
+    """A Quiver stub serving five congress trades, with no snapshots and no staged state."""
+    monkeypatch.setattr(snapshots, "ENABLED", False)
+    monkeypatch.setattr(quiver_client, "_state_cache", {})
+    monkeypatch.setattr(quiver_client, "_pending", {})
+    with QuiverStub({PATH: synth.congress(5)}) as q:
+        monkeypatch.setattr(quiver_client, "BASE", q.url)
+        yield q
+
+
+def _stored_state(conn):
+    row = conn.execute(
+        "SELECT etag, high_water FROM fetch_state WHERE dataset=?", (DATASET,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def test_committed_etag_turns_the_next_fetch_into_a_304(conn, quiver):
+    assert len(list(quiver_client.fetch_government_trades())) == 5
+    assert quiver_client._pending[DATASET]["etag"] == quiver.etags[PATH]
+    assert _stored_state(conn) is None
+
+    quiver_client.commit_fetch_state(conn)
+    conn.commit()
+    assert _stored_state(conn) == (quiver.etags[PATH], None)
+
+    assert list(quiver_client.fetch_government_trades()) == []
+    assert quiver.requests == 2
+
+
+def test_discarded_etag_is_not_sent_again(conn, quiver):
+    quiver_client.fetch_government_trades()
+    quiver_client.discard_fetch_state()
+    quiver_client.commit_fetch_state(conn)
+
+    assert _stored_state(conn) is None
+    assert len(list(quiver_client.fetch_government_trades())) == 5
+
+
+def test_changed_payload_is_fetched_in_full(conn, quiver):
+    quiver_client.fetch_government_trades()
+    quiver_client.commit_fetch_state(conn)
+    quiver.set_payloads({PATH: synth.congress(7)})
+
+    assert len(list(quiver_client.fetch_government_trades())) == 7
+
+
+def test_high_water_is_staged_until_commit(conn, quiver):
+    quiver_client.record_high_water(DATASET, "2026-10-10")
+    assert quiver_client.high_water(DATASET) == "2026-10-10"
+    quiver_client.discard_fetch_state()
+    assert quiver_client.high_water(DATASET) is None
+
+    quiver_client.record_high_water(DATASET, "2026-10-10T14:00:00")
+    quiver_client.record_high_water(DATASET, "2026-10-08")   # older: ignored
+    quiver_client.commit_fetch_state(conn)
+    conn.commit()
+
+    assert _stored_state(conn) == (None, "2026-10-10")
+    assert quiver_client.high_water_since(DATASET) == "2026-10-09"   # high_water_overlap_days: 1
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+
+import pytest
+
+import retention
+from ingest import insert_new, normalize_government, unalerted
+from retention import BloomFilter
+
+OLD = "2020-01-01T00:00:00+00:00"
+
+
+def _hash(i: int) -> str:
+    return hashlib.sha256(f"alert {i}".encode("utf-8")).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def settings(tmp_path, monkeypatch):
+    """Archives in tmp_path, two-hash Bloom slices and no slices loaded yet."""
+    monkeypatch.setattr(retention, "_cfg", lambda: {
+        "archive_dir": str(tmp_path / "archive"), "bloom_capacity": 2, "bloom_error_rate": 1e-6,
+    })
+    monkeypatch.setattr(retention, "_slices", None)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bf = BloomFilter.for_capacity(1000, 1e-4)
+    added = [_hash(i) for i in range(1000)]
+    for h in added + ["not a hex hash"]:
+        bf.add(h)
+
+    assert all(h in bf for h in added) and "not a hex hash" in bf
+    false_positives = sum(_hash(i) in bf for i in range(1000, 11000))
+    assert false_positives < 10
+    assert bf.count == 1001
+
+
+def test_pruned_alerts_are_still_deduped(conn):
+    hashes = [_hash(i) for i in range(5)]
+    conn.executemany("INSERT INTO alerts_sent VALUES (?, ?)", [(h, OLD) for h in hashes[:3]])
+    conn.execute("INSERT INTO alerts_sent VALUES (?, '2099-01-01T00:00:00+00:00')", (hashes[3],))
+    conn.commit()
+
+    assert retention.prune_alerts(conn, ttl_days=30) == 3
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM alerts_sent").fetchone()[0] == 1
+    # Three hashes over slices of two.
+    assert [tuple(r) for r in conn.execute("SELECT capacity, count FROM alert_bloom ORDER BY id")] == [(2, 2), (2, 1)]
+
+    retention.invalidate()
+    assert unalerted(conn, hashes) == [hashes[4]]
+
+
+def _trades(*days):
+    return list(normalize_government([
+        {"Ticker": "AAA", "Representative": f"Member {i}", "ReportDate": day, "Transaction": "Purchase"}
+        for i, day in enumerate(days)
+    ]))
+
+
+def test_archived_rows_move_to_monthly_partitions_and_open_archive_reads_them(conn, tmp_path):
+    trades = _trades("2024-01-05", "2024-01-20", "2024-02-03", "2026-10-01")
+    insert_new(conn, "trades", trades)
+    conn.commit()
+
+    assert retention.archive_table(conn, "trades", "2025-01-01") == 3
+    conn.commit()
+    assert sorted(p.name for p in (tmp_path / "archive" / "trades").iterdir()) == ["2024-01.jsonl.gz", "2024-02.jsonl.gz"]
+    assert [r[0] for r in conn.execute("SELECT id FROM trades")] == [trades[3].tid]
+    assert conn.execute("SELECT SUM(n) FROM archived_counts WHERE kind = 'government'").fetchone()[0] == 3
+
+    assert retention.table_or_archive(conn, "trades") == "trades"
+    assert retention.open_archive(conn, ("trades",)) == 3
+    assert retention.open_archive(conn, ("trades",)) == 0
+    assert retention.table_or_archive(conn, "trades") == "all_trades"
+    assert sorted(r[0] for r in conn.execute("SELECT id FROM all_trades")) == sorted(t.tid for t in trades)
+
+
+def test_rows_left_in_both_places_are_read_once(conn, tmp_path):
+    trades = _trades("2024-01-05", "2024-01-20")
+    insert_new(conn, "trades", trades)
+    conn.commit()
+    retention.archive_table(conn, "trades", "2025-01-01")
+    # A pass interrupted before its delete committed: rows are archived and still live.
+    conn.rollback()
+    retention.archive_table(conn, "trades", "2025-01-01")
+    conn.rollback()
+
+    with gzip.open(tmp_path / "archive" / "trades" / "2024-01.jsonl.gz", "rt") as f:
+        assert len(f.readlines()) == 4
+    assert len(list(retention.iter_archive("trades"))) == 2
+    retention.open_archive(conn, ("trades",))
+    assert conn.execute("SELECT COUNT(*) FROM all_trades").fetchone()[0] == 2
+
+
+def test_archiving_inside_the_lookback_window_is_refused(conn):
+    with pytest.raises(ValueError):
+        retention.run(conn, archive_after_days=3)
@@ -0,0 +1,67 @@
+import random
+
+import pandas as pd
+import pytest
+
+from rules import compile_rules, rule_set
+
+ROLES = {
+    "government": ["Representatives", "Senate", None],
+    "insider": ["CEO", "Chief Financial Officer (CFO)", "Director", "10% Owner", None],
+}
+
+
+def _features(kind: str, n: int, seed: int = 7):
+    """Feature dicts as scoring builds them, with every feature sometimes missing."""
+    rng = random.Random(seed)
+
+    def maybe(value):
+        return None if rng.random() < 0.1 else value
+
+    rows = []
+    for _ in range(n):
+        row = {
+            "side": maybe(rng.choice(["BUY", "SELL", "UNKNOWN"])),
+            "amount": maybe(rng.choice([0, 15001, 50000, 50001, 100001, 2_500_000])),
+            "role": rng.choice(ROLES[kind]),
+            "age": maybe(rng.randint(0, 30)),
+            "convergence": rng.randint(0, 3),
+            "history": rng.choice(["good", "poor", None]),
+        }
+        # history_status only rates actors that have an average.
+        avg = round(rng.uniform(-0.1, 0.1), 4)
+        row["history_avg"] = avg if row["history"] else maybe(avg)
+        if kind == "government":
+            row.update(cluster=rng.randint(0, 6), cluster_sellers=rng.randint(0, 3), contract=rng.random() < 0.2)
+        rows.append(row)
+    return rows
+
+
+def _assert_same(rs, rows):
+    scores, reasons = rs.evaluate(pd.DataFrame(rows), len(rows))
+    for i, row in enumerate(rows):
+        assert (int(scores[i]), reasons[i]) == rs.score(row), row
+
+
+@pytest.mark.parametrize("kind", ["government", "insider"])
+def test_vectorized_rules_match_per_trade_scores(kind):
+    _assert_same(rule_set(kind), _features(kind, 500))
+
+
+def test_every_operator_matches_with_missing_values():
+    config = {
+        "scoring": {"base": 10},
+        "rules": {
+            "government": [
+                {"if": {"side": "BUY"}, "weight": "base", "reason": "eq"},
+                {"if": {"side": ["SELL", "UNKNOWN"]}, "weight": -5, "reason": "in"},
+                {"if": {"role": {"any": ["senate"]}}, "weight": 3, "reason": "any {role}"},
+                {"if": {"amount": {"gt": 50000, "le": 100001}}, "weight": 7, "reason": "range"},
+                {"if": {"age": {"ne": 0}}, "weight": 1},
+                {"if": {"contract": True, "cluster": {"ge": 2}}, "weight": 4, "reason": "both {cluster}"},
+                {"if": {"history": {"ne": "poor"}}, "weight": 2, "reason": "not poor"},
+            ],
+            "insider": [],
+        },
+    }
+    _assert_same(compile_rules(config)["government"], _features("government", 300, seed=11))
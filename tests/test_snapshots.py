@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+
+import main
+import patterns
+import quiver_client
+import snapshots
+from ingest import insert_new, normalize_insider
+from stubs import QuiverStub
+
+PATH = "/live/congresstrading"
+DATASET = "government_trades"
+TRADE = {"Ticker": "AAA", "Representative": "Member", "ReportDate": "2026-10-12", "TransactionDate": "2026-10-12",
+         "Transaction": "Purchase", "Amount": "$1,001 - $15,000", "House": "Senate"}
+
+
+@pytest.fixture
+def quiver(conn, tmp_path, monkeypatch):
+    """A Quiver stub serving one congress trade, snapshots in tmp_path (never reused) and no staged state."""
+    monkeypatch.setattr(snapshots, "_cfg", lambda: {"dir": str(tmp_path / "snapshots"), "ttl_minutes": 0})
+    monkeypatch.setattr(snapshots, "ENABLED", None)
+    monkeypatch.setattr(quiver_client, "_state_cache", {})
+    monkeypatch.setattr(quiver_client, "_pending", {})
+    monkeypatch.setattr(quiver_client, "_run_snapshots", {})
+    monkeypatch.setattr(patterns, "EVENTS", patterns.EventIndex())
+    with QuiverStub({PATH: [TRADE]}) as q:
+        monkeypatch.setattr(quiver_client, "BASE", q.url)
+        yield q
+
+
+def _fetch_twice(conn):
+    """A fetch, its validators committed, then a fetch answered 304."""
+    assert len(list(quiver_client.fetch_government_trades())) == 1
+    quiver_client.commit_fetch_state(conn)
+    conn.commit()
+    assert list(quiver_client.fetch_government_trades()) == []
+
+
+def test_run_manifest_records_what_the_run_read(conn, quiver):
+    quiver_client.fetch_government_trades()
+    manifest = snapshots.load_manifest(quiver_client.write_run_manifest())
+    assert manifest["datasets"][DATASET]["status"] == "fetched"
+    assert snapshots.load_payloads(manifest) == {DATASET: [TRADE]}
+
+    quiver_client.commit_fetch_state(conn)
+    quiver_client.fetch_government_trades()
+    manifest = snapshots.load_manifest(quiver_client.write_run_manifest())
+    assert manifest["datasets"][DATASET] == {"sha": None, "status": "not_modified"}
+
+
+def test_disabled_snapshots_write_no_manifest(conn, quiver, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "ENABLED", False)
+    _fetch_twice(conn)
+    assert quiver.requests == 2
+    assert quiver_client.write_run_manifest() is None
+    assert not (tmp_path / "snapshots").exists()
+
+
+def test_replay_ignores_and_keeps_the_live_caches(conn, quiver, capsys):
+    # Live data.db holds an insider buy of AAA that the replayed trade would converge with.
+    insert_new(conn, "insider_trades", list(normalize_insider([{
+        "Ticker": "AAA", "Name": "Insider", "Title": "Director", "TransactionType": "Buy",
+        "Date": "2026-10-12", "FilingDate": "2026-10-12", "Value": 1000.0, "AccessionNumber": "0001-1",
+    }])))
+    conn.commit()
+    live = patterns.event_index(conn)
+    assert live.actors("AAA", "2026-10-12", 7) == {"insider": {"Insider"}}
+
+    quiver_client.fetch_government_trades()
+    ref = quiver_client.write_run_manifest()
+    quiver_client.discard_fetch_state()
+    capsys.readouterr()
+
+    main.replay_run(ref)
+    out = capsys.readouterr().out
+    assert "Member" in out and "Insider buying" not in out
+    assert patterns.EVENTS is live
+
+
+def test_manifests_prune_the_store_once_a_day(quiver, tmp_path):
+    runs = tmp_path / "snapshots" / "runs"
+    old = time.time() - 30 * 86400
+    snapshots.write_manifest({})
+    stale = runs / "20000101T000000000000Z.json"
+    stale.write_text('{"datasets": {}}')
+    os.utime(stale, (old, old))
+
+    snapshots.write_manifest({})
+    assert stale.exists()
+
+    marker = tmp_path / "snapshots" / "pruned"
+    os.utime(marker, (old, old))
+    snapshots.write_manifest({})
+    assert not stale.exists() and len(list(runs.glob("*.json"))) == 3
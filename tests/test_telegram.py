@@ -0,0 +1,107 @@
+import pytest
+
+import retention
+import telegram
+from ingest import unalerted
+from stubs import TelegramStub
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """Start a TelegramStub with the given options and point telegram.py at it."""
+    servers = []
+
+    def start(**kwargs) -> TelegramStub:
+        tg = TelegramStub(**kwargs).__enter__()
+        servers.append(tg)
+        monkeypatch.setattr(telegram, "TELEGRAM_API_BASE", tg.url)
+        return tg
+
+    yield start
+    for tg in servers:
+        tg.__exit__(None, None, None)
+
+
+def _outbox(conn):
+    return [tuple(r) for r in conn.execute("SELECT text, status, attempts FROM outbox ORDER BY id")]
+
+
+def test_flush_sends_in_order_and_records_alerts(conn, bot):
+    tg = bot()
+    telegram.enqueue(conn, "alert one", alert_hash="h1")
+    telegram.enqueue(conn, "digest")
+    conn.commit()
+
+    assert telegram.flush(conn) == 2
+    assert tg.messages == ["alert one", "digest"]
+    assert [status for _, status, _ in _outbox(conn)] == ["sent", "sent"]
+    assert unalerted(conn, ["h1", "h2"]) == ["h2"]
+    assert telegram.flush(conn) == 0
+
+
+def test_short_429_is_retried_inline(conn, bot):
+    tg = bot(throttle_every=2, retry_after=0)
+    telegram.enqueue(conn, "first")
+    telegram.enqueue(conn, "second")
+    conn.commit()
+
+    assert telegram.flush(conn) == 2
+    assert tg.calls == 3
+    assert tg.messages == ["first", "second"]
+
+
+def test_long_429_leaves_the_outbox_without_counting_an_attempt(conn, bot):
+    tg = bot(throttle_every=1, retry_after=3600)
+    telegram.enqueue(conn, "first")
+    telegram.enqueue(conn, "second")
+    conn.commit()
+
+    assert telegram.flush(conn) == 0
+    assert tg.calls == 1
+    assert _outbox(conn) == [("first", "pending", 0), ("second", "pending", 0)]
+
+
+def test_rejected_message_is_dead_lettered_after_max_attempts(conn, bot, monkeypatch):
+    monkeypatch.setattr(telegram, "_max_delivery_attempts", lambda: 2)
+    tg = bot(reject=("bad",))
+    telegram.enqueue(conn, "bad message")
+    telegram.enqueue(conn, "good message")
+    conn.commit()
+
+    assert telegram.flush(conn) == 1
+    assert _outbox(conn) == [("bad message", "pending", 1), ("good message", "sent", 0)]
+
+    assert telegram.flush(conn) == 0
+    assert _outbox(conn)[0] == ("bad message", "failed", 2)
+
+    calls = tg.calls
+    assert telegram.flush(conn) == 0
+    assert tg.calls == calls
+    assert tg.messages == ["good message"]
+
+
+def test_failed_attempts_are_committed_once_per_flush(conn, bot):
+    bot(reject=("bad",))
+    telegram.enqueue(conn, "bad one")
+    telegram.enqueue(conn, "bad two")
+    conn.commit()
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert telegram.flush(conn) == 0
+    conn.set_trace_callback(None)
+    assert statements.count("COMMIT") == 1
+    assert not conn.in_transaction
+    assert _outbox(conn) == [("bad one", "pending", 1), ("bad two", "pending", 1)]
+
+
+def test_retention_prunes_old_sent_and_failed_rows(conn):
+    old, new = "2026-01-01T00:00:00+00:00", "2099-01-01T00:00:00+00:00"
+    conn.executemany(
+        "INSERT INTO outbox (text, status, created_at, sent_at) VALUES (?,?,?,?)",
+        [("old sent", "sent", old, old), ("old failed", "failed", old, None), ("old pending", "pending", old, None),
+         ("new sent", "sent", new, new), ("new failed", "failed", new, None)],
+    )
+    retention.prune_alerts(conn, ttl_days=30)
+    conn.commit()
+    assert [t for t, _, _ in _outbox(conn)] == ["old pending", "new sent", "new failed"]
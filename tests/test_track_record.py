@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+import track_record
+from backtest import build_features
+from ingest import insert_new, normalize_government
+
+DAYS = [d.strftime("%Y-%m-%d") for d in pd.bdate_range("2026-03-02", periods=80)]
+
+
+@pytest.fixture
+def history(conn):
+    """
+    AAA falls 1% a trading day. Buyer buys it and Seller sells it on six
+    days, each return maturing 20 trading days later; both trade once more
+    on day 75. Swapper's exchanges and a trade in unpriced ZZZ get no return.
+    """
+    conn.executemany(
+        "INSERT INTO prices (ticker, date, close) VALUES ('AAA', ?, ?)",
+        [(day, 100 * 0.99 ** i) for i, day in enumerate(DAYS)],
+    )
+    rows = [
+        {"Ticker": ticker, "Representative": who, "ReportDate": DAYS[i], "TransactionDate": DAYS[i],
+         "Transaction": side, "Amount": "$1,001 - $15,000"}
+        for i in (0, 5, 10, 15, 20, 25, 75)
+        for ticker, who, side in (("AAA", "Buyer", "Purchase"), ("AAA", "Seller", "Sale (Full)"))
+    ]
+    rows.append({"Ticker": "AAA", "Representative": "Swapper", "ReportDate": DAYS[0], "Transaction": "Exchange"})
+    rows.append({"Ticker": "ZZZ", "Representative": "Buyer", "ReportDate": DAYS[0], "Transaction": "Purchase"})
+    insert_new(conn, "trades", list(normalize_government(rows)))
+    conn.commit()
+    return conn
+
+
+def _stats(conn, actor):
+    return conn.execute(
+        "SELECT ret_count, ret_sum / ret_count FROM actor_stats WHERE kind = 'government' AND actor = ?", (actor,)
+    ).fetchone()
+
+
+def test_sells_score_the_decline_they_anticipated(history):
+    assert track_record.refresh_actor_stats(history) == 12
+
+    expected = 1 - 0.99 ** 20
+    count, avg = _stats(history, "Seller")
+    assert count == 6 and avg == pytest.approx(expected)
+    count, avg = _stats(history, "Buyer")
+    assert count == 6 and avg == pytest.approx(-expected)
+
+    assert track_record.history_status("government", "Seller", conn=history) == ("good", pytest.approx(expected))
+    assert track_record.history_status("government", "Buyer", conn=history) == ("poor", pytest.approx(-expected))
+    assert track_record.history_status("government", "Swapper", conn=history) == (None, None)
+
+
+def test_matured_trades_without_a_return_are_not_retried(history):
+    track_record.refresh_actor_stats(history)
+    nulls = history.execute(
+        "SELECT t.person, t.ticker FROM trade_returns r JOIN trades t ON t.id = r.trade_id WHERE r.ret IS NULL"
+    ).fetchall()
+    assert sorted(map(tuple, nulls)) == [("Buyer", "ZZZ"), ("Swapper", "AAA")]
+
+    stored = history.execute("SELECT COUNT(*) FROM trade_returns").fetchone()[0]
+    assert track_record.refresh_actor_stats(history) == 0
+    # Day 75's returns have not matured yet: still pending, not marked.
+    assert history.execute("SELECT COUNT(*) FROM trade_returns").fetchone()[0] == stored == 14
+    assert _stats(history, "Seller")[0] == 6
+
+
+def test_backtest_history_matches_live_track_record(history):
+    track_record.refresh_actor_stats(history)
+    trades, features, _ = build_features(history)
+
+    last = (trades["date"] == DAYS[75]).to_numpy()
+    for actor, status in (("Seller", "good"), ("Buyer", "poor")):
+        row = features[last & (trades["actor"] == actor).to_numpy()].iloc[0]
+        assert row["history"] == status
+        assert row["history_avg"] == pytest.approx(_stats(history, actor)[1])